@@ -1,24 +1,45 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, session, flash, send_from_directory
-
+"""The web app: create_app() builds it, the games register as blueprints.
+
+Pages and account routes live in the main blueprint below; each game's API
+and page is a blueprint of its own module (blackjack_api, freecell_api),
+imported when an app is created. Extensions are process-wide objects
+initialised for each app; what belongs to one app, such as its write-behind
+queue or hashing pool, lives in app.extensions and is looked up through
+current_app, so a second app does not reconfigure the first. The
+write-behind worker, the password pool and database connections start on
+first use and are re-created after a fork, so a pre-fork server can create
+the app in its master process and fork workers from it.
+
+`app` is the app built from the environment, for `flask --app app`,
+WSGI servers (app:app) and scripts.
+"""
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, jsonify, session, flash, send_from_directory
+
+from config import configure, init_engine
 from database import db, User, GameSession, Ranking, GameRecord
+from database import get_user_stats, backfill_user_stats
+from leaderboard import leaderboard, clamp_page, DEFAULT_PAGE_SIZE
+from write_behind import write_behind, replay_failed_writes
+from session_store import game_sessions
+from shoe import shoes
+from metrics import metrics
+from migrations import migrate
+from passwords import hasher, PoolSaturated
+from assets import assets, build as build_assets
 
-app = Flask(__name__)
-app.secret_key = 'your_secret_key_here'  # 生产环境应使用更安全的密钥
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///blackjack.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+main = Blueprint('main', __name__, cli_group=None)
 
 
-@app.route('/')
+@main.route('/')
 def home():
     return render_template('home.html')
 
-@app.route('/about')
+@main.route('/about')
 def about():
     return render_template('about.html')
 
 
-@app.route('/register', methods=['GET', 'POST'])
+@main.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -26,62 +47,84 @@ def register():
 
         if User.query.filter_by(username=username).first():
             flash('用户名已存在', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('.register'))
 
-        new_user = User(username=username)
-        new_user.set_password(password)
+        new_user = User(username=username, password_hash=hasher.hash(password))
         db.session.add(new_user)
         db.session.commit()
         flash('注册成功，请登录', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
 
         user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
+        matches, upgraded = hasher.verify(user.password_hash, password) if user else (False, None)
+        if matches:
+            if upgraded:
+                # 哈希参数已更新：用本次登录的密码重新计算并保存
+                user.password_hash = upgraded
+                db.session.commit()
             session['username'] = username
             flash('登录成功，欢迎回来！', 'success')
-            return redirect(url_for('home'))
+            return redirect(url_for('.home'))
 
         flash('用户名或密码错误', 'error')
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
     return render_template('login.html')
 
-@app.route('/logout')
+@main.app_errorhandler(PoolSaturated)
+def password_pool_saturated(error):
+    # 密码哈希进程池已满：立即返回 503，让客户端稍后重试，而不是排队阻塞请求
+    flash('服务器繁忙，请稍后再试', 'error')
+    template = 'register.html' if request.endpoint == 'main.register' else 'login.html'
+    return render_template(template), 503, {'Retry-After': str(error.retry_after)}
+
+@main.route('/logout')
 def logout():
     session.pop('username', None)
-    return redirect(url_for('home'))
+    return redirect(url_for('.home'))
 
-@app.route('/rankings')
-def rankings():
-    # 从数据库获取排名
-    rankings_data = Ranking.query.order_by(Ranking.score.desc()).all()
-    # 需要获取用户名，可以通过 user 关系访问
-    player_scores_display = [{'username': r.user.username, 'score': r.score} for r in rankings_data]
-    return render_template('rankings.html', player_scores=player_scores_display)
-
-@app.route('/blackjack')
-def blackjack_game():
-    if 'username' not in session:
-        return redirect(url_for('login'))
-    # 在 index 页面显示排名，需要从数据库获取
-    rankings_data = Ranking.query.order_by(Ranking.score.desc()).all()
-    # 需要获取用户名，可以通过 user 关系访问
-    player_scores_display = [{'username': r.user.username, 'score': r.score} for r in rankings_data]
-    return render_template('blackjack.html', username=session['username'], player_scores=player_scores_display)
-
-@app.route('/freecell')
-def freecell_game():
-    if 'username' not in session:
-        return redirect(url_for('login'))
-    return render_template('freecell.html', username=session['username'])
+def page_args():
+    """page 和 per_page 查询参数，限制在排行榜允许的范围内"""
+    return clamp_page(request.args.get('page', 1, type=int),
+                      request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int))
 
-@app.route('/api/user/info')
+@main.route('/rankings')
+def rankings():
+    # 排名来自内存中的排行榜，超出前 K 名的页才查询数据库
+    page, per_page = page_args()
+    player_scores_display = leaderboard.page(page, per_page)
+    total = leaderboard.total()
+    my_rank = None
+    if 'username' in session:
+        user = User.query.filter_by(username=session['username']).first()
+        if user:
+            my_rank = leaderboard.rank_of(user.id)
+    return render_template('rankings.html', player_scores=player_scores_display, page=page, per_page=per_page,
+                           has_next=page * per_page < total, my_rank=my_rank)
+
+@main.route('/api/rankings')
+def rankings_api():
+    page, per_page = page_args()
+    data = {
+        'page': page,
+        'per_page': per_page,
+        'total': leaderboard.total(),
+        'rankings': leaderboard.page(page, per_page),
+    }
+    if 'username' in session:
+        user = User.query.filter_by(username=session['username']).first()
+        ranked = leaderboard.rank_of(user.id) if user else None
+        if ranked:
+            data['my_rank'], data['my_score'] = ranked
+    return jsonify(data)
+
+@main.route('/api/user/info')
 def user_info():
     if 'username' not in session:
         return jsonify({'error': '未登录'}), 401
@@ -95,7 +138,7 @@ def user_info():
         'balance': user.balance,
     })
 
-@app.route('/api/user/stats')
+@main.route('/api/user/stats')
 def user_stats():
     if 'username' not in session:
         return jsonify({'error': '未登录'}), 401
@@ -104,22 +147,21 @@ def user_stats():
     if not user:
         return jsonify({'error': '用户不存在'}), 404
 
-    # 从数据库获取游戏记录
-    user_games = GameRecord.query.filter_by(user_id=user.id).all()
-    wins = sum(1 for game in user_games if game.result == 'win')
-    losses = sum(1 for game in user_games if game.result == 'lose')
-    draws = sum(1 for game in user_games if game.result == 'draw')
+    # 从聚合表获取统计（缺失时在数据库中 GROUP BY 计算）
+    stats = get_user_stats(user.id)
 
     return jsonify({
         'username': session['username'],
-        'total_games': len(user_games),
-        'wins': wins,
-        'losses': losses,
-        'draws': draws,
-        'win_rate': wins / len(user_games) if user_games else 0
+        'total_games': stats['games'],
+        'wins': stats['wins'],
+        'losses': stats['losses'],
+        'draws': stats['draws'],
+        'total_wagered': stats['total_wagered'],
+        'net': stats['net'],
+        'win_rate': stats['wins'] / stats['games'] if stats['games'] else 0
     })
 
-@app.route('/api/user/reset_balance', methods=['POST'])
+@main.route('/api/user/reset_balance', methods=['POST'])
 def reset_balance():
     if 'username' not in session:
         return jsonify({'error': '未登录'}), 401
@@ -133,21 +175,68 @@ def reset_balance():
     flash('账户余额已重置为1000', 'success')
     return jsonify({'success': True, 'new_balance': 1000})
 
-@app.route('/static/cards/<filename>')
+@main.route('/static/cards/<filename>')
 def serve_card(filename):
     return send_from_directory('static/cards', filename)
 
 
-@app.route('/favicon.png')
+@main.route('/favicon.png')
 def favicon():
     return send_from_directory('static', 'favicon.png', mimetype='image/png')
 
-# API 路由
-from blackjack_api import *
-from freecell_api import *
+@main.cli.command('backfill-stats')
+def backfill_stats_command():
+    """Rebuild per-user statistics from the game history."""
+    count = backfill_user_stats()
+    print(f'Backfilled statistics for {count} users')
+
+@main.cli.command('replay-failed-writes')
+def replay_failed_writes_command():
+    """Write out the write-behind writes kept in failed_write."""
+    written, failing = replay_failed_writes()
+    print(f'Wrote {written} failed writes, {failing} still failing')
+
+@main.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Create missing tables and apply pending schema migrations."""
+    applied = migrate()
+    print(f'Applied migrations {applied}' if applied else 'Database is up to date')
+
+@main.cli.command('build-assets')
+def build_assets_command():
+    """Build the content-hashed, precompressed card sprite."""
+    manifest = build_assets(current_app.config['ASSET_BUILD_DIR'])
+    print(f"Built {manifest['cards.svg']}")
+
+
+def create_app(settings=None):
+    """Build an app configured from the environment, then from settings."""
+    app = Flask(__name__)
+    # 配置来自环境变量，APP_SETTINGS 可指定配置文件覆盖（见 config.py）
+    configure(app, settings)
+    db.init_app(app)
+    init_engine(app, db)
+    write_behind.init_app(app)
+    game_sessions.init_app(app)
+    shoes.init_app(app)
+    metrics.init_app(app)
+    hasher.init_app(app)
+    assets.init_app(app)
+
+    # 各游戏的 API 和页面（蓝图）
+    from blackjack_api import blackjack
+    from freecell_api import freecell
+    app.register_blueprint(main)
+    app.register_blueprint(blackjack)
+    app.register_blueprint(freecell)
+    return app
+
+
+app = create_app()
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        migrate()
+        leaderboard.rebuild()
     # print([rule.rule for rule in app.url_map.iter_rules()])
     app.run(debug=True)
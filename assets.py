@@ -0,0 +1,253 @@
+"""Card sprite build and in-memory serving.
+
+The 52 card faces in static/cards are bundled into one SVG "stack": each
+card is a <g id="king_of_hearts"> hidden unless it is the :target, so
+<img src="cards.<hash>.svg#king_of_hearts"> shows that card and the page
+loads one file instead of one per card. Element ids inside each card are
+prefixed with the card name so the files' gradients and clip paths do not
+collide.
+
+The build writes the sprite under a content-hash name, gzip and (when the
+brotli package is installed) brotli variants next to it, and a manifest:
+
+    python assets.py           or   flask --app app build-assets
+
+AssetStore loads the build into memory on first use and serves it at
+/assets/<name> with the best encoding the client accepts, a strong ETag and
+an immutable one-year Cache-Control: the hash in the name changes whenever
+the content does, so browsers never need to revalidate. Without a build it
+builds the sprite in memory (uncompressed variants only) and logs a warning.
+
+Config:
+    ASSET_BUILD_DIR   where the build is written and read
+                      (default static/dist under the app root)
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+from flask import Response, abort, current_app, request, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CARD_DIR = os.path.join(ROOT, 'static', 'cards')
+SPRITE = 'cards.svg'
+MANIFEST = 'manifest.json'
+CARD_FILE = re.compile(r'^((?:\d+|ace|jack|queen|king)_of_(?:clubs|diamonds|hearts|spades))\.svg$')
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+# Editor and metadata namespaces dropped from the bundle
+DROPPED_NS = ('http://www.inkscape.org/namespaces/inkscape',
+              'http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd',
+              'http://www.w3.org/1999/02/22-rdf-syntax-ns#')
+URL_REF = re.compile(r'url\(#([^)]+)\)')
+EDITOR_STYLE = re.compile(r';?-inkscape-[\w-]+:[^;]*')
+TEXT_TAGS = {f'{{{SVG_NS}}}text', f'{{{SVG_NS}}}tspan'}
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Preferred first
+ENCODINGS = ('br', 'gzip')
+SUFFIX = {'br': '.br', 'gzip': '.gz'}
+
+Asset = namedtuple('Asset', 'etag mimetype bodies')
+
+ET.register_namespace('', SVG_NS)
+ET.register_namespace('xlink', XLINK_NS)
+
+
+def _dropped(name):
+    return name.startswith('{') and name[1:].split('}', 1)[0] in DROPPED_NS
+
+
+def _card_group(name, root):
+    """The card's drawing as a <g id=name>, with its ids prefixed by name."""
+    group = ET.Element(f'{{{SVG_NS}}}g', {'id': name, 'class': 'card'})
+    group.extend(child for child in root
+                 if not _dropped(child.tag) and child.tag != f'{{{SVG_NS}}}metadata')
+    prefix = name + '-'
+    for parent in group.iter():
+        # Drop indentation between elements; whitespace inside text is kept
+        if parent.tag in TEXT_TAGS:
+            continue
+        if parent.text and not parent.text.strip():
+            parent.text = None
+        for child in parent:
+            if child.tail and not child.tail.strip():
+                child.tail = None
+    for element in group.iter():
+        if element is group:
+            continue
+        if 'style' in element.attrib:
+            element.set('style', EDITOR_STYLE.sub('', element.get('style')).lstrip(';'))
+        for key in [key for key in element.attrib if _dropped(key)]:
+            del element.attrib[key]
+        for key, value in element.attrib.items():
+            if key == 'id':
+                element.set(key, prefix + value)
+            elif key in ('href', f'{{{XLINK_NS}}}href') and value.startswith('#'):
+                element.set(key, '#' + prefix + value[1:])
+            elif 'url(#' in value:
+                element.set(key, URL_REF.sub(lambda match: f'url(#{prefix}{match.group(1)})', value))
+    return group
+
+
+def build_sprite(card_dir=CARD_DIR):
+    """The card stack SVG as bytes; the same cards always give the same bytes."""
+    names = sorted(match.group(1) for match in map(CARD_FILE.match, os.listdir(card_dir)) if match)
+    sprite = None
+    for name in names:
+        root = ET.parse(os.path.join(card_dir, name + '.svg')).getroot()
+        if sprite is None:
+            # Every card has the same size, so the stack takes the first card's
+            sprite = ET.Element(f'{{{SVG_NS}}}svg', {key: root.get(key) for key in ('width', 'height', 'viewBox')})
+            style = ET.SubElement(sprite, f'{{{SVG_NS}}}style')
+            style.text = '.card{display:none}.card:target{display:inline}'
+        sprite.append(_card_group(name, root))
+    if sprite is None:
+        raise ValueError(f'No card SVGs in {card_dir}')
+    return ET.tostring(sprite, encoding='utf-8', xml_declaration=True)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def hashed_name(name, data):
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{content_hash(data)}{ext}'
+
+
+def compress(data):
+    """{encoding: body} for every encoding available here."""
+    bodies = {'gzip': gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(data, quality=11)
+    return bodies
+
+
+def build(out_dir, card_dir=CARD_DIR):
+    """Write the sprite, its compressed variants and the manifest; returns the manifest."""
+    data = build_sprite(card_dir)
+    name = hashed_name(SPRITE, data)
+    os.makedirs(out_dir, exist_ok=True)
+    files = {name: data}
+    for encoding, body in compress(data).items():
+        files[name + SUFFIX[encoding]] = body
+    for filename, body in files.items():
+        with open(os.path.join(out_dir, filename), 'wb') as f:
+            f.write(body)
+    manifest = {SPRITE: name}
+    with open(os.path.join(out_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class AssetBuild:
+    """One app's build, loaded on first use."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self.manifest = None
+        self.assets = None
+
+    def reset(self):
+        """Forget the loaded build; the next use loads it again."""
+        with self._lock:
+            self.manifest = self.assets = None
+
+    def load(self):
+        with self._lock:
+            if self.assets is not None:
+                return self
+            build_dir = self.app.config['ASSET_BUILD_DIR']
+            try:
+                with open(os.path.join(build_dir, MANIFEST)) as f:
+                    manifest = json.load(f)
+            except FileNotFoundError:
+                logger.warning('No asset build in %s; building the card sprite in memory '
+                               '(run python assets.py for compressed variants)', build_dir)
+                data = build_sprite()
+                manifest = {SPRITE: hashed_name(SPRITE, data)}
+                assets = {manifest[SPRITE]: Asset(content_hash(data), 'image/svg+xml', {None: data})}
+            else:
+                assets = {}
+                for name in manifest.values():
+                    bodies = {}
+                    for encoding, suffix in [(None, '')] + [(encoding, SUFFIX[encoding]) for encoding in ENCODINGS]:
+                        path = os.path.join(build_dir, name + suffix)
+                        if os.path.exists(path):
+                            with open(path, 'rb') as f:
+                                bodies[encoding] = f.read()
+                    assets[name] = Asset(content_hash(bodies[None]), 'image/svg+xml', bodies)
+            self.manifest, self.assets = manifest, assets
+            return self
+
+
+class AssetStore:
+    """Gives each app its AssetBuild as app.extensions['assets'] and serves it."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSET_BUILD_DIR', os.path.join(app.root_path, 'static', 'dist'))
+        app.extensions['assets'] = AssetBuild(app)
+        app.add_url_rule('/assets/<filename>', 'assets', self.serve)
+        app.add_template_global(self.url, 'asset_url')
+
+    def _build(self):
+        return current_app.extensions['assets'].load()
+
+    def reset(self):
+        """Forget the current app's loaded build; the next use loads it again."""
+        current_app.extensions['assets'].reset()
+
+    def url(self, name):
+        """URL of the current build of an asset, e.g. asset_url('cards.svg')."""
+        return url_for('assets', filename=self._build().manifest[name])
+
+    def serve(self, filename):
+        asset = self._build().assets.get(filename)
+        if asset is None:
+            abort(404)
+        encoding = next((encoding for encoding in ENCODINGS
+                         if encoding in asset.bodies and request.accept_encodings[encoding]), None)
+        etag = asset.etag + ('-' + encoding if encoding else '')
+        headers = {'Cache-Control': CACHE_CONTROL, 'Vary': 'Accept-Encoding', 'ETag': f'"{etag}"'}
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+        response = Response(asset.bodies[encoding], mimetype=asset.mimetype, headers=headers)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+
+assets = AssetStore()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the card sprite and its compressed variants')
+    parser.add_argument('--out', default=os.path.join(ROOT, 'static', 'dist'), help='build directory')
+    args = parser.parse_args(argv)
+    manifest = build(args.out)
+    print(f"Built {manifest[SPRITE]} in {args.out}" + ('' if brotli else ' (brotli not installed: gzip only)'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Replay blackjack hands from their GameRecord for dispute resolution.
+
+A GameRecord keeps the seed and deck count of the shoe the hand was dealt
+from, the position of its first card and the player's actions, one letter
+each:
+
+    h  hit    s  stand    d  double down
+
+A hand that ended on a hit (player or dealer bust) or on a blackjack at the
+deal has no closing letter. replay_hand deals the shoe again from that
+position with the game's rules and returns the cards, scores and result;
+audit_record compares them with what was recorded.
+
+    python audit.py 17 42
+"""
+import argparse
+import sys
+
+import game_logic
+from shoe import fast_forward
+
+
+def deal_record(game_session, last_action):
+    """GameRecord fields that let replay_hand deal this finished hand again.
+
+    last_action is the action that ended the hand ('start' for a blackjack
+    on the deal).
+    """
+    draws = len(game_session.player_hand) - 2
+    if last_action == 'double_down':
+        actions = 'h' * (draws - 1) + 'd'
+    elif last_action == 'stand':
+        actions = 'h' * draws + 's'
+    else:
+        actions = 'h' * draws
+    dealt = len(game_session.player_hand) + len(game_session.dealer_hand)
+    return {
+        'seed': game_session.seed,
+        'decks': game_session.decks,
+        'cursor': game_session.cursor - dealt,
+        'actions': actions,
+    }
+
+
+def replay_hand(seed, decks, cursor, actions):
+    """Deal a hand from the shoe at cursor and play actions on it."""
+    deck = fast_forward(seed, decks, cursor)
+    player_hand = game_logic.deal_cards(deck, 2)
+    dealer_hand = game_logic.deal_cards(deck, 2)
+
+    def finish(result=None):
+        player_score = game_logic.calculate_score(player_hand)
+        dealer_score = game_logic.calculate_score(dealer_hand)
+        return {
+            'player_hand': player_hand,
+            'dealer_hand': dealer_hand,
+            'player_score': player_score,
+            'dealer_score': dealer_score,
+            'result': result or game_logic.determine_result(player_score, dealer_score),
+            'cursor': deck.cursor,
+        }
+
+    if game_logic.is_blackjack(player_hand):
+        game_logic.dealer_ai_turn(deck, dealer_hand, 21)
+        return finish()
+
+    for action in actions:
+        if action not in 'hsd':
+            raise ValueError(f'Unknown action {action!r}')
+        if action == 's':
+            game_logic.dealer_ai_turn(deck, dealer_hand, game_logic.calculate_score(player_hand))
+            return finish()
+        player_hand.append(deck.pop())
+        player_score = game_logic.calculate_score(player_hand)
+        if player_score > 21:
+            return finish('lose')
+        if action == 'd':
+            game_logic.dealer_ai_turn(deck, dealer_hand, player_score)
+            return finish()
+        # A hit is answered by at most one dealer card
+        if game_logic.dealer_should_hit(dealer_hand, player_score, deck=deck) and deck:
+            dealer_hand.append(deck.pop())
+            if game_logic.calculate_score(dealer_hand) > 21:
+                return finish('win')
+    raise ValueError('The actions do not finish the hand')
+
+
+def audit_record(record):
+    """Replay a GameRecord; returns the replayed hand with 'matches' set."""
+    if record.seed is None:
+        raise ValueError(f'Game record {record.id} has no deal recorded')
+    hand = replay_hand(record.seed, record.decks, record.cursor, record.actions)
+    hand['matches'] = (hand['result'] == record.result and hand['player_score'] == record.player_score
+                       and hand['dealer_score'] == record.dealer_score)
+    return hand
+
+
+def describe(cards):
+    return ' '.join(f"{card['value']}{card['suit'][0]}" for card in game_logic.cards_to_dicts(cards))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay blackjack hands from their game records')
+    parser.add_argument('record_ids', type=int, nargs='+', metavar='RECORD_ID')
+    args = parser.parse_args(argv)
+
+    from app import app
+    from database import db, GameRecord
+
+    failures = 0
+    with app.app_context():
+        for record_id in args.record_ids:
+            record = db.session.get(GameRecord, record_id)
+            if record is None:
+                print(f'#{record_id}: no such game record')
+                failures += 1
+                continue
+            try:
+                hand = audit_record(record)
+            except ValueError as e:
+                print(f'#{record_id}: {e}')
+                failures += 1
+                continue
+            status = 'OK' if hand['matches'] else 'MISMATCH'
+            failures += not hand['matches']
+            print(f"#{record_id} user {record.user_id} {record.actions or '-'}: "
+                  f"player {describe(hand['player_hand'])} ({hand['player_score']}) "
+                  f"dealer {describe(hand['dealer_hand'])} ({hand['dealer_score']}) "
+                  f"{hand['result']} / recorded {record.result} {record.player_score}-{record.dealer_score} "
+                  f"[{status}]")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
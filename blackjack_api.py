@@ -1,20 +1,43 @@
-from flask import jsonify, request, session
+from flask import Blueprint, current_app, jsonify, redirect, render_template, request, session, url_for
 from datetime import datetime
+from functools import wraps
 import logging
 
 from database import db, User, GameSession, GameRecord, Ranking
-from database import update_rankings_db, add_game_record
+from database import update_rankings_db, add_game_record, unit_of_work
 import game_logic
+import odds
+from session_store import game_sessions
+from shoe import shoes
+from audit import deal_record
+from leaderboard import leaderboard
 
 logger = logging.getLogger(__name__)
 
-# Get app reference (will be initialized when this is imported)
-from app import app
+blackjack = Blueprint('blackjack', __name__)
 
 class GameError(Exception):
     """Custom exception for game-related errors."""
     pass
 
+class ActionError(GameError):
+    """A game action that is not allowed right now (answered with 400)."""
+    pass
+
+def transactional(view):
+    """Run all writes of an API action in one transaction.
+
+    Error responses (status >= 400) roll the transaction back.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with unit_of_work() as uow:
+            rv = view(*args, **kwargs)
+            if isinstance(rv, tuple) and rv[1] >= 400:
+                uow.rollback_only = True
+            return rv
+    return wrapper
+
 def get_current_user():
     """Get current logged-in user."""
     if 'username' not in session:
@@ -32,21 +55,27 @@ def get_current_game_session():
     if not game_session_id:
         raise GameError('游戏未开始')
     
-    game_session = GameSession.query.get(game_session_id)
+    game_session = game_sessions.get(game_session_id)
     if not game_session or game_session.game_over:
         raise GameError('游戏未开始或已结束')
     
     return game_session
 
 def update_game_session(game_session, **kwargs):
-    """Update game session with provided fields."""
+    """Update game session with provided fields and hand it back to the session store."""
     for key, value in kwargs.items():
         setattr(game_session, key, value)
     game_session.updated_at = datetime.utcnow()
-    db.session.commit()
+    if game_session.game_over:
+        shoes.finish_hand(game_session)
+    game_sessions.save(game_session)
 
-def handle_game_end(game_session, result):
-    """Handle end game logic including payouts and records."""
+def handle_game_end(game_session, result, last_action):
+    """Handle end game logic including payouts and records.
+
+    last_action is the action that ended the hand; with the session's shoe
+    position it lets audit.py replay the hand from its record.
+    """
     user = User.query.get(game_session.user_id)
     
     # Calculate payout
@@ -65,337 +94,515 @@ def handle_game_end(game_session, result):
         result, 
         game_session.player_score, 
         game_session.dealer_score, 
-        game_session.current_bet
+        game_session.current_bet,
+        payout,
+        deal=deal_record(game_session, last_action)
     )
     
     if result != 'draw':
         update_rankings_db(game_session.user_id, payout)
     
-    db.session.commit()
     return user.balance
 
-@app.route('/api/game/start', methods=['POST'])
-def start_game():
-    """Start a new blackjack game."""
-    try:
-        user = get_current_user()
-        data = request.get_json() or {}
-        bet_amount = data.get('bet_amount', 0)
-        
-        # Validate bet amount
-        if not isinstance(bet_amount, (int, float)) or bet_amount <= 0:
-            return jsonify({'error': '下注金额必须大于0'}), 400
-        
-        if user.balance < bet_amount:
-            return jsonify({'error': '余额不足'}), 400
-
-        # Deduct bet amount
-        user.balance -= bet_amount
-        
-        # Create and shuffle deck
-        deck = game_logic.create_deck()
-        game_logic.shuffle_deck(deck)
-
-        # Deal initial cards
-        player_hand = game_logic.deal_cards(deck, 2)
-        dealer_hand = game_logic.deal_cards(deck, 2)
-
-        # Calculate scores
-        player_score = game_logic.calculate_score(player_hand)
-        dealer_score = game_logic.calculate_score(dealer_hand)
-
-        # Create game session
-        new_game_session = GameSession(
-            user_id=user.id,
-            deck=deck,
-            player_hand=player_hand,
+def play_start(user, bet_amount):
+    """Deduct the bet, deal a new hand and return its state."""
+    # Validate bet amount
+    if not isinstance(bet_amount, (int, float)) or bet_amount <= 0:
+        raise ActionError('下注金额必须大于0')
+
+    if user.balance < bet_amount:
+        raise ActionError('余额不足')
+
+    # Deduct bet amount
+    user.balance -= bet_amount
+
+    # Deal from the user's shoe
+    shoe = shoes.start_hand(user.id)
+    deck = shoes.pile(shoe)
+
+    # Deal initial cards
+    player_hand = game_logic.deal_cards(deck, 2)
+    dealer_hand = game_logic.deal_cards(deck, 2)
+
+    # Calculate scores
+    player_score = game_logic.calculate_score(player_hand)
+    dealer_score = game_logic.calculate_score(dealer_hand)
+
+    # Create game session
+    new_game_session = game_sessions.create(
+        user_id=user.id,
+        shoe_id=shoe.id,
+        seed=shoe.seed,
+        decks=shoe.decks,
+        cursor=deck.cursor,
+        player_hand=player_hand,
+        dealer_hand=dealer_hand,
+        player_score=player_score,
+        dealer_score=dealer_score,
+        current_bet=bet_amount,
+        game_over=False
+    )
+
+    session['game_session_id'] = new_game_session.id
+
+    response_data = {
+        'player_hand': game_logic.cards_to_dicts(player_hand),
+        'dealer_hand': game_logic.cards_to_dicts(dealer_hand),
+        'player_score': player_score,
+        'dealer_score': dealer_score,
+        'current_bet': bet_amount,
+        'balance': user.balance,
+        'game_over': False
+    }
+
+    # Check for player blackjack
+    if game_logic.is_blackjack(player_hand):
+        dealer_hand = list(dealer_hand)
+        dealer_final_score = game_logic.dealer_ai_turn(deck, dealer_hand, player_score)
+        update_game_session(
+            new_game_session,
+            cursor=deck.cursor,
             dealer_hand=dealer_hand,
-            player_score=player_score,
-            dealer_score=dealer_score,
-            current_bet=bet_amount,
-            game_over=False
+            dealer_score=dealer_final_score,
+            game_over=True
         )
-        db.session.add(new_game_session)
-        db.session.commit()
 
-        session['game_session_id'] = new_game_session.id
+        result = game_logic.determine_result(player_score, dealer_final_score)
 
-        response_data = {
-            'player_hand': player_hand,
-            'dealer_hand': dealer_hand,
-            'player_score': player_score,
-            'dealer_score': dealer_score,
-            'current_bet': bet_amount,
-            'balance': user.balance,
-            'game_over': False
+        # Handle blackjack payout (1.5x)
+        payout = 0
+        if result == 'win':
+            payout = bet_amount * 2.5
+        elif result == 'draw':
+            payout = bet_amount
+        user.balance += payout
+
+        response_data.update({
+            'game_over': True,
+            'dealer_hand': game_logic.cards_to_dicts(new_game_session.dealer_hand),
+            'dealer_score': new_game_session.dealer_score,
+            'result': result,
+            'balance': user.balance
+        })
+
+        # Record game
+        add_game_record(user.id, result, player_score, dealer_final_score, bet_amount, payout,
+                        deal=deal_record(new_game_session, 'start'))
+        if result != 'draw':
+            update_rankings_db(user.id, bet_amount * (2.5 if result == 'win' else 0))
+    else:
+        response_data['odds'] = odds.hand_odds(player_hand, dealer_hand, deck)
+
+    return response_data
+
+def play_hit(user, game_session):
+    """Deal the player one card; the dealer may take one card too."""
+    deck = shoes.deck(game_session)
+    if not deck:
+        raise ActionError('牌堆为空，无法要牌')
+
+    # Deal new card
+    new_card = deck.pop()
+
+    # Create new list to ensure SQLAlchemy detects the change
+    new_player_hand = list(game_session.player_hand)
+    new_player_hand.append(new_card)
+
+    game_session.cursor = deck.cursor
+    game_session.player_hand = new_player_hand
+    game_session.player_score = game_logic.calculate_score(game_session.player_hand)
+
+    # Check for player bust
+    if game_session.player_score > 21:
+        update_game_session(game_session, game_over=True)
+        balance = handle_game_end(game_session, 'lose', 'hit')
+
+        return {
+            'player_hand': game_logic.cards_to_dicts(game_session.player_hand),
+            'dealer_hand': game_logic.cards_to_dicts(game_session.dealer_hand),
+            'player_score': game_session.player_score,
+            'dealer_score': game_session.dealer_score,
+            'current_bet': game_session.current_bet,
+            'balance': balance,
+            'game_over': True,
+            'result': 'lose'
         }
 
-        # Check for player blackjack
-        if game_logic.is_blackjack(player_hand):
-            new_game_session.game_over = True
-            dealer_final_score = game_logic.dealer_ai_turn(
-                new_game_session.deck, 
-                new_game_session.dealer_hand, 
-                new_game_session.player_score
-            )
-            new_game_session.dealer_score = dealer_final_score
-            
-            result = game_logic.determine_result(player_score, dealer_final_score)
-            
-            # Handle blackjack payout (1.5x)
-            if result == 'win':
-                user.balance += bet_amount * 2.5
-            elif result == 'draw':
-                user.balance += bet_amount
-            
-            db.session.commit()
-            
-            response_data.update({
-                'game_over': True,
-                'dealer_hand': new_game_session.dealer_hand,
-                'dealer_score': new_game_session.dealer_score,
-                'result': result,
-                'balance': user.balance
-            })
-            
-            # Record game
-            add_game_record(user.id, result, player_score, dealer_final_score, bet_amount)
-            if result != 'draw':
-                update_rankings_db(user.id, bet_amount * (2.5 if result == 'win' else 0))
-
-        return jsonify(response_data)
-        
+    # Dealer takes one action if should hit
+    if game_logic.dealer_should_hit(game_session.dealer_hand, game_session.player_score, deck=deck):
+        if deck:
+            dealer_new_card = deck.pop()
+
+            # Create new list for dealer hand too
+            new_dealer_hand = list(game_session.dealer_hand)
+            new_dealer_hand.append(dealer_new_card)
+
+            game_session.cursor = deck.cursor
+            game_session.dealer_hand = new_dealer_hand
+            game_session.dealer_score = game_logic.calculate_score(game_session.dealer_hand)
+
+            # Check dealer bust
+            if game_session.dealer_score > 21:
+                update_game_session(game_session, game_over=True)
+                balance = handle_game_end(game_session, 'win', 'hit')
+
+                return {
+                    'player_hand': game_logic.cards_to_dicts(game_session.player_hand),
+                    'dealer_hand': game_logic.cards_to_dicts(game_session.dealer_hand),
+                    'player_score': game_session.player_score,
+                    'dealer_score': game_session.dealer_score,
+                    'current_bet': game_session.current_bet,
+                    'balance': balance,
+                    'game_over': True,
+                    'result': 'win'
+                }
+
+    # Update game state with the new hand and score data
+    update_game_session(
+        game_session,
+        player_hand=game_session.player_hand,
+        player_score=game_session.player_score,
+        dealer_hand=game_session.dealer_hand,
+        dealer_score=game_session.dealer_score,
+        cursor=game_session.cursor
+    )
+
+    return {
+        'player_hand': game_logic.cards_to_dicts(game_session.player_hand),
+        'dealer_hand': game_logic.cards_to_dicts(game_session.dealer_hand),
+        'player_score': game_session.player_score,
+        'dealer_score': game_session.dealer_score,
+        'current_bet': game_session.current_bet,
+        'balance': user.balance,
+        'game_over': False,
+        'odds': odds.hand_odds(game_session.player_hand, game_session.dealer_hand, deck)
+    }
+
+def play_stand(user, game_session):
+    """The dealer plays to completion and the hand is settled."""
+    deck = shoes.deck(game_session)
+
+    # Dealer plays to completion on a copy so SQLAlchemy sees the new list
+    dealer_hand = list(game_session.dealer_hand)
+    dealer_final_score = game_logic.dealer_ai_turn(deck, dealer_hand, game_session.player_score)
+
+    # Determine result
+    result = game_logic.determine_result(game_session.player_score, dealer_final_score)
+
+    # Update game session
+    update_game_session(
+        game_session,
+        cursor=deck.cursor,
+        dealer_hand=dealer_hand,
+        dealer_score=dealer_final_score,
+        game_over=True
+    )
+
+    # Handle payouts and records
+    balance = handle_game_end(game_session, result, 'stand')
+
+    return {
+        'player_hand': game_logic.cards_to_dicts(game_session.player_hand),
+        'dealer_hand': game_logic.cards_to_dicts(game_session.dealer_hand),
+        'player_score': game_session.player_score,
+        'dealer_score': dealer_final_score,
+        'result': result,
+        'balance': balance,
+        'current_bet': game_session.current_bet,
+        'game_over': True
+    }
+
+def play_double_down(user, game_session):
+    """Double the bet, take exactly one card, then stand."""
+    # Check if player can afford to double
+    if user.balance < game_session.current_bet:
+        raise ActionError('余额不足以加倍')
+
+    deck = shoes.deck(game_session)
+    if not deck:
+        raise ActionError('牌堆为空，无法要牌')
+
+    # Double the bet and deduct from balance
+    user.balance -= game_session.current_bet
+    game_session.current_bet *= 2
+
+    # Deal one card
+    new_card = deck.pop()
+
+    # Create new list to ensure SQLAlchemy detects the change
+    new_player_hand = list(game_session.player_hand)
+    new_player_hand.append(new_card)
+
+    game_session.cursor = deck.cursor
+    game_session.player_hand = new_player_hand
+    game_session.player_score = game_logic.calculate_score(game_session.player_hand)
+
+    # Check for player bust
+    if game_session.player_score > 21:
+        update_game_session(game_session, game_over=True)
+        balance = handle_game_end(game_session, 'lose', 'double_down')
+
+        return {
+            'player_hand': game_logic.cards_to_dicts(game_session.player_hand),
+            'dealer_hand': game_logic.cards_to_dicts(game_session.dealer_hand),
+            'player_score': game_session.player_score,
+            'dealer_score': game_session.dealer_score,
+            'current_bet': game_session.current_bet,
+            'balance': balance,
+            'game_over': True,
+            'result': 'lose',
+            'new_card': game_logic.card_to_dict(new_card)
+        }
+
+    # Dealer plays to completion on a copy so SQLAlchemy sees the new list
+    dealer_hand = list(game_session.dealer_hand)
+    dealer_final_score = game_logic.dealer_ai_turn(deck, dealer_hand, game_session.player_score)
+
+    # Determine result
+    result = game_logic.determine_result(game_session.player_score, dealer_final_score)
+
+    # Update game session
+    update_game_session(
+        game_session,
+        cursor=deck.cursor,
+        dealer_hand=dealer_hand,
+        dealer_score=dealer_final_score,
+        game_over=True
+    )
+
+    # Handle payouts and records
+    balance = handle_game_end(game_session, result, 'double_down')
+
+    return {
+        'player_hand': game_logic.cards_to_dicts(game_session.player_hand),
+        'dealer_hand': game_logic.cards_to_dicts(game_session.dealer_hand),
+        'player_score': game_session.player_score,
+        'dealer_score': dealer_final_score,
+        'current_bet': game_session.current_bet,
+        'balance': balance,
+        'game_over': True,
+        'result': result,
+        'new_card': game_logic.card_to_dict(new_card)
+    }
+
+# Actions taken on the current hand
+ACTIONS = {
+    'hit': play_hit,
+    'stand': play_stand,
+    'double_down': play_double_down,
+}
+
+# Steps one batch request may play; a strategy hand usually takes two or more
+BATCH_MAX_STEPS = 500
+BATCH_MAX_HANDS = BATCH_MAX_STEPS // 2
+
+# Named batch strategies, with the same parameters as simulator.py
+STRATEGIES = {
+    'stand_17': {'stand_on': 17},
+    'stand_17_double_10_11': {'stand_on': 17, 'double_on': [10, 11]},
+    'never_bust': {'stand_on': 12},
+}
+
+@blackjack.route('/blackjack')
+def blackjack_game():
+    if 'username' not in session:
+        return redirect(url_for('main.login'))
+    # 在 index 页面显示排名前列
+    player_scores_display = leaderboard.page(1)
+    return render_template('blackjack.html', username=session['username'], player_scores=player_scores_display)
+
+@blackjack.route('/api/game/start', methods=['POST'])
+@transactional
+def start_game():
+    """Start a new blackjack game."""
+    try:
+        user = get_current_user()
+        data = request.get_json() or {}
+        return jsonify(play_start(user, data.get('bet_amount', 0)))
+    except ActionError as e:
+        return jsonify({'error': str(e)}), 400
     except GameError as e:
         return jsonify({'error': str(e)}), 401
     except Exception as e:
         logger.error(f"Error starting game: {e}")
         return jsonify({'error': '游戏启动失败'}), 500
 
-@app.route('/api/game/hit', methods=['POST'])
+@blackjack.route('/api/game/hit', methods=['POST'])
+@transactional
 def hit():
     """Player hits (takes another card)."""
     try:
         user = get_current_user()
         game_session = get_current_game_session()
-
-        if not game_session.deck:
-            return jsonify({'error': '牌堆为空，无法要牌'}), 400
-
-        # Create new deck list and deal new card
-        new_deck = list(game_session.deck)
-        new_card = new_deck.pop()
-        
-        # Create new list to ensure SQLAlchemy detects the change
-        new_player_hand = list(game_session.player_hand)
-        new_player_hand.append(new_card)
-        
-        game_session.deck = new_deck
-        game_session.player_hand = new_player_hand
-        game_session.player_score = game_logic.calculate_score(game_session.player_hand)
-
-        # Check for player bust
-        if game_session.player_score > 21:
-            update_game_session(game_session, game_over=True)
-            balance = handle_game_end(game_session, 'lose')
-            
-            return jsonify({
-                'player_hand': game_session.player_hand,
-                'dealer_hand': game_session.dealer_hand,
-                'player_score': game_session.player_score,
-                'dealer_score': game_session.dealer_score,
-                'current_bet': game_session.current_bet,
-                'balance': balance,
-                'game_over': True,
-                'result': 'lose'
-            })
-
-        # Dealer takes one action if should hit
-        if game_logic.dealer_should_hit(game_session.dealer_hand, game_session.player_score):
-            if game_session.deck:
-                # Create new deck list for dealer card
-                new_deck = list(game_session.deck)
-                dealer_new_card = new_deck.pop()
-                
-                # Create new list for dealer hand too
-                new_dealer_hand = list(game_session.dealer_hand)
-                new_dealer_hand.append(dealer_new_card)
-                
-                game_session.deck = new_deck
-                game_session.dealer_hand = new_dealer_hand
-                game_session.dealer_score = game_logic.calculate_score(game_session.dealer_hand)
-                
-                # Check dealer bust
-                if game_session.dealer_score > 21:
-                    update_game_session(game_session, game_over=True)
-                    balance = handle_game_end(game_session, 'win')
-                    
-                    return jsonify({
-                        'player_hand': game_session.player_hand,
-                        'dealer_hand': game_session.dealer_hand,
-                        'player_score': game_session.player_score,
-                        'dealer_score': game_session.dealer_score,
-                        'current_bet': game_session.current_bet,
-                        'balance': balance,
-                        'game_over': True,
-                        'result': 'win'
-                    })
-
-        # Update game state with the new hand and score data
-        update_game_session(
-            game_session,
-            player_hand=game_session.player_hand,
-            player_score=game_session.player_score,
-            dealer_hand=game_session.dealer_hand,
-            dealer_score=game_session.dealer_score,
-            deck=game_session.deck
-        )
-
-        return jsonify({
-            'player_hand': game_session.player_hand,
-            'dealer_hand': game_session.dealer_hand,
-            'player_score': game_session.player_score,
-            'dealer_score': game_session.dealer_score,
-            'current_bet': game_session.current_bet,
-            'balance': user.balance,
-            'game_over': False
-        })
-        
+        return jsonify(play_hit(user, game_session))
+    except ActionError as e:
+        return jsonify({'error': str(e)}), 400
     except GameError as e:
         return jsonify({'error': str(e)}), 401
     except Exception as e:
         logger.error(f"Error in hit: {e}")
         return jsonify({'error': '操作失败'}), 500
 
-@app.route('/api/game/stand', methods=['POST'])
+@blackjack.route('/api/game/stand', methods=['POST'])
+@transactional
 def stand():
     """Player stands (dealer plays to completion)."""
     try:
         user = get_current_user()
         game_session = get_current_game_session()
-
-        # Dealer plays to completion
-        dealer_final_score = game_logic.dealer_ai_turn(
-            game_session.deck, 
-            game_session.dealer_hand, 
-            game_session.player_score
-        )
-        
-        # Determine result
-        result = game_logic.determine_result(game_session.player_score, dealer_final_score)
-        
-        # Update game session
-        update_game_session(
-            game_session,
-            dealer_score=dealer_final_score,
-            game_over=True
-        )
-        
-        # Handle payouts and records
-        balance = handle_game_end(game_session, result)
-
-        return jsonify({
-            'player_hand': game_session.player_hand,
-            'dealer_hand': game_session.dealer_hand,
-            'player_score': game_session.player_score,
-            'dealer_score': dealer_final_score,
-            'result': result,
-            'balance': balance,
-            'current_bet': game_session.current_bet,
-            'game_over': True
-        })
-        
+        return jsonify(play_stand(user, game_session))
+    except ActionError as e:
+        return jsonify({'error': str(e)}), 400
     except GameError as e:
         return jsonify({'error': str(e)}), 401
     except Exception as e:
         logger.error(f"Error in stand: {e}")
         return jsonify({'error': '操作失败'}), 500
 
-@app.route('/api/game/double_down', methods=['POST'])
+@blackjack.route('/api/game/double_down', methods=['POST'])
+@transactional
 def double_down():
     """Player doubles down (double bet, take one card, then stand)."""
     try:
         user = get_current_user()
         game_session = get_current_game_session()
+        return jsonify(play_double_down(user, game_session))
+    except ActionError as e:
+        return jsonify({'error': str(e)}), 400
+    except GameError as e:
+        return jsonify({'error': str(e)}), 401
+    except Exception as e:
+        logger.error(f"Error in double_down: {e}")
+        return jsonify({'error': '操作失败'}), 500
 
-        # Check if player can afford to double
-        if user.balance < game_session.current_bet:
-            return jsonify({'error': '余额不足以加倍'}), 400
-
-        # Double the bet and deduct from balance
-        user.balance -= game_session.current_bet
-        game_session.current_bet *= 2
-
-        if not game_session.deck:
-            return jsonify({'error': '牌堆为空，无法要牌'}), 400
-
-        # Create new deck list and deal one card
-        new_deck = list(game_session.deck)
-        new_card = new_deck.pop()
-        
-        # Create new list to ensure SQLAlchemy detects the change
-        new_player_hand = list(game_session.player_hand)
-        new_player_hand.append(new_card)
-        
-        game_session.deck = new_deck
-        game_session.player_hand = new_player_hand
-        game_session.player_score = game_logic.calculate_score(game_session.player_hand)
-
-        # Check for player bust
-        if game_session.player_score > 21:
-            update_game_session(game_session, game_over=True)
-            balance = handle_game_end(game_session, 'lose')
-            
-            return jsonify({
-                'player_hand': game_session.player_hand,
-                'dealer_hand': game_session.dealer_hand,
-                'player_score': game_session.player_score,
-                'dealer_score': game_session.dealer_score,
-                'current_bet': game_session.current_bet,
-                'balance': balance,
-                'game_over': True,
-                'result': 'lose',
-                'new_card': new_card
-            })
-
-        # Dealer plays to completion
-        dealer_final_score = game_logic.dealer_ai_turn(
-            game_session.deck,
-            game_session.dealer_hand,
-            game_session.player_score
-        )
-        
-        # Determine result
-        result = game_logic.determine_result(game_session.player_score, dealer_final_score)
-        
-        # Update game session
-        update_game_session(
-            game_session,
-            dealer_score=dealer_final_score,
-            game_over=True
-        )
-        
-        # Handle payouts and records
-        balance = handle_game_end(game_session, result)
+def batch_script(data):
+    """Expand an explicit action script into (action, bet_amount) steps, or None."""
+    actions = data.get('actions')
+    if actions is None:
+        return None
+    if not isinstance(actions, list) or not actions:
+        raise ActionError('actions 必须是非空列表')
+    if len(actions) > BATCH_MAX_STEPS:
+        raise ActionError(f'一次最多执行 {BATCH_MAX_STEPS} 步')
+    steps = []
+    for action in actions:
+        if isinstance(action, str):
+            action = {'action': action}
+        if not isinstance(action, dict) or action.get('action') not in ('start',) + tuple(ACTIONS):
+            raise ActionError(f'未知操作: {action}')
+        steps.append((action['action'], action.get('bet_amount', data.get('bet_amount', 0))))
+    return steps
+
+def batch_strategy(data):
+    """Return (stand_on, double_on) for a named or inline strategy."""
+    strategy = data.get('strategy')
+    if isinstance(strategy, str):
+        if strategy not in STRATEGIES:
+            raise ActionError(f'未知策略: {strategy}')
+        strategy = STRATEGIES[strategy]
+    if not isinstance(strategy, dict):
+        raise ActionError('需要 actions 或 strategy')
+    stand_on = strategy.get('stand_on', 17)
+    double_on = strategy.get('double_on', ())
+    if not isinstance(stand_on, int) or not isinstance(double_on, (list, tuple)):
+        raise ActionError('策略参数无效')
+    return stand_on, frozenset(double_on)
+
+def strategy_action(state, user, stand_on, double_on):
+    """Next action for the simulator-style strategy on the current hand state."""
+    if (len(state['player_hand']) == 2 and state['player_score'] in double_on
+            and user.balance >= state['current_bet']):
+        return 'double_down'
+    if state['player_score'] < stand_on:
+        return 'hit'
+    return 'stand'
+
+def play_batch(user, data):
+    """Play a whole action script or strategy and return every step's state."""
+    steps = []
+
+    def play(action, bet_amount=None):
+        if len(steps) >= BATCH_MAX_STEPS:
+            raise ActionError(f'一次最多执行 {BATCH_MAX_STEPS} 步')
+        try:
+            if action == 'start':
+                state = play_start(user, bet_amount)
+            else:
+                state = ACTIONS[action](user, get_current_game_session())
+        except GameError as e:
+            e.step = len(steps)
+            raise
+        steps.append(dict(state, action=action))
+        return state
+
+    script = batch_script(data)
+    if script is not None:
+        for action, bet_amount in script:
+            play(action, bet_amount)
+    else:
+        stand_on, double_on = batch_strategy(data)
+        hands = data.get('hands', 1)
+        bet_amount = data.get('bet_amount', 0)
+        if not isinstance(hands, int) or hands <= 0:
+            raise ActionError('hands 必须大于0')
+        if hands > BATCH_MAX_HANDS:
+            raise ActionError(f'一次最多玩 {BATCH_MAX_HANDS} 局')
+        for _ in range(hands):
+            # Strategies stop quietly once the player can no longer cover the bet
+            if steps and isinstance(bet_amount, (int, float)) and user.balance < bet_amount:
+                break
+            state = play('start', bet_amount)
+            while not state['game_over']:
+                state = play(strategy_action(state, user, stand_on, double_on))
+
+    return {'steps': steps, 'balance': user.balance}
+
+@blackjack.route('/api/game/batch', methods=['POST'])
+@transactional
+def batch():
+    """Play an ordered action script or a named strategy in one request.
+
+    Body: {"actions": [{"action": "start", "bet_amount": 10}, "hit", "stand"]}
+    or {"strategy": "stand_17" | {"stand_on": 17, "double_on": [10, 11]},
+    "hands": 5, "bet_amount": 10}. Any failing step rolls back the whole batch.
+    """
+    try:
+        user = get_current_user()
+        return jsonify(play_batch(user, request.get_json() or {}))
+    except ActionError as e:
+        return jsonify({'error': str(e), 'step': getattr(e, 'step', None)}), 400
+    except GameError as e:
+        if getattr(e, 'step', None) is not None:
+            return jsonify({'error': str(e), 'step': e.step}), 400
+        return jsonify({'error': str(e)}), 401
+    except Exception as e:
+        logger.error(f"Error in batch: {e}")
+        return jsonify({'error': '操作失败'}), 500
 
-        return jsonify({
-            'player_hand': game_session.player_hand,
-            'dealer_hand': game_session.dealer_hand,
-            'player_score': game_session.player_score,
-            'dealer_score': dealer_final_score,
-            'current_bet': game_session.current_bet,
-            'balance': balance,
-            'game_over': True,
-            'result': result,
-            'new_card': new_card
-        })
-        
+@blackjack.route('/api/game/advice', methods=['GET'])
+def advice():
+    """Exact expected value of each action for the current hand.
+
+    EVs are net, in units of the current bet, computed from the cards left in
+    this hand's shoe (see odds.py). The exact hit EV is limited to
+    ADVICE_BUDGET new memo entries; past it 'hit' is a lower bound and
+    'exact' is false.
+    """
+    try:
+        user = get_current_user()
+        game_session = get_current_game_session()
+        evs = odds.advise(game_session.player_hand, game_session.dealer_hand, shoes.deck(game_session),
+                          can_double=user.balance >= game_session.current_bet,
+                          budget=current_app.config['ADVICE_BUDGET'])
+        evs['current_bet'] = game_session.current_bet
+        return jsonify(evs)
     except GameError as e:
         return jsonify({'error': str(e)}), 401
     except Exception as e:
-        logger.error(f"Error in double_down: {e}")
+        logger.error(f"Error in advice: {e}")
         return jsonify({'error': '操作失败'}), 500
 
-@app.route('/api/user/status', methods=['GET'])
+@blackjack.route('/api/user/status', methods=['GET'])
 def get_user_status():
     """Get current user status."""
     try:
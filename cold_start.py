@@ -0,0 +1,151 @@
+"""Cold-start benchmark: how quickly a fresh worker process can serve.
+
+Starts --runs fresh interpreters one after another against a temporary
+SQLite file. Each one times these phases:
+
+    import        import app (Flask, SQLAlchemy, the app built by create_app)
+    create_app    a second create_app() with every module already imported
+    migrate       migrate() on the database
+    first_page    the first GET / through the test client
+    first_hand    the first /api/game/start of a logged-in user
+    fork          fork the warmed-up process and serve /api/rankings from the
+                  child, as a pre-fork server's new worker would (POSIX only)
+
+The parent reports the median and worst time of each phase and of the whole
+process (total, from spawn to exit). Results can be saved and compared like
+load_test.py:
+
+    python cold_start.py --runs 10 --save cold.json
+    python cold_start.py --runs 10 --compare cold.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PHASES = ('import', 'create_app', 'migrate', 'first_page', 'first_hand', 'fork', 'total')
+
+
+def _timed(timings, phase, function):
+    start = time.perf_counter()
+    result = function()
+    timings[phase] = time.perf_counter() - start
+    return result
+
+
+def child():
+    """Run the phases in this process and print their timings as JSON."""
+    timings = {}
+    app_module = _timed(timings, 'import', lambda: __import__('app'))
+    app = _timed(timings, 'create_app', app_module.create_app)
+    from database import db, User
+
+    with app.app_context():
+        _timed(timings, 'migrate', app_module.migrate)
+        user = User(username='cold-start', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+    client = app.test_client()
+    response = _timed(timings, 'first_page', lambda: client.get('/'))
+    assert response.status_code == 200, response.status_code
+    with client.session_transaction() as session:
+        session['username'] = 'cold-start'
+    response = _timed(timings, 'first_hand', lambda: client.post('/api/game/start', json={'bet_amount': 10}))
+    assert response.status_code == 200, response.get_json()
+
+    if hasattr(os, 'fork'):
+        start = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            # The worker reads through the connections it opens itself
+            status = app.test_client().get('/api/rankings').status_code
+            os._exit(0 if status == 200 else 1)
+        _, status = os.waitpid(pid, 0)
+        assert status == 0, 'forked worker failed'
+        timings['fork'] = time.perf_counter() - start
+    print(json.dumps(timings))
+
+
+def run(runs=5):
+    """Time runs fresh processes; returns the summary."""
+    # Imported here: the children must not load SQLAlchemy before timing the import
+    from load_test import _git_commit
+
+    samples = {phase: [] for phase in PHASES}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(runs):
+            env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(tmp, f'cold_start_{i}.db'))
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'], env=env,
+                                    capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+            total = time.perf_counter() - start
+            timings = json.loads(output.strip().splitlines()[-1])
+            timings['total'] = total
+            for phase, seconds in timings.items():
+                samples[phase].append(seconds)
+    return {
+        'commit': _git_commit(),
+        'runs': runs,
+        'phases': {phase: {'median_ms': statistics.median(values) * 1000, 'max_ms': max(values) * 1000}
+                   for phase, values in samples.items() if values},
+    }
+
+
+def compare(baseline, current, tolerance=0.2):
+    """Return human-readable regressions of current's median times against baseline."""
+    regressions = []
+    for phase, now in current['phases'].items():
+        before = baseline['phases'].get(phase)
+        if before and before['median_ms'] and now['median_ms'] > before['median_ms'] * (1 + tolerance):
+            regressions.append(f"{phase} median_ms: {before['median_ms']:.1f} -> {now['median_ms']:.1f}")
+    return regressions
+
+
+def print_report(summary, baseline=None):
+    print(f"{summary['runs']} cold starts")
+    print(f"{'phase':<12}{'median ms':>11}{'max ms':>10}")
+    for phase, stats in summary['phases'].items():
+        line = f"{phase:<12}{stats['median_ms']:>11.1f}{stats['max_ms']:>10.1f}"
+        before = baseline and baseline['phases'].get(phase)
+        if before:
+            line += f"   (median was {before['median_ms']:.1f})"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes to time')
+    parser.add_argument('--save', metavar='FILE', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child()
+        return 0
+
+    summary = run(args.runs)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(summary, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if baseline is not None:
+        regressions = compare(baseline, summary, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Application settings from the environment and an optional settings file.
+
+configure(app) sets every setting from its environment variable (or its
+default), then loads the Python settings file named by APP_SETTINGS, if
+any, so a deployment can keep its settings in one file. Settings the
+extensions read (WRITE_BEHIND_*, PASSWORD_POOL_*, ...) can be set in the
+file as well; their defaults live with the extension.
+
+Database:
+    DATABASE_URL          SQLAlchemy URL (default sqlite:///blackjack.db)
+
+    SQLite connections get these pragmas as they are opened:
+    SQLITE_JOURNAL_MODE   WAL lets readers run alongside the one writer
+    SQLITE_BUSY_TIMEOUT   ms a writer waits for the lock before "database is locked"
+    SQLITE_SYNCHRONOUS    NORMAL fsyncs at checkpoints only; safe with WAL
+    SQLITE_MMAP_SIZE      bytes of the file read through mmap
+
+    Server databases (PostgreSQL, MySQL, ...) get a connection pool of:
+    DB_POOL_SIZE          connections kept open per process
+    DB_MAX_OVERFLOW       extra connections allowed under bursts
+    DB_POOL_TIMEOUT       seconds to wait for a free connection
+    DB_POOL_RECYCLE       seconds before a connection is replaced
+
+Forked worker processes open their own connections (see init_engine).
+"""
+import os
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Setting -> (environment variable, default, parser)
+SETTINGS = {
+    'SECRET_KEY': ('SECRET_KEY', 'your_secret_key_here', str),  # 生产环境应使用更安全的密钥
+    'SQLALCHEMY_DATABASE_URI': ('DATABASE_URL', 'sqlite:///blackjack.db', str),
+    'SQLITE_JOURNAL_MODE': ('SQLITE_JOURNAL_MODE', 'WAL', str),
+    'SQLITE_BUSY_TIMEOUT': ('SQLITE_BUSY_TIMEOUT', 5000, int),
+    'SQLITE_SYNCHRONOUS': ('SQLITE_SYNCHRONOUS', 'NORMAL', str),
+    'SQLITE_MMAP_SIZE': ('SQLITE_MMAP_SIZE', 256 * 1024 * 1024, int),
+    'DB_POOL_SIZE': ('DB_POOL_SIZE', 10, int),
+    'DB_MAX_OVERFLOW': ('DB_MAX_OVERFLOW', 20, int),
+    'DB_POOL_TIMEOUT': ('DB_POOL_TIMEOUT', 30, float),
+    'DB_POOL_RECYCLE': ('DB_POOL_RECYCLE', 1800, int),
+    'WRITE_BEHIND_ENABLED': ('WRITE_BEHIND', True, lambda value: value != '0'),
+    # 进行中的牌局存放位置：'db' 或进程内缓存 'memory'（需单进程或粘性会话）
+    'GAME_SESSION_STORE': ('GAME_SESSION_STORE', 'db', str),
+    'GAME_SESSION_PERSIST': ('GAME_SESSION_PERSIST', 'write-through', str),
+    # 牌靴：几副牌混洗在一起，发到切牌位置后重新洗牌
+    'SHOE_DECKS': ('SHOE_DECKS', 6, int),
+    'SHOE_PENETRATION': ('SHOE_PENETRATION', 0.75, float),
+    # 行动建议中精确计算要牌 EV 的预算（新缓存条目数），约 50 毫秒
+    'ADVICE_BUDGET': ('ADVICE_BUDGET', 5000, int),
+}
+
+# Setting -> (lowest, highest) allowed, checked by configure once every source is loaded
+LIMITS = {
+    'SHOE_DECKS': (1, 8),
+    'SHOE_PENETRATION': (0, 1),
+}
+
+# Set only when their variable is present; otherwise the extension's default applies
+OPTIONAL_SETTINGS = {
+    # 密码哈希在独立进程池中计算；0 表示在请求线程中计算
+    'PASSWORD_POOL_WORKERS': ('PASSWORD_POOL_WORKERS', int),
+}
+
+
+def from_environment(environ=os.environ):
+    """Every setting from environ, with defaults for missing variables."""
+    settings = {}
+    for name, (variable, default, parse) in SETTINGS.items():
+        settings[name] = parse(environ[variable]) if variable in environ else default
+    for name, (variable, parse) in OPTIONAL_SETTINGS.items():
+        if variable in environ:
+            settings[name] = parse(environ[variable])
+    return settings
+
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database."""
+    if is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        # Pool defaults suit SQLite; its tuning is in the pragmas
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': True,
+    }
+
+
+def sqlite_pragmas(config):
+    return (
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+    )
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in pragmas:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def check_limits(config):
+    """Raise ValueError for a setting outside its LIMITS, so a bad deployment fails to start."""
+    for name, (low, high) in LIMITS.items():
+        if not low <= config[name] <= high:
+            raise ValueError(f'{name} must be between {low} and {high}, not {config[name]!r}')
+
+
+def configure(app, settings=None):
+    """Load settings into app.config; call before the extensions' init_app.
+
+    settings, a dict, overrides both the environment and the settings file.
+    Raises ValueError if a setting is outside its LIMITS.
+    """
+    app.config.update(from_environment())
+    app.config.from_envvar('APP_SETTINGS', silent=True)
+    app.config.update(settings or {})
+    check_limits(app.config)
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+    options = engine_options(app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def init_engine(app, db):
+    """Tune the app's engines; call after db.init_app(app).
+
+    SQLite connections get the pragmas. Every engine is made fork-safe: a
+    forked worker drops the pooled connections it inherited, without closing
+    them under the parent, and opens its own.
+    """
+    pragmas = sqlite_pragmas(app.config)
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', lambda dbapi_connection, record: apply_pragmas(dbapi_connection, pragmas))
+        _dispose_after_fork(engine)
+
+
+def _dispose_after_fork(engine):
+    # A weak reference, so the hook does not keep engines of discarded apps alive
+    engine_ref = weakref.ref(engine)
+
+    def dispose():
+        engine = engine_ref()
+        if engine is not None:
+            engine.dispose(close=False)
+    os.register_at_fork(after_in_child=dispose)
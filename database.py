@@ -1,11 +1,17 @@
+from contextlib import contextmanager
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 import json
-from sqlalchemy.types import TypeDecorator, TEXT
-from sqlalchemy import ForeignKey
+from sqlalchemy.types import TypeDecorator, TEXT, LargeBinary
+from sqlalchemy import ForeignKey, event, func
 from sqlalchemy.orm import relationship
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 
+import game_logic
+from leaderboard import leaderboard
+from metrics import metrics
+
 # Initialize db here instead of importing from app
 db = SQLAlchemy()
 
@@ -25,6 +31,75 @@ class JSONEncodedDict(TypeDecorator):
         return value
 
 
+# Custom type for card lists: one byte per card code (0..51)
+class PackedCards(TypeDecorator):
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None:
+            value = bytes(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return value
+        if isinstance(value, str):
+            # Rows written before packing stored a JSON list of card dicts
+            return [game_logic.card_from_dict(card) for card in json.loads(value)]
+        return list(value)
+
+
+class UnitOfWork:
+    """State of the transaction opened by the outermost unit_of_work()."""
+
+    def __init__(self):
+        self.rollback_only = False
+
+
+@contextmanager
+def unit_of_work():
+    """Group every write of one action into a single transaction.
+
+    Helpers such as add_game_record and update_rankings_db only stage changes;
+    the outermost block commits once on exit, or rolls back if it raises or
+    sets rollback_only. Nested blocks join the enclosing transaction.
+    """
+    info = db.session.info
+    if 'unit_of_work' in info:
+        yield info['unit_of_work']
+        return
+
+    uow = info['unit_of_work'] = UnitOfWork()
+    try:
+        yield uow
+        if uow.rollback_only:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        info.pop('unit_of_work', None)
+
+
+def after_commit(callback):
+    """Run callback after the current transaction commits (dropped on rollback)."""
+    db.session.info.setdefault('after_commit', []).append(callback)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _run_after_commit(session):
+    for callback in session.info.pop('after_commit', []):
+        callback()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_commit(session):
+    session.info.pop('after_commit', None)
+
+
 # Database Models
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -34,6 +109,7 @@ class User(db.Model):
     game_sessions = relationship('GameSession', backref='user', lazy=True)
     rankings = relationship('Ranking', backref='user', lazy=True)
     game_records = relationship('GameRecord', backref='user', lazy=True)
+    freecell_records = relationship('FreeCellRecord', backref='user', lazy=True)
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -41,12 +117,27 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+class Shoe(db.Model):
+    """One shuffle of a user's multi-deck shoe; see shoe.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, ForeignKey('user.id'), nullable=False, index=True)
+    decks = db.Column(db.Integer, nullable=False)
+    seed = db.Column(db.BigInteger, nullable=False)
+    cut_card = db.Column(db.Integer, nullable=False)
+    cursor = db.Column(db.Integer, default=0, nullable=False)
+    in_play = db.Column(db.Boolean, default=False, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
 class GameSession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, ForeignKey('user.id'), nullable=False)
-    deck = db.Column(JSONEncodedDict, nullable=False)
-    player_hand = db.Column(JSONEncodedDict, nullable=False)
-    dealer_hand = db.Column(JSONEncodedDict, nullable=False)
+    user_id = db.Column(db.Integer, ForeignKey('user.id'), nullable=False, index=True)
+    shoe_id = db.Column(db.Integer, ForeignKey('shoe.id'), nullable=False)
+    # The shoe's seed and size regenerate its cards; cursor is the next card
+    seed = db.Column(db.BigInteger, nullable=False)
+    decks = db.Column(db.Integer, nullable=False)
+    cursor = db.Column(db.Integer, nullable=False)
+    player_hand = db.Column(PackedCards, nullable=False)
+    dealer_hand = db.Column(PackedCards, nullable=False)
     player_score = db.Column(db.Integer, nullable=False)
     dealer_score = db.Column(db.Integer, nullable=False)
     current_bet = db.Column(db.Integer, nullable=False)
@@ -56,8 +147,10 @@ class GameSession(db.Model):
 
 class Ranking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, ForeignKey('user.id'), nullable=False, index=True)
     score = db.Column(db.Integer, default=0, nullable=False)
+    # Leaderboard pages beyond the in-memory top K read in this order
+    __table_args__ = (db.Index('ix_ranking_score_desc', score.desc(), user_id),)
 
 class GameRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -67,29 +160,214 @@ class GameRecord(db.Model):
     dealer_score = db.Column(db.Integer, nullable=False)
     bet_amount = db.Column(db.Integer, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Deal of the hand for audit.py: shoe seed and size, position of the first
+    # card and the player's actions. Empty on records from before it was kept.
+    seed = db.Column(db.BigInteger)
+    decks = db.Column(db.Integer)
+    cursor = db.Column(db.Integer)
+    actions = db.Column(db.String(32))
+    # A user's history, newest first, and their per-user aggregates
+    __table_args__ = (db.Index('ix_game_record_user_id_timestamp', user_id, timestamp),)
 
+class FreeCellRecord(db.Model):
+    """A verified FreeCell win; moves is the one-byte-per-move replay log.
 
-# 异步更新排名 (使用数据库)
-def update_rankings_db(user_id, score):
-    # 查找或创建用户的排名记录
-    ranking = Ranking.query.filter_by(user_id=user_id).first()
-    if ranking:
-        if score > ranking.score:
-            ranking.score = score
-    else:
-        new_ranking = Ranking(user_id=user_id, score=score)
-        db.session.add(new_ranking)
-    db.session.commit()
+    Each user keeps one record per deal, their best score on it.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, ForeignKey('user.id'), nullable=False)
+    deal = db.Column(db.Integer, nullable=False)
+    moves = db.Column(db.LargeBinary, nullable=False)
+    move_count = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Integer, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    __table_args__ = (db.Index('ux_free_cell_record_user_deal', user_id, deal, unique=True),)
 
-# 异步添加游戏记录 (使用数据库)
-def add_game_record(user_id, result, player_score, dealer_score, bet_amount):
-    new_record = GameRecord(
-        user_id=user_id,
-        result=result,
-        player_score=player_score,
-        dealer_score=dealer_score,
-        bet_amount=bet_amount,
-        timestamp=datetime.utcnow()
+class FreeCellGame(db.Model):
+    """The numbered deal a user is playing, handed out by /api/freecell/deal.
+
+    Only this deal can be submitted for a score, once; assisted is set when
+    the solver gives hints or a solution while it is in play.
+    """
+    user_id = db.Column(db.Integer, ForeignKey('user.id'), primary_key=True)
+    deal = db.Column(db.Integer, nullable=False)
+    assisted = db.Column(db.Boolean, default=False, nullable=False)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class FailedWrite(db.Model):
+    """A write-behind write that failed every retry; payload is JSON.
+
+    write_behind.replay_failed_writes() writes these out again.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    error = db.Column(db.Text, nullable=False)
+    failed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class SchemaMigration(db.Model):
+    """A migration from migrations.py that has been applied to this database."""
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(80), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class UserStats(db.Model):
+    """Per-user totals over GameRecord, kept in step by add_game_record."""
+    user_id = db.Column(db.Integer, ForeignKey('user.id'), primary_key=True)
+    games = db.Column(db.Integer, default=0, nullable=False)
+    wins = db.Column(db.Integer, default=0, nullable=False)
+    losses = db.Column(db.Integer, default=0, nullable=False)
+    draws = db.Column(db.Integer, default=0, nullable=False)
+    total_wagered = db.Column(db.Integer, default=0, nullable=False)
+    net = db.Column(db.Float, default=0, nullable=False)
+
+    def to_dict(self):
+        return {
+            'games': self.games,
+            'wins': self.wins,
+            'losses': self.losses,
+            'draws': self.draws,
+            'total_wagered': self.total_wagered,
+            'net': self.net,
+        }
+
+
+# Payout (stake included) per unit bet when the real payout is not known
+RESULT_PAYOUT = {'win': 2, 'draw': 1, 'lose': 0}
+RESULT_COLUMN = {'win': 'wins', 'lose': 'losses', 'draw': 'draws'}
+
+
+def aggregate_game_records(user_id=None):
+    """Compute UserStats values from GameRecord with one GROUP BY query.
+
+    Returns {user_id: stats_dict}. GameRecord does not store the payout, so
+    net assumes even-money wins (blackjack bonuses are not reflected).
+    """
+    query = db.session.query(
+        GameRecord.user_id, GameRecord.result, func.count(GameRecord.id), func.sum(GameRecord.bet_amount)
     )
-    db.session.add(new_record)
+    if user_id is not None:
+        query = query.filter(GameRecord.user_id == user_id)
+    totals = {}
+    for uid, result, count, wagered in query.group_by(GameRecord.user_id, GameRecord.result):
+        stats = totals.setdefault(uid, {'games': 0, 'wins': 0, 'losses': 0, 'draws': 0, 'total_wagered': 0, 'net': 0.0})
+        stats['games'] += count
+        stats['total_wagered'] += wagered or 0
+        stats['net'] += (wagered or 0) * (RESULT_PAYOUT.get(result, 0) - 1)
+        if result in RESULT_COLUMN:
+            stats[RESULT_COLUMN[result]] += count
+    return totals
+
+
+def get_user_stats(user_id):
+    """Stats for user_id: the aggregate row, or a GROUP BY over history if it is missing."""
+    stats = db.session.get(UserStats, user_id)
+    if stats is not None:
+        return stats.to_dict()
+    return aggregate_game_records(user_id).get(
+        user_id, {'games': 0, 'wins': 0, 'losses': 0, 'draws': 0, 'total_wagered': 0, 'net': 0.0}
+    )
+
+
+def backfill_user_stats():
+    """Rebuild every UserStats row from GameRecord. Returns the number of users."""
+    totals = aggregate_game_records()
+    UserStats.query.delete()
+    db.session.add_all(UserStats(user_id=uid, **stats) for uid, stats in totals.items())
     db.session.commit()
+    return len(totals)
+
+
+def _update_user_stats(user_id, delta):
+    """Add a delta of finished games to the user's aggregate row (no commit)."""
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        # First game since aggregates were introduced: seed from existing history
+        stats = UserStats(user_id=user_id, **get_user_stats(user_id))
+        db.session.add(stats)
+        db.session.flush()
+    # SQL-side increments so concurrent writers cannot lose updates
+    for column, amount in delta.items():
+        setattr(stats, column, getattr(UserStats, column) + amount)
+    # Emit the UPDATE now so a later delta in this transaction builds on it
+    db.session.flush()
+
+
+def write_game_records(records):
+    """Stage GameRecord rows and their UserStats deltas in the current transaction."""
+    deltas = {}
+    for record in records:
+        delta = deltas.setdefault(record['user_id'], {
+            'games': 0, 'wins': 0, 'losses': 0, 'draws': 0, 'total_wagered': 0, 'net': 0
+        })
+        delta['games'] += 1
+        if record['result'] in RESULT_COLUMN:
+            delta[RESULT_COLUMN[record['result']]] += 1
+        delta['total_wagered'] += record['bet_amount']
+        delta['net'] += record['payout'] - record['bet_amount']
+    # Seed missing aggregates before this batch's rows exist in GameRecord
+    for user_id, delta in deltas.items():
+        _update_user_stats(user_id, delta)
+    db.session.add_all(
+        GameRecord(**{key: value for key, value in record.items() if key != 'payout'})
+        for record in records
+    )
+
+
+def write_rankings(updates):
+    """Stage Ranking updates given as (user_id, score, username) tuples.
+
+    Each user keeps their best score; the leaderboard follows after commit.
+    """
+    best = {}
+    for user_id, score, username in updates:
+        if user_id not in best or score > best[user_id][0]:
+            best[user_id] = (score, username)
+    existing = {r.user_id: r for r in Ranking.query.filter(Ranking.user_id.in_(best))}
+    for user_id, (score, username) in best.items():
+        ranking = existing.get(user_id)
+        if ranking:
+            if score > ranking.score:
+                ranking.score = score
+        else:
+            ranking = Ranking(user_id=user_id, score=score)
+            db.session.add(ranking)
+        after_commit(lambda user_id=user_id, score=ranking.score, username=username, new=user_id not in existing:
+                     leaderboard.record(user_id, score, username, new))
+
+
+def _write_behind():
+    """The app's write-behind queue when it is enabled, else None."""
+    writer = current_app.extensions.get('write_behind')
+    if writer is not None and writer.enabled:
+        return writer
+    return None
+
+
+# 异步更新排名：写后队列开启时在提交后排队批量写入，否则随当前事务写入
+def update_rankings_db(user_id, score):
+    update = (user_id, score, db.session.get(User, user_id).username)
+    writer = _write_behind()
+    if writer is None or not writer.defer('ranking', update):
+        write_rankings([update])
+
+# 异步添加游戏记录：同上
+def add_game_record(user_id, result, player_score, dealer_score, bet_amount, payout=None, deal=None):
+    if payout is None:
+        payout = bet_amount * RESULT_PAYOUT.get(result, 0)
+    record = {
+        'user_id': user_id,
+        'result': result,
+        'player_score': player_score,
+        'dealer_score': dealer_score,
+        'bet_amount': bet_amount,
+        'payout': payout,
+        'timestamp': datetime.utcnow(),
+    }
+    if deal is not None:
+        record.update(deal)
+    writer = _write_behind()
+    if writer is None or not writer.defer('game_record', record):
+        write_game_records([record])
+    if metrics.enabled:
+        after_commit(lambda: metrics.record_game(result, bet_amount, payout))
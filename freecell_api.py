@@ -1,9 +1,294 @@
-from flask import jsonify, request, session
-from datetime import datetime
 import logging
+import os
+import random
+import threading
+from datetime import datetime
+
+from flask import Blueprint, current_app, jsonify, redirect, render_template, request, session, url_for
+from sqlalchemy import delete, update
+
+import freecell_solver
+from database import db, User, FreeCellGame, FreeCellRecord
+from freecell_deals import DealIndex, DIFFICULTIES, MS_DEALS, ms_deal, solve_deal, SOLVABLE
+from freecell_engine import FreeCellState, InvalidMove, MAX_LOG_MOVES, move_to_dict, card_to_js_id
+from freecell_engine import decode_moves, encode_moves, replay, score_game
+from freecell_engine import card_from_js_id, location_from_name, make_move
 
 logger = logging.getLogger(__name__)
 
-# Get app reference (will be initialized when this is imported)
-from app import app
+freecell = Blueprint('freecell', __name__)
+
+
+@freecell.record_once
+def set_defaults(state):
+    config = state.app.config
+    # 求解器预算：每个请求的节点数和时间上限，保证接口在固定时延内返回
+    config.setdefault('FREECELL_HINT_NODES', 20000)
+    config.setdefault('FREECELL_HINT_SECONDS', 0.5)
+    config.setdefault('FREECELL_SOLVE_NODES', freecell_solver.DEFAULT_NODES)
+    config.setdefault('FREECELL_SOLVE_SECONDS', freecell_solver.DEFAULT_TIME)
+    config.setdefault('FREECELL_TABLE_SIZE', freecell_solver.DEFAULT_TABLE_SIZE)
+    # 预求解牌局索引（python freecell_deals.py 生成），按需内存映射
+    config.setdefault('FREECELL_DEAL_INDEX', os.path.join(state.app.instance_path, 'freecell_deals.idx'))
+
+
+_deal_index = None
+_deal_index_lock = threading.Lock()
+
+
+def get_deal_index():
+    """The memory-mapped deal index, or None if it has not been built."""
+    global _deal_index
+    if _deal_index is None:
+        with _deal_index_lock:
+            path = current_app.config['FREECELL_DEAL_INDEX']
+            if _deal_index is None and os.path.exists(path):
+                _deal_index = DealIndex(path)
+    return _deal_index
+
+
+def state_from_request():
+    """Parse the client layout ({'columns', 'free', 'suits'} of card ids)."""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        raise ValueError('请求体必须是 JSON 对象')
+    return FreeCellState.from_layout(data.get('columns', []), data.get('free', [None] * 4),
+                                     data.get('suits', [None] * 4))
+
+
+def moves_to_dicts(state, moves):
+    """Describe moves played from state in client ids."""
+    replay = state.copy()
+    return [move_to_dict(move, replay.apply(move)) for move in moves]
+
+
+def solver_budget(kind):
+    return (current_app.config[f'FREECELL_{kind}_NODES'], current_app.config[f'FREECELL_{kind}_SECONDS'],
+            current_app.config['FREECELL_TABLE_SIZE'])
+
+
+def mark_assisted():
+    """Flag the user's numbered deal in play, if any, as solver-assisted: it no longer scores."""
+    user = User.query.filter_by(username=session['username']).first()
+    if user is not None:
+        db.session.execute(update(FreeCellGame).where(FreeCellGame.user_id == user.id).values(assisted=True))
+        db.session.commit()
+
+
+@freecell.route('/freecell')
+def freecell_game():
+    if 'username' not in session:
+        return redirect(url_for('main.login'))
+    return render_template('freecell.html', username=session['username'])
+
+
+@freecell.route('/api/freecell/hint', methods=['POST'])
+def freecell_hint():
+    if 'username' not in session:
+        return jsonify({'error': '未登录'}), 401
+    try:
+        state = state_from_request()
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'牌局无效: {e}'}), 400
+
+    mark_assisted()
+    move, found = freecell_solver.hint(state, *solver_budget('HINT'))
+    return jsonify({
+        'move': moves_to_dicts(state, [move])[0] if move is not None else None,
+        'status': found['status'],
+        'nodes': found['nodes'],
+    })
+
+
+@freecell.route('/api/freecell/solve', methods=['POST'])
+def freecell_solve():
+    if 'username' not in session:
+        return jsonify({'error': '未登录'}), 401
+    try:
+        state = state_from_request()
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'牌局无效: {e}'}), 400
+
+    # 完整解法可直接提交，因此进行中的编号牌局被标记为辅助完成，不再计分
+    mark_assisted()
+    found = freecell_solver.solve(state, *solver_budget('SOLVE'))
+    logger.info('FreeCell solve: %s after %d nodes in %.3fs', found['status'], found['nodes'], found['seconds'])
+    return jsonify({
+        'status': found['status'],
+        'moves': moves_to_dicts(state, found['moves']),
+        'nodes': found['nodes'],
+    })
+
+
+def solve_random_deal():
+    """Without an index, try one random numbered deal within the hint budget."""
+    number, status, bucket, moves = solve_deal(random.randint(1, MS_DEALS),
+                                               current_app.config['FREECELL_HINT_NODES'],
+                                               current_app.config['FREECELL_HINT_SECONDS'])
+    if status != SOLVABLE:
+        return None
+    return {'deal': number, 'difficulty': DIFFICULTIES[bucket], 'moves': moves}
+
+
+@freecell.route('/api/freecell/deal')
+def freecell_deal():
+    """Hand out a solvable numbered deal, optionally of a given difficulty.
+
+    The deal becomes the user's game in play, the only one /submit scores.
+    Without an index one random deal is solved within the hint budget, so
+    the requested difficulty may not be met; 'difficulty_honored' says so.
+    """
+    if 'username' not in session:
+        return jsonify({'error': '未登录'}), 401
+    user = User.query.filter_by(username=session['username']).first()
+    if not user:
+        return jsonify({'error': '用户不存在'}), 404
+    difficulty = request.args.get('difficulty') or None
+    if difficulty is not None and difficulty not in DIFFICULTIES:
+        return jsonify({'error': '未知难度'}), 400
+
+    index = get_deal_index()
+    if index is not None:
+        number = index.random_deal(difficulty)
+        found = index.lookup(number) if number is not None else None
+    else:
+        found = solve_random_deal()
+    if found is None:
+        return jsonify({'error': '暂无可用牌局'}), 503
+
+    # 新牌局取代进行中的牌局
+    db.session.execute(delete(FreeCellGame).where(FreeCellGame.user_id == user.id))
+    db.session.add(FreeCellGame(user_id=user.id, deal=found['deal']))
+    db.session.commit()
+    return jsonify({
+        'deal': found['deal'],
+        'difficulty': found['difficulty'],
+        'difficulty_honored': difficulty in (None, found['difficulty']),
+        'moves': found['moves'],
+        'cards': [card_to_js_id(card) for card in ms_deal(found['deal'])],
+    })
+
+
+@freecell.route('/api/freecell/submit', methods=['POST'])
+def freecell_submit():
+    """Verify a finished game by replaying its move log, then score and store it.
+
+    Only the deal in play (from /deal) is accepted, once, and not after the
+    solver helped with it. The user's record on a deal keeps their best score.
+    """
+    if 'username' not in session:
+        return jsonify({'error': '未登录'}), 401
+    user = User.query.filter_by(username=session['username']).first()
+    if not user:
+        return jsonify({'error': '用户不存在'}), 404
+
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': '请求体必须是 JSON 对象'}), 400
+    deal = data.get('deal')
+    if not isinstance(deal, int) or not 1 <= deal <= MS_DEALS:
+        return jsonify({'error': '牌局编号无效'}), 400
+    game = db.session.get(FreeCellGame, user.id)
+    if game is None or game.deal != deal:
+        return jsonify({'error': '该牌局不在进行中'}), 409
+    if game.assisted:
+        return jsonify({'error': '使用过提示或求解的牌局不计分'}), 403
+    try:
+        moves = decode_moves(data.get('moves', ''), MAX_LOG_MOVES)
+        state = FreeCellState.deal(ms_deal(deal))
+        move_count = replay(state, moves)
+    except (ValueError, InvalidMove) as e:
+        return jsonify({'error': f'走法记录无效: {e}'}), 400
+    if not state.is_won():
+        return jsonify({'error': '牌局未完成'}), 400
+
+    # 结束进行中的牌局；并发的重复提交或求解只有一个能成功
+    finished = db.session.execute(delete(FreeCellGame).where(
+        FreeCellGame.user_id == user.id, FreeCellGame.deal == deal, FreeCellGame.assisted.is_(False)))
+    if finished.rowcount != 1:
+        db.session.rollback()
+        return jsonify({'error': '该牌局不在进行中'}), 409
+
+    index = get_deal_index()
+    par = index.lookup(deal)['moves'] if index is not None and deal <= len(index) else None
+    score = score_game(move_count, par)
+    record = FreeCellRecord.query.filter_by(user_id=user.id, deal=deal).first()
+    if record is None:
+        record = FreeCellRecord(user_id=user.id, deal=deal, moves=moves, move_count=move_count, score=score)
+        db.session.add(record)
+    elif score > record.score:
+        record.moves, record.move_count, record.score = moves, move_count, score
+        record.timestamp = datetime.utcnow()
+    db.session.commit()
+    return jsonify({'verified': True, 'record_id': record.id, 'moves': move_count, 'score': score,
+                    'best': record.score})
+
+
+@freecell.route('/api/freecell/replay/<int:record_id>')
+def freecell_replay(record_id):
+    """The stored replay of one of the user's verified games.
+
+    Replays are private: a published log could be submitted again by another
+    account as a verified win of its own.
+    """
+    if 'username' not in session:
+        return jsonify({'error': '未登录'}), 401
+    record = db.session.get(FreeCellRecord, record_id)
+    if record is None or record.user.username != session['username']:
+        return jsonify({'error': '记录不存在'}), 404
+    return jsonify({
+        'deal': record.deal,
+        'username': record.user.username,
+        'moves': encode_moves(record.moves),
+        'move_count': record.move_count,
+        'score': record.score,
+        'timestamp': record.timestamp.isoformat(),
+    })
+
+
+def find_card(state, card):
+    """(location, cards above and including it) for a card in play, or (None, 0)."""
+    for i, column in enumerate(state.columns):
+        if card in column:
+            return i, len(column) - column.index(card)
+    if card in state.cells:
+        return 8 + state.cells.index(card), 1
+    return None, 0
+
+
+@freecell.route('/api/freecell/move', methods=['POST'])
+def freecell_move():
+    """Play one (super)move and the safe foundation moves after it in one call.
+
+    Takes the layout plus 'card' (the card to pick up; every card above it in
+    its column moves too) and 'to' (colN, freeN or suitN). Returns the single
+    card moves to animate and the resulting layout.
+    """
+    if 'username' not in session:
+        return jsonify({'error': '未登录'}), 401
+    data = request.get_json(silent=True) or {}
+    try:
+        state = state_from_request()
+        card = card_from_js_id(int(data.get('card')))
+        src, count = find_card(state, card)
+        if src is None:
+            raise ValueError('该牌不可移动')
+        dst = location_from_name(str(data.get('to', '')), card)
+        start = state.copy()
+        if count > 1:
+            moves = state.supermove(src, dst, count)
+        else:
+            moves = [make_move(src, dst)]
+            state.apply(moves[0])
+    except (TypeError, ValueError, InvalidMove) as e:
+        return jsonify({'error': f'无效移动: {e}'}), 400
 
+    auto = state.autoplay() if data.get('autoplay', True) else []
+    played = moves_to_dicts(start, moves + auto)
+    return jsonify({
+        'moves': played[:len(moves)],
+        'autoplay': played[len(moves):],
+        'state': state.to_dict(),
+        'won': state.is_won(),
+        'max_movable': state.max_supermove(),
+    })
@@ -0,0 +1,177 @@
+"""Numbered FreeCell deals and the pre-solved deal index.
+
+Deals are numbered like the Microsoft FreeCell game (same LCG shuffle), so
+deal N here is deal N there. build_index solves deals 1..count on a process
+pool and writes a compact index that the server memory-maps:
+
+    header   magic b'FCDX', version, deal count, deals per difficulty bucket
+    records  4 bytes per deal number: status, difficulty, solution moves (u16)
+    buckets  for each difficulty, the solvable deal numbers (u32)
+
+A lookup by deal number or a random deal of a given difficulty is one or two
+struct reads. 'moves' is the length of the solver's solution (an upper bound
+on the minimum), and the difficulty bucket comes from the nodes the solver
+expanded.
+
+    python freecell_deals.py --count 32000 --out instance/freecell_deals.idx
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import freecell_solver
+from freecell_engine import FreeCellState, make_card
+
+MS_DEALS = 32000
+DIFFICULTIES = ['easy', 'medium', 'hard']
+# Solver nodes expanded: below the first bound is easy, below the second medium
+DIFFICULTY_NODES = (500, 5000)
+
+UNKNOWN, SOLVABLE, UNSOLVABLE = 0, 1, 2
+STATUS = {'unknown': UNKNOWN, 'solved': SOLVABLE, 'unsolvable': UNSOLVABLE}
+STATUS_NAMES = {value: key for key, value in STATUS.items()}
+
+MAGIC = b'FCDX'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI3I')
+RECORD = struct.Struct('<BBH')
+DEAL_NUMBER = struct.Struct('<I')
+
+# Microsoft card order is rank-major with suits clubs, diamonds, hearts, spades
+_MS_SUIT = (0, 3, 2, 1)
+
+
+def ms_deal(number):
+    """Card codes of Microsoft FreeCell deal `number`, in dealing order."""
+    cards = list(range(51, -1, -1))
+    seed = number
+    for i in range(52):
+        seed = (seed * 214013 + 2531011) & 0x7FFFFFFF
+        j = 51 - (seed >> 16) % (52 - i)
+        cards[i], cards[j] = cards[j], cards[i]
+    return [make_card(card // 4 + 1, _MS_SUIT[card % 4]) for card in cards]
+
+
+def difficulty_of(nodes):
+    if nodes < DIFFICULTY_NODES[0]:
+        return 0
+    if nodes < DIFFICULTY_NODES[1]:
+        return 1
+    return 2
+
+
+def solve_deal(number, max_nodes=freecell_solver.DEFAULT_NODES, time_limit=freecell_solver.DEFAULT_TIME):
+    """Solve one numbered deal; returns (number, status, difficulty, moves)."""
+    found = freecell_solver.solve(FreeCellState.deal(ms_deal(number)), max_nodes, time_limit)
+    return number, STATUS[found['status']], difficulty_of(found['nodes']), len(found['moves'])
+
+
+def write_index(path, results):
+    """Write the index for results of solve_deal covering deals 1..len(results)."""
+    results = sorted(results)
+    if [number for number, *_ in results] != list(range(1, len(results) + 1)):
+        raise ValueError('Results must cover deals 1..count exactly once')
+    buckets = [[] for _ in DIFFICULTIES]
+    for number, status, difficulty, _ in results:
+        if status == SOLVABLE:
+            buckets[difficulty].append(number)
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(results), *map(len, buckets)))
+        for _, status, difficulty, moves in results:
+            f.write(RECORD.pack(status, difficulty, min(moves, 0xFFFF)))
+        for bucket in buckets:
+            f.write(b''.join(DEAL_NUMBER.pack(number) for number in bucket))
+    os.replace(tmp, path)
+
+
+def build_index(path, count=MS_DEALS, workers=None, max_nodes=freecell_solver.DEFAULT_NODES,
+                time_limit=freecell_solver.DEFAULT_TIME, chunksize=32):
+    """Solve deals 1..count on a process pool and write the index to path."""
+    job = partial(solve_deal, max_nodes=max_nodes, time_limit=time_limit)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(job, range(1, count + 1), chunksize=chunksize))
+    write_index(path, results)
+    return results
+
+
+class DealIndex:
+    """Read-only, memory-mapped view of an index written by write_index."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count, *sizes = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            raise ValueError(f'{path} is not a FreeCell deal index')
+        self._bucket_sizes = sizes
+        self._bucket_offsets = []
+        offset = HEADER.size + self.count * RECORD.size
+        for size in sizes:
+            self._bucket_offsets.append(offset)
+            offset += size * DEAL_NUMBER.size
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._map.close()
+
+    def lookup(self, number):
+        if not 1 <= number <= self.count:
+            raise KeyError(number)
+        status, difficulty, moves = RECORD.unpack_from(self._map, HEADER.size + (number - 1) * RECORD.size)
+        return {'deal': number, 'status': STATUS_NAMES[status],
+                'difficulty': DIFFICULTIES[difficulty] if status == SOLVABLE else None, 'moves': moves}
+
+    def bucket_size(self, difficulty):
+        return self._bucket_sizes[DIFFICULTIES.index(difficulty)]
+
+    def random_deal(self, difficulty=None, rng=random):
+        """A random solvable deal number of the given difficulty (any when None)."""
+        if difficulty is None:
+            candidates = [i for i, size in enumerate(self._bucket_sizes) if size]
+            if not candidates:
+                return None
+            bucket = rng.choice(candidates)
+        else:
+            bucket = DIFFICULTIES.index(difficulty)
+        size = self._bucket_sizes[bucket]
+        if not size:
+            return None
+        offset = self._bucket_offsets[bucket] + rng.randrange(size) * DEAL_NUMBER.size
+        return DEAL_NUMBER.unpack_from(self._map, offset)[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-solve numbered FreeCell deals into a deal index')
+    parser.add_argument('--count', type=int, default=MS_DEALS, help='solve deals 1..count')
+    parser.add_argument('--out', default=os.path.join('instance', 'freecell_deals.idx'))
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: all cores)')
+    parser.add_argument('--max-nodes', type=int, default=freecell_solver.DEFAULT_NODES)
+    parser.add_argument('--time-limit', type=float, default=10.0, help='seconds per deal')
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    start = time.perf_counter()
+    results = build_index(args.out, args.count, args.workers, args.max_nodes, args.time_limit)
+    elapsed = time.perf_counter() - start
+    statuses = [status for _, status, _, _ in results]
+    print(f'{len(results):,} deals in {elapsed:.1f}s -> {args.out}')
+    print(f'solvable: {statuses.count(SOLVABLE):,}  unsolvable: {statuses.count(UNSOLVABLE):,}  '
+          f'unknown: {statuses.count(UNKNOWN):,}')
+    index = DealIndex(args.out)
+    for difficulty in DIFFICULTIES:
+        print(f'{difficulty:<7} {index.bucket_size(difficulty):,}')
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,470 @@
+"""Server-side FreeCell rules on a compact state.
+
+Cards are integers 0..51: (rank - 1) * 4 + suit, with suits in the order of
+static/freecell.js (clubs, spades, hearts, diamonds), so suit & 2 is the red
+bit. Per-card rank, suit and colour come from lookup tuples.
+
+A state is eight bytearray columns (top card last), a bytearray of four free
+cells (EMPTY when free) and the foundations packed into one int, four bits of
+top rank per suit.
+
+Locations are numbered 0-7 for columns, 8-11 for free cells and 12-15 for the
+foundations (12 + suit). A move is one byte, source << 4 | destination, which
+is also the unit of the stored move logs.
+"""
+import argparse
+import base64
+import binascii
+import random
+import time
+
+SUITS = ['clubs', 'spades', 'hearts', 'diamonds']
+COLOURS = ['black', 'black', 'red', 'red']
+EMPTY = 0xFF
+
+COLUMNS = range(8)
+CELLS = range(8, 12)
+FOUNDATION = 12
+WON = 0xDDDD   # rank 13 on every foundation
+DEFAULT_PAR = 100
+MAX_LOG_MOVES = 4096
+
+RANK = tuple(card // 4 + 1 for card in range(52))
+SUIT = tuple(card % 4 for card in range(52))
+RED = tuple(card % 4 >> 1 for card in range(52))
+# Cards a card can be stacked on in a column: one rank higher, other colour
+PARENTS = tuple(
+    frozenset(parent for parent in range(52) if RANK[parent] == RANK[card] + 1 and RED[parent] != RED[card])
+    for card in range(52)
+)
+
+
+class InvalidMove(ValueError):
+    """Raised when a move breaks the FreeCell rules."""
+
+
+def make_card(rank, suit):
+    return (rank - 1) * 4 + suit
+
+
+def make_move(src, dst):
+    return src << 4 | dst
+
+
+def move_src(move):
+    return move >> 4
+
+
+def move_dst(move):
+    return move & 0xF
+
+
+# static/freecell.js numbers cards 1..52 as: suit = (id - 1) % 4, and ranks in
+# the order A, K, Q, ..., 2 for (id - 1) // 4
+def card_from_js_id(card_id):
+    index = card_id - 1
+    group = index // 4
+    return make_card(1 if group == 0 else 14 - group, index % 4)
+
+
+def card_to_js_id(card):
+    rank = RANK[card]
+    group = 0 if rank == 1 else 14 - rank
+    return group * 4 + SUIT[card] + 1
+
+
+def card_to_dict(card):
+    return {'id': card_to_js_id(card), 'suit': SUITS[SUIT[card]], 'value': RANK[card],
+            'colour': COLOURS[SUIT[card]]}
+
+
+def location_from_name(name, card=None):
+    """Inverse of location_name; 'suitN' means the foundation of card's suit."""
+    for prefix, base, size in (('col', 0, 8), ('free', 8, 4)):
+        if name.startswith(prefix) and name[len(prefix):].isdigit() and int(name[len(prefix):]) < size:
+            return base + int(name[len(prefix):])
+    if name.startswith('suit') and card is not None:
+        return FOUNDATION + SUIT[card]
+    raise ValueError(f'Unknown location {name!r}')
+
+
+def location_name(location):
+    """Location as the element id used by static/freecell.js."""
+    if location < 8:
+        return f'col{location}'
+    if location < FOUNDATION:
+        return f'free{location - 8}'
+    return f'suit{location - FOUNDATION}'
+
+
+class FreeCellState:
+    __slots__ = ('columns', 'cells', 'foundations')
+
+    def __init__(self, columns=None, cells=None, foundations=0):
+        self.columns = columns if columns is not None else [bytearray() for _ in COLUMNS]
+        self.cells = cells if cells is not None else bytearray([EMPTY] * 4)
+        self.foundations = foundations
+
+    @classmethod
+    def deal(cls, cards):
+        """Deal 52 card codes round-robin into the columns, like Game.init."""
+        if sorted(cards) != list(range(52)):
+            raise ValueError('A deal must contain each of the 52 cards once')
+        state = cls()
+        for i, card in enumerate(cards):
+            state.columns[i % 8].append(card)
+        return state
+
+    @classmethod
+    def random_deal(cls, rng=random):
+        cards = list(range(52))
+        rng.shuffle(cards)
+        return cls.deal(cards)
+
+    @classmethod
+    def from_layout(cls, columns, free, suits):
+        """Build a state from the client layout given as card ids.
+
+        columns holds eight lists of ids (top card last), free four ids or
+        None, and suits the top card id of each foundation or None.
+        """
+        if len(columns) != 8 or len(free) != 4 or len(suits) != 4:
+            raise ValueError('Expected 8 columns, 4 free cells and 4 foundations')
+        state = cls()
+        placed = []
+
+        def card(card_id):
+            if not isinstance(card_id, int) or not 1 <= card_id <= 52:
+                raise ValueError(f'Unknown card id {card_id!r}')
+            return card_from_js_id(card_id)
+
+        for suit_id in suits:
+            if suit_id is not None:
+                top = card(suit_id)
+                if state.foundation_rank(SUIT[top]):
+                    raise ValueError('Two foundations hold the same suit')
+                state.foundations |= RANK[top] << (SUIT[top] * 4)
+                placed.extend(make_card(rank, SUIT[top]) for rank in range(1, RANK[top] + 1))
+        for i, card_id in enumerate(free):
+            if card_id is not None:
+                state.cells[i] = card(card_id)
+                placed.append(state.cells[i])
+        for i, column in enumerate(columns):
+            state.columns[i].extend(card(card_id) for card_id in column)
+            placed.extend(state.columns[i])
+        if sorted(placed) != list(range(52)):
+            raise ValueError('The layout must hold each of the 52 cards once')
+        return state
+
+    def pack(self):
+        """Compact bytes form: foundations, free cells, then 0xFE-terminated columns."""
+        return (self.foundations.to_bytes(2, 'little') + bytes(self.cells)
+                + b'\xfe'.join(bytes(column) for column in self.columns))
+
+    @classmethod
+    def unpack(cls, data):
+        return cls([bytearray(column) for column in data[6:].split(b'\xfe')], bytearray(data[2:6]),
+                   int.from_bytes(data[:2], 'little'))
+
+    def copy(self):
+        return FreeCellState([bytearray(column) for column in self.columns], bytearray(self.cells),
+                             self.foundations)
+
+    def __eq__(self, other):
+        return (isinstance(other, FreeCellState) and self.columns == other.columns
+                and self.cells == other.cells and self.foundations == other.foundations)
+
+    def foundation_rank(self, suit):
+        return self.foundations >> (suit * 4) & 0xF
+
+    def is_won(self):
+        return self.foundations == WON
+
+    def free_cell_mask(self):
+        """Bitmask of empty free cells."""
+        cells = self.cells
+        return ((cells[0] == EMPTY) | (cells[1] == EMPTY) << 1
+                | (cells[2] == EMPTY) << 2 | (cells[3] == EMPTY) << 3)
+
+    def top(self, location):
+        """Card that a move from location would take, or EMPTY."""
+        if location < 8:
+            column = self.columns[location]
+            return column[-1] if column else EMPTY
+        if location < FOUNDATION:
+            return self.cells[location - 8]
+        return EMPTY
+
+    def accepts(self, location, card):
+        """Can card be placed on location?"""
+        if location < 8:
+            column = self.columns[location]
+            return not column or column[-1] in PARENTS[card]
+        if location < FOUNDATION:
+            return self.cells[location - 8] == EMPTY
+        suit = location - FOUNDATION
+        return SUIT[card] == suit and RANK[card] == (self.foundations >> (suit * 4) & 0xF) + 1
+
+    def is_valid(self, move):
+        src, dst = move >> 4, move & 0xF
+        if src >= FOUNDATION or src == dst:
+            return False
+        card = self.top(src)
+        return card != EMPTY and self.accepts(dst, card)
+
+    def apply(self, move):
+        """Validate and play move in place; returns the moved card."""
+        if not self.is_valid(move):
+            raise InvalidMove(f'Illegal move {location_name(move >> 4)} -> {location_name(move & 0xF)}')
+        return self.apply_unchecked(move)
+
+    def apply_unchecked(self, move):
+        src, dst = move >> 4, move & 0xF
+        if src < 8:
+            card = self.columns[src].pop()
+        else:
+            card = self.cells[src - 8]
+            self.cells[src - 8] = EMPTY
+        if dst < 8:
+            self.columns[dst].append(card)
+        elif dst < FOUNDATION:
+            self.cells[dst - 8] = card
+        else:
+            self.foundations += 1 << ((dst - FOUNDATION) * 4)
+        return card
+
+    def undo(self, move):
+        """Take back a move previously applied to this state."""
+        src, dst = move >> 4, move & 0xF
+        if dst < 8:
+            card = self.columns[dst].pop()
+        elif dst < FOUNDATION:
+            card = self.cells[dst - 8]
+            self.cells[dst - 8] = EMPTY
+        else:
+            suit = dst - FOUNDATION
+            card = make_card(self.foundations >> (suit * 4) & 0xF, suit)
+            self.foundations -= 1 << (suit * 4)
+        if src < 8:
+            self.columns[src].append(card)
+        else:
+            self.cells[src - 8] = card
+
+    def safe_foundation_move(self):
+        """A foundation move no solution can need to take back, or None.
+
+        A card is safe to play once both foundations of the other colour are
+        at least one rank below it (aces and twos are always safe): nothing
+        left in play could still need to be stacked on it.
+        """
+        foundations = self.foundations
+        for src in range(12):
+            card = self.top(src)
+            if card == EMPTY:
+                continue
+            suit = SUIT[card]
+            rank = RANK[card]
+            if rank != (foundations >> (suit * 4) & 0xF) + 1:
+                continue
+            if rank <= 2:
+                return src << 4 | (FOUNDATION + suit)
+            other = 0 if RED[card] else 2
+            if min(foundations >> (other * 4) & 0xF, foundations >> ((other + 1) * 4) & 0xF) >= rank - 1:
+                return src << 4 | (FOUNDATION + suit)
+        return None
+
+    def autoplay(self):
+        """Play safe foundation moves in place; returns the moves played."""
+        moves = []
+        move = self.safe_foundation_move()
+        while move is not None:
+            self.apply_unchecked(move)
+            moves.append(move)
+            move = self.safe_foundation_move()
+        return moves
+
+    def sequence_length(self, column):
+        """Cards at the top of a column that form a descending alternating-colour run."""
+        cards = self.columns[column]
+        length = 1 if cards else 0
+        while length < len(cards) and cards[-length - 1] in PARENTS[cards[-length]]:
+            length += 1
+        return length
+
+    def max_supermove(self, to_empty_column=False):
+        """Most cards one supermove can carry: (free cells + 1) * 2 ** empty columns.
+
+        An empty destination column does not count as a temporary spot.
+        """
+        empty_columns = sum(1 for column in self.columns if not column) - to_empty_column
+        return (bin(self.free_cell_mask()).count('1') + 1) << max(empty_columns, 0)
+
+    def supermove(self, src, dst, count):
+        """Move the top count cards of column src onto column dst as one move.
+
+        Plays the equivalent single-card moves in place through free cells and
+        empty columns and returns them. Raises InvalidMove if the cards are not
+        an ordered run, the run does not fit on dst, or there is not enough
+        free space.
+        """
+        if not (src < 8 and dst < 8 and src != dst) or count < 1:
+            raise InvalidMove('A supermove goes from one column to another')
+        if count > self.sequence_length(src):
+            raise InvalidMove(f'The top {count} cards of col{src} are not an ordered run')
+        if not self.accepts(dst, self.columns[src][-count]):
+            raise InvalidMove(f'The run cannot be placed on col{dst}')
+        if count > self.max_supermove(not self.columns[dst]):
+            raise InvalidMove(f'Not enough free cells and empty columns to move {count} cards')
+        moves = []
+        self._move_run(src, dst, count, moves)
+        return moves
+
+    def _move_run(self, src, dst, count, moves):
+        cells = [8 + i for i in range(4) if self.cells[i] == EMPTY]
+        if count <= len(cells) + 1:
+            # Park all but the bottom card in free cells, move it, then stack them back
+            for cell in cells[:count - 1]:
+                moves.append(src << 4 | cell)
+                self.apply_unchecked(moves[-1])
+            moves.append(src << 4 | dst)
+            self.apply_unchecked(moves[-1])
+            for cell in reversed(cells[:count - 1]):
+                moves.append(cell << 4 | dst)
+                self.apply_unchecked(moves[-1])
+            return
+        # Park the top part in an empty column, move the rest, then bring the part over
+        empty = [i for i in COLUMNS if not self.columns[i] and i != dst]
+        spare = empty[0]
+        part = min(count - 1, (len(cells) + 1) << (len(empty) - 1))
+        self._move_run(src, spare, part, moves)
+        self._move_run(src, dst, count - part, moves)
+        self._move_run(spare, dst, part, moves)
+
+    def legal_moves(self):
+        """Every distinct legal single-card move.
+
+        Only the first empty free cell and the first empty column are offered
+        as destinations, and a column's only card is never moved to an empty
+        column: the skipped moves lead to equivalent positions.
+        """
+        moves = []
+        columns = self.columns
+        cells = self.cells
+        foundations = self.foundations
+        empty_cell = next((8 + i for i in range(4) if cells[i] == EMPTY), None)
+        empty_column = next((i for i in COLUMNS if not columns[i]), None)
+        sources = [(i, columns[i][-1]) for i in COLUMNS if columns[i]]
+        sources += [(8 + i, cells[i]) for i in range(4) if cells[i] != EMPTY]
+
+        for src, card in sources:
+            suit = SUIT[card]
+            if RANK[card] == (foundations >> (suit * 4) & 0xF) + 1:
+                moves.append(src << 4 | (FOUNDATION + suit))
+            parents = PARENTS[card]
+            for dst in COLUMNS:
+                column = columns[dst]
+                if column and dst != src and column[-1] in parents:
+                    moves.append(src << 4 | dst)
+            if empty_column is not None and not (src < 8 and len(columns[src]) == 1):
+                moves.append(src << 4 | empty_column)
+            if empty_cell is not None and src < 8:
+                moves.append(src << 4 | empty_cell)
+        return moves
+
+    def to_dict(self):
+        """Layout in the shape of the client Game object (card dicts, None when empty)."""
+        suits = []
+        for suit in range(4):
+            rank = self.foundation_rank(suit)
+            suits.append(card_to_dict(make_card(rank, suit)) if rank else None)
+        return {
+            'columns': [[card_to_dict(card) for card in column] for column in self.columns],
+            'free': [None if card == EMPTY else card_to_dict(card) for card in self.cells],
+            'suits': suits,
+        }
+
+
+def encode_moves(moves):
+    """Move log as URL-safe base64, one byte per move."""
+    return base64.urlsafe_b64encode(bytes(moves)).decode('ascii')
+
+
+def decode_moves(text, max_moves=None):
+    """Decode a base64 move log to bytes; raises ValueError when malformed."""
+    try:
+        data = base64.urlsafe_b64decode(text.encode('ascii'))
+    except (binascii.Error, UnicodeEncodeError, AttributeError) as e:
+        raise ValueError('Move log is not valid base64') from e
+    if max_moves is not None and len(data) > max_moves:
+        raise ValueError(f'Move log is longer than {max_moves} moves')
+    return data
+
+
+def replay(state, moves):
+    """Play a move log on state in place, validating every move.
+
+    Returns the number of moves played. Raises InvalidMove naming the first
+    illegal move (1-based).
+    """
+    played = 0
+    for move in moves:
+        if not state.is_valid(move):
+            raise InvalidMove(f'Illegal move {played + 1}: {location_name(move >> 4)} -> {location_name(move & 0xF)}')
+        state.apply_unchecked(move)
+        played += 1
+    return played
+
+
+def score_game(move_count, par=None):
+    """Score a won game: 1000 at or under par, 5 points off per extra move, at least 100.
+
+    par is the solver's solution length for the deal when it is known.
+    """
+    par = par or DEFAULT_PAR
+    return max(100, 1000 - 5 * max(0, move_count - par))
+
+
+def move_to_dict(move, card):
+    """A move as {'card', 'from', 'to'} in client ids."""
+    return {'card': card_to_js_id(card), 'from': location_name(move >> 4), 'to': location_name(move & 0xF)}
+
+
+def benchmark(games=200, seed=0):
+    """Replay random playouts and report validated moves per second."""
+    rng = random.Random(seed)
+    playouts = []
+    for _ in range(games):
+        cards = list(range(52))
+        rng.shuffle(cards)
+        state = FreeCellState.deal(cards)
+        moves = []
+        for _ in range(200):
+            legal = state.legal_moves()
+            if not legal:
+                break
+            moves.append(rng.choice(legal))
+            state.apply_unchecked(moves[-1])
+        playouts.append((cards, moves))
+
+    total = sum(len(moves) for _, moves in playouts)
+    start = time.perf_counter()
+    for cards, moves in playouts:
+        state = FreeCellState.deal(cards)
+        for move in moves:
+            state.apply(move)
+    elapsed = time.perf_counter() - start
+    return {'moves': total, 'seconds': elapsed, 'moves_per_sec': total / elapsed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the FreeCell engine')
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    stats = benchmark(args.games, args.seed)
+    print(f"moves:     {stats['moves']:,}")
+    print(f"moves/s:   {stats['moves_per_sec']:,.0f}")
+
+
+if __name__ == '__main__':
+    main()
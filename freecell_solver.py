@@ -0,0 +1,192 @@
+"""Weighted A* FreeCell solver with a bounded transposition table.
+
+States are identified by a Zobrist hash built from (card, card below it)
+pairs for column cards, the bottom card's pair naming the table, and from
+the cards in the free cells. The pairs determine every column's contents
+exactly but not the column's index, so positions that differ only in
+column order or in which cell holds a card hash the same, while any other
+two positions differ in at least one pair. Foundations are implied by the
+cards still in play.
+
+Every search runs under a node budget and a time budget, and the
+transposition table keeps at most table_size entries (oldest evicted first).
+A search that runs out of budget reports 'unknown'. Only an exhausted search
+that never evicted anything reports 'unsolvable'. Solutions are replayed
+through the engine before being returned. Two different positions share a
+hash only by a 64-bit chance collision; that could prune an unvisited
+position and so cost a solution, but never produce a wrong one.
+
+Safe foundation moves are played automatically after every move. Solutions
+are short but not guaranteed minimal.
+"""
+import heapq
+import random
+import time
+from array import array
+from collections import OrderedDict
+
+from freecell_engine import FreeCellState, InvalidMove, RANK, EMPTY, FOUNDATION
+
+DEFAULT_NODES = 50000
+DEFAULT_TIME = 2.0
+DEFAULT_TABLE_SIZE = 200000
+# Weight on the heuristic: above 1 trades optimality for speed
+HEURISTIC_WEIGHT = 3
+
+# Z_COLUMN[card][below]: below is the card under it, or BOTTOM on an empty column
+BOTTOM = 52
+_rng = random.Random(0x5EED)
+Z_COLUMN = tuple(tuple(_rng.getrandbits(64) for _ in range(53)) for _ in range(52))
+Z_CELL = tuple(_rng.getrandbits(64) for _ in range(52))
+del _rng
+
+
+def zobrist(state):
+    key = 0
+    for column in state.columns:
+        below = BOTTOM
+        for card in column:
+            key ^= Z_COLUMN[card][below]
+            below = card
+    for card in state.cells:
+        if card != EMPTY:
+            key ^= Z_CELL[card]
+    return key
+
+
+def _move_delta(state, move):
+    """Zobrist change caused by playing move on state (before it is applied)."""
+    src, dst = move >> 4, move & 0xF
+    if src < 8:
+        column = state.columns[src]
+        card = column[-1]
+        delta = Z_COLUMN[card][column[-2] if len(column) > 1 else BOTTOM]
+    else:
+        card = state.cells[src - 8]
+        delta = Z_CELL[card]
+    if dst < 8:
+        column = state.columns[dst]
+        delta ^= Z_COLUMN[card][column[-1] if column else BOTTOM]
+    elif dst < FOUNDATION:
+        delta ^= Z_CELL[card]
+    return delta
+
+
+def heuristic(state):
+    """Cards left to play plus cards sitting on a lower card of their column."""
+    foundations = state.foundations
+    score = 52 - ((foundations & 0xF) + (foundations >> 4 & 0xF) + (foundations >> 8 & 0xF)
+                  + (foundations >> 12 & 0xF))
+    for column in state.columns:
+        lowest = 14
+        for card in column:
+            rank = RANK[card]
+            if rank > lowest:
+                score += 1
+            else:
+                lowest = rank
+    for card in state.cells:
+        if card != EMPTY:
+            score += 1
+    return score
+
+
+def _verified(state, moves):
+    replay = state.copy()
+    try:
+        for move in moves:
+            replay.apply(move)
+    except InvalidMove:
+        return False
+    return replay.is_won()
+
+
+def solve(state, max_nodes=DEFAULT_NODES, time_limit=DEFAULT_TIME, table_size=DEFAULT_TABLE_SIZE):
+    """Search for a winning move sequence from state.
+
+    Returns {'status': 'solved' | 'unsolvable' | 'unknown', 'moves': [...],
+    'nodes': expanded nodes, 'seconds': elapsed}.
+    """
+    start = time.perf_counter()
+    deadline = start + time_limit
+
+    def result(status, moves=()):
+        return {'status': status, 'moves': list(moves), 'nodes': nodes,
+                'seconds': time.perf_counter() - start}
+
+    nodes = 0
+    root = state.copy()
+    root_moves = root.autoplay()
+    if root.is_won():
+        return result('solved', root_moves)
+
+    # Generated nodes: parent index and the moves (one choice plus autoplay) that led here
+    parents = array('l', [-1])
+    edges = [bytes(root_moves)]
+    root_key = zobrist(root)
+    table = OrderedDict({root_key: 0})
+    evicted = False
+    heap = [(heuristic(root), 0, root.pack(), root_key, 0)]
+
+    while heap:
+        if nodes >= max_nodes or (nodes & 127 == 0 and time.perf_counter() > deadline):
+            return result('unknown')
+        _, node, packed, key, g = heapq.heappop(heap)
+        nodes += 1
+        current = FreeCellState.unpack(packed)
+        for move in current.legal_moves():
+            child = current.copy()
+            child_key = key ^ _move_delta(child, move)
+            child.apply_unchecked(move)
+            played = [move]
+            auto = child.safe_foundation_move()
+            while auto is not None:
+                # Inline FreeCellState.autoplay to keep the hash incremental
+                child_key ^= _move_delta(child, auto)
+                child.apply_unchecked(auto)
+                played.append(auto)
+                auto = child.safe_foundation_move()
+            child_g = g + len(played)
+            seen = table.get(child_key)
+            if seen is not None and seen <= child_g:
+                continue
+            table[child_key] = child_g
+            if len(table) > table_size:
+                table.popitem(last=False)
+                evicted = True
+            parents.append(node)
+            edges.append(bytes(played))
+            child_node = len(edges) - 1
+            if child.is_won():
+                moves = []
+                while child_node >= 0:
+                    moves[:0] = edges[child_node]
+                    child_node = parents[child_node]
+                if _verified(state, moves):
+                    return result('solved', moves)
+                continue
+            heapq.heappush(heap, (child_g + HEURISTIC_WEIGHT * heuristic(child), child_node,
+                                  child.pack(), child_key, child_g))
+
+    return result('unknown' if evicted else 'unsolvable')
+
+
+def hint(state, max_nodes=DEFAULT_NODES, time_limit=DEFAULT_TIME, table_size=DEFAULT_TABLE_SIZE):
+    """Suggest the next move.
+
+    Returns (move or None, solve result). The move starts a found solution;
+    when the budget runs out first it is the legal move whose position has
+    the best heuristic score.
+    """
+    found = solve(state, max_nodes, time_limit, table_size)
+    if found['moves']:
+        return found['moves'][0], found
+    best = None
+    for move in state.legal_moves():
+        child = state.copy()
+        child.apply_unchecked(move)
+        child.autoplay()
+        score = heuristic(child)
+        if best is None or score < best[0]:
+            best = (score, move)
+    return (best[1] if best else None), found
@@ -1,12 +1,42 @@
+import logging
 import random
 
+from hand_eval import HandState
+import odds
+
+SUITS = ['hearts', 'diamonds', 'clubs', 'spades']
+VALUES = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+ACE = VALUES.index('A')
+# Points per rank index, aces counted as 11
+RANK_POINTS = [2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 11]
+
+logger = logging.getLogger(__name__)
+
+# Cards are integers 0..51: suit index * 13 + rank index. The dict form
+# {'suit': ..., 'value': ...} is only used at the JSON edge.
+
+def card_to_dict(card):
+    """Render a card code as {'suit': ..., 'value': ...}."""
+    return {'suit': SUITS[card // 13], 'value': VALUES[card % 13]}
+
+def card_from_dict(card):
+    """Encode a {'suit': ..., 'value': ...} card as its integer code."""
+    return SUITS.index(card['suit']) * 13 + VALUES.index(card['value'])
+
+def cards_to_dicts(cards):
+    return [card_to_dict(card) for card in cards]
+
+def card_rank(card):
+    """Rank index (0 = '2' ... 12 = 'A') of a card code or legacy card dict."""
+    if isinstance(card, dict):
+        return VALUES.index(card['value'])
+    return card % 13
+
 def create_deck():
-    suits = ['hearts', 'diamonds', 'clubs', 'spades']
-    values = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-    return [{'suit': suit, 'value': value} for suit in suits for value in values]
+    return list(range(52))
 
-def shuffle_deck(deck):
-    random.shuffle(deck)
+def shuffle_deck(deck, rng=random):
+    rng.shuffle(deck)
 
 def deal_cards(deck, num_cards=2):
     """Deal specified number of cards from deck."""
@@ -24,13 +54,10 @@ def calculate_score(hand):
     aces = 0
     
     for card in hand:
-        if card['value'] == 'A':
+        rank = card_rank(card)
+        if rank == ACE:
             aces += 1
-            score += 11
-        elif card['value'] in ['K', 'Q', 'J']:
-            score += 10
-        else:
-            score += int(card['value'])
+        score += RANK_POINTS[rank]
     
     while score > 21 and aces > 0:
         score -= 10
@@ -62,7 +89,7 @@ def calculate_bust_risk(hand):
     # Count Aces that can be 11 without busting
     ace_count = 0
     for card in hand:
-        if card['value'] == 'A':
+        if card_rank(card) == ACE:
             ace_count += 1
 
     # Check for cards that would cause a bust
@@ -86,68 +113,59 @@ def calculate_bust_risk(hand):
 
 def is_soft_hand(hand):
     """Checks if the hand is a soft hand (contains an Ace that can be counted as 11)."""
-    score = 0
+    hard = 0
     has_ace = False
     
     for card in hand:
-        if card['value'] == 'A':
+        rank = card_rank(card)
+        if rank == ACE:
             has_ace = True
-            score += 11
-        elif card['value'] in ['K', 'Q', 'J']:
-            score += 10
+            hard += 1
         else:
-            score += int(card['value'])
+            hard += RANK_POINTS[rank]
     
-    # A hand is soft if it contains an Ace and the score is 21 or less when counting the Ace as 11
-    return has_ace and score <= 21 and calculate_score(hand) != score
-
-def dealer_should_hit(dealer_hand, player_score):
-    """Decides if the dealer should hit based on the AI logic."""
-    dealer_total = calculate_score(dealer_hand)
-    bust_risk = calculate_bust_risk(dealer_hand)
-    is_soft = is_soft_hand(dealer_hand)
-
-    # Debugging output (optional, can be removed later)
-    print(f"[DEBUG] Dealer AI thinking:")
-    print(f"  - Dealer Total: {dealer_total}")
-    print(f"  - Player Score: {player_score}")
-    print(f"  - Bust Risk: {bust_risk:.2f}")
-    print(f"  - Is Soft Hand: {is_soft}")
-
-    if dealer_total >= 17:
-        print("  - Decision: Stand (>= 17)")
-        return False
-
-    # If dealer has a soft 17, hit
-    if is_soft and dealer_total == 17:
-        print("  - Decision: Hit (Soft 17)")
-        return True
-
-    # If dealer total is less than player score and bust risk is low, hit
-    if dealer_total < player_score and bust_risk < 0.5:
-         print("  - Decision: Hit (Less than player and low risk)")
-         return True
-
-    # If dealer total is less than 17, hit (standard rule)
-    if dealer_total < 17:
-        print("  - Decision: Hit (< 17)")
-        return True
-
-    # Default to stand if no other condition is met
-    print("  - Decision: Stand (Default)")
-    return False
+    # A hand is soft if one Ace can still count as 11 without going over 21
+    return has_ace and hard + 10 <= 21
+
+def dealer_should_hit(dealer_hand, player_score, state=None, deck=None):
+    """Decides if the dealer should hit based on the AI logic.
+
+    state is an optional HandState for dealer_hand, passed by callers that
+    keep it up to date as cards are added. deck, when given, is the list of
+    remaining cards; the bust risk then comes from their actual composition
+    (odds.bust_probability) rather than from ten equally likely values.
+    """
+    if state is None:
+        state = HandState.from_ranks(card_rank(card) for card in dealer_hand)
+    exact = []
+    if deck is None:
+        bust_risk = None
+    else:
+        def bust_risk():
+            if not exact:
+                exact.append(odds.bust_probability(dealer_hand, deck))
+            return exact[0]
+    decision = state.dealer_should_hit(player_score, bust_risk)
+
+    # Dealer trace; the exact bust risk is only shown when the decision computed it
+    logger.debug('Dealer AI: total=%d player=%d bust_risk=%s soft=%s decision=%s',
+                 state.score, player_score, exact[0] if exact else state.bust_risk, state.is_soft,
+                 'hit' if decision else 'stand')
+    return decision
 
 
 def dealer_ai_turn(deck, dealer_hand, player_score):
     """Manages the dealer's turn using the AI logic."""
-    while dealer_should_hit(dealer_hand, player_score):
-        print("[DEBUG] Dealer hits...")
+    state = HandState.from_ranks(card_rank(card) for card in dealer_hand)
+    # An exhausted deck ends the dealer's turn at its current total
+    while deck and dealer_should_hit(dealer_hand, player_score, state, deck):
         new_card = deck.pop()
         dealer_hand.append(new_card)
-        dealer_score = calculate_score(dealer_hand)
-        print(f"[DEBUG] Dealer hand: {dealer_hand}, Score: {dealer_score}")
-        if dealer_score > 21:
-            print("[DEBUG] Dealer busted.")
+        state.add_rank(card_rank(new_card))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Dealer hits: hand=%s score=%d', dealer_hand, state.score)
+        if state.score > 21:
+            logger.debug('Dealer busted')
             break # Dealer busts
 
-    return calculate_score(dealer_hand)
+    return state.score
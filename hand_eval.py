@@ -0,0 +1,142 @@
+"""Incremental blackjack hand evaluation backed by precomputed lookup tables.
+
+A HandState keeps the hard total (aces counted as 1), the ace count and the
+card count, so adding a card is O(1) and score, softness, bust risk and the
+dealer decision are single table lookups instead of walks over the hand.
+
+Cards are identified by rank index (0 = '2' ... 12 = 'A'); integer card codes
+from game_logic map to ranks with card % 13.
+"""
+
+ACE = 12
+# Hard points per rank index, aces counted as 1
+RANK_HARD = [2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10, 1]
+# Highest hard total reachable by adding one card to a live hand
+MAX_HARD = 31
+# The dealer draws below the player's total only while its bust risk is lower
+BUST_RISK_LIMIT = 0.5
+
+
+def _score(hard, has_ace):
+    return hard + 10 if has_ace and hard + 10 <= 21 else hard
+
+
+def _bust_risk(total, has_ace):
+    if total + 2 > 21:
+        return 1.0
+    risky_cards = 0
+    for card_value in range(2, 12):
+        if card_value == 11 and has_ace and total + 11 <= 21:
+            continue
+        if total + card_value > 21:
+            risky_cards += 1
+    return risky_cards / 10.0
+
+
+def _dealer_should_hit(total, is_soft, bust_risk, player_score):
+    if total >= 17:
+        return False
+    if is_soft and total == 17:
+        return True
+    if total < player_score and bust_risk < BUST_RISK_LIMIT:
+        return True
+    return total < 17
+
+
+# Tables indexed by [has_ace][min(hard, MAX_HARD)]
+SOFT_BONUS = [[10 if has_ace and hard + 10 <= 21 else 0 for hard in range(MAX_HARD + 1)] for has_ace in (0, 1)]
+IS_SOFT = [[bonus == 10 for bonus in row] for row in SOFT_BONUS]
+BUST_RISK = [[_bust_risk(_score(hard, has_ace), has_ace) for hard in range(MAX_HARD + 1)] for has_ace in (0, 1)]
+# Dealer decision indexed by [has_ace][min(hard, MAX_HARD)][min(player_score, MAX_HARD)]
+DEALER_HIT = [
+    [
+        [
+            _dealer_should_hit(_score(hard, has_ace), IS_SOFT[has_ace][hard], BUST_RISK[has_ace][hard], player_score)
+            for player_score in range(MAX_HARD + 1)
+        ]
+        for hard in range(MAX_HARD + 1)
+    ]
+    for has_ace in (0, 1)
+]
+# (decision under a low bust risk, decision under a high one), indexed like DEALER_HIT.
+# Where both agree the bust risk does not matter and need not be computed.
+DEALER_HIT_BY_RISK = [
+    [
+        [
+            tuple(_dealer_should_hit(_score(hard, has_ace), IS_SOFT[has_ace][hard], bust_risk, player_score)
+                  for bust_risk in (0.0, 1.0))
+            for player_score in range(MAX_HARD + 1)
+        ]
+        for hard in range(MAX_HARD + 1)
+    ]
+    for has_ace in (0, 1)
+]
+
+
+class HandState:
+    """Running totals for one hand."""
+    __slots__ = ('hard', 'aces', 'cards')
+
+    def __init__(self, hard=0, aces=0, cards=0):
+        self.hard = hard
+        self.aces = aces
+        self.cards = cards
+
+    @classmethod
+    def from_ranks(cls, ranks):
+        state = cls()
+        for rank in ranks:
+            state.add_rank(rank)
+        return state
+
+    @classmethod
+    def from_cards(cls, cards):
+        """Build the state for a list of integer card codes."""
+        return cls.from_ranks(card % 13 for card in cards)
+
+    def add_rank(self, rank):
+        self.hard += RANK_HARD[rank]
+        self.aces += rank == ACE
+        self.cards += 1
+
+    def add(self, card):
+        """Add an integer card code to the hand."""
+        self.add_rank(card % 13)
+
+    def _index(self):
+        return self.aces > 0, min(self.hard, MAX_HARD)
+
+    @property
+    def score(self):
+        has_ace, hard = self._index()
+        return self.hard + SOFT_BONUS[has_ace][hard]
+
+    @property
+    def is_soft(self):
+        has_ace, hard = self._index()
+        return IS_SOFT[has_ace][hard]
+
+    @property
+    def bust_risk(self):
+        has_ace, hard = self._index()
+        return BUST_RISK[has_ace][hard]
+
+    @property
+    def is_blackjack(self):
+        return self.cards == 2 and self.score == 21
+
+    def dealer_should_hit(self, player_score, bust_risk=None):
+        """Dealer AI decision for this hand against player_score.
+
+        bust_risk, when given, is a function returning the exact bust
+        probability to use instead of the ten-value estimate. It is only
+        called when the decision depends on it.
+        """
+        has_ace, hard = self._index()
+        player_score = min(max(player_score, 0), MAX_HARD)
+        if bust_risk is None:
+            return DEALER_HIT[has_ace][hard][player_score]
+        low, high = DEALER_HIT_BY_RISK[has_ace][hard][player_score]
+        if low == high:
+            return low
+        return low if bust_risk() < BUST_RISK_LIMIT else high
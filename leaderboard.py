@@ -0,0 +1,161 @@
+"""In-memory top of the leaderboard, backed by the Ranking table.
+
+Each process keeps only the best `capacity` rankings and the number of
+ranked users. Ranking scores only ever go up (update_rankings_db keeps the
+best payout), so after an update the top K is the previous top K plus the
+updated user: a user enters it once their score beats the threshold, the
+lowest score kept when the top K is full. Pages and ranks within the top K
+come from memory; pages beyond it and the rank of a user outside it come
+from the database through ix_ranking_score_desc.
+
+Ties share a rank: a user's rank is one more than the number of users with a
+strictly higher score (1, 2, 2, 4), both in pages and in rank_of.
+
+Other workers' updates reach this process's copy when it is rebuilt from the
+database, on first use and once it is max_age seconds old.
+"""
+import bisect
+import threading
+import time
+
+from sqlalchemy import func
+
+DEFAULT_CAPACITY = 100
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+DEFAULT_MAX_AGE = 10
+
+
+def clamp_page(page, per_page):
+    """page at least 1 and per_page within 1..MAX_PAGE_SIZE."""
+    return max(page, 1), min(max(per_page, 1), MAX_PAGE_SIZE)
+
+
+def _ranks(scores, start, first_rank):
+    """Ranks of a page of scores, best first, that starts at position start.
+
+    The first score may tie with the page before, so its rank is given; every
+    other score that differs from the one before it is ranked by position.
+    """
+    ranks = []
+    for i, score in enumerate(scores):
+        if not i:
+            ranks.append(first_rank)
+        else:
+            ranks.append(ranks[-1] if score == scores[i - 1] else start + i + 1)
+    return ranks
+
+
+class Leaderboard:
+    def __init__(self, capacity=DEFAULT_CAPACITY, max_age=DEFAULT_MAX_AGE):
+        self.capacity = capacity
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._total = 0
+        self._top = []           # (-score, user_id, username), best first
+
+    def reset(self):
+        """Drop the in-memory state; the next read rebuilds from the database."""
+        with self._lock:
+            self._loaded_at = None
+            self._total = 0
+            self._top = []
+
+    def rebuild(self):
+        """Load the top rankings with their usernames and count all of them."""
+        from database import db, Ranking, User
+
+        rows = (db.session.query(Ranking.score, Ranking.user_id, User.username).join(User)
+                .order_by(Ranking.score.desc(), Ranking.user_id).limit(self.capacity).all())
+        total = db.session.query(func.count(Ranking.id)).scalar()
+        with self._lock:
+            self._top = [(-score, user_id, username) for score, user_id, username in rows]
+            self._total = total
+            self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+            self.rebuild()
+
+    @property
+    def threshold(self):
+        """The score a user must beat to enter a full top K, or None while it has room."""
+        with self._lock:
+            return -self._top[-1][0] if len(self._top) >= self.capacity else None
+
+    def _complete(self):
+        return len(self._top) == self._total
+
+    def record(self, user_id, score, username, new=False):
+        """Apply a committed ranking score for user_id; new when it is the user's first."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            if new:
+                self._total += 1
+            threshold = self.threshold
+            if threshold is not None and score <= threshold:
+                return
+            self._top = [entry for entry in self._top if entry[1] != user_id]
+            bisect.insort(self._top, (-score, user_id, username))
+            del self._top[self.capacity:]
+
+    def page(self, page=1, per_page=DEFAULT_PAGE_SIZE):
+        """Return one page of {'rank', 'username', 'score'} rows, best first."""
+        page, per_page = clamp_page(page, per_page)
+        start = (page - 1) * per_page
+        with self._lock:
+            self._ensure_loaded()
+            if start + per_page <= len(self._top) or self._complete():
+                # Every higher score is in the top K, so positions there are ranks
+                top = self._top
+                rows = [(username, -neg_score) for neg_score, _, username in top[start:start + per_page]]
+                first_rank = self._rank_in_top(-top[start][0]) if rows else None
+            else:
+                rows = None
+        if rows is None:
+            rows = self._page_from_db(start, per_page)
+            first_rank = self._rank_from_db(rows[0][1]) if rows else None
+        ranks = _ranks([score for _, score in rows], start, first_rank)
+        return [{'rank': rank, 'username': username, 'score': score}
+                for rank, (username, score) in zip(ranks, rows)]
+
+    def _page_from_db(self, start, per_page):
+        """Pages beyond the materialized top-K come straight from the database."""
+        from database import db, Ranking, User
+
+        return (db.session.query(User.username, Ranking.score)
+                .select_from(Ranking).join(User)
+                .order_by(Ranking.score.desc(), Ranking.user_id)
+                .offset(start).limit(per_page).all())
+
+    def _rank_in_top(self, score):
+        return bisect.bisect_left(self._top, (-score,)) + 1
+
+    def _rank_from_db(self, score):
+        from database import db, Ranking
+
+        return db.session.query(func.count(Ranking.id)).filter(Ranking.score > score).scalar() + 1
+
+    def total(self):
+        with self._lock:
+            self._ensure_loaded()
+            return self._total
+
+    def rank_of(self, user_id):
+        """Return (rank, score) for user_id, or None if the user is unranked."""
+        from database import db, Ranking
+
+        with self._lock:
+            self._ensure_loaded()
+            score = next((-neg_score for neg_score, ranked, _ in self._top if ranked == user_id), None)
+            if score is not None:
+                return self._rank_in_top(score), score
+        score = db.session.query(Ranking.score).filter_by(user_id=user_id).scalar()
+        if score is None:
+            return None
+        return self._rank_from_db(score), score
+
+
+leaderboard = Leaderboard()
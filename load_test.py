@@ -0,0 +1,209 @@
+"""Load test for the full blackjack flow against a temporary SQLite file.
+
+Registers synthetic users, then drives register/login/start/hit/stand/
+double_down/rankings traffic from concurrent Flask test clients and reports
+throughput, p50/p95/p99 latency and SQL statements per request for each
+operation. Statements run by the write-behind worker are not attributed to
+requests.
+
+Results can be saved as a JSON baseline and compared on a later commit:
+
+    python load_test.py --users 50 --rounds 20 --save baseline.json
+    python load_test.py --users 50 --rounds 20 --compare baseline.json
+
+--compare exits with status 1 when an operation's p95 latency or SQL
+statements per request grow by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BET = 10
+PASSWORD = 'load-test'
+
+
+class Recorder:
+    """Latency and SQL statement samples per operation, collected across threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.samples = {}   # operation -> [(seconds, statements)]
+        self.errors = {}    # operation -> count
+
+    def count_statement(self, *args):
+        self._local.statements = getattr(self._local, 'statements', 0) + 1
+
+    def call(self, operation, send):
+        """Send one request, record it and return the response."""
+        self._local.statements = 0
+        start = time.perf_counter()
+        response = send()
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.samples.setdefault(operation, []).append((elapsed, self._local.statements))
+            if response.status_code >= 400:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+        return response
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def play_user(app, recorder, index, rounds, rng):
+    """One synthetic user: register, log in, then play rounds of blackjack."""
+    client = app.test_client()
+    username = f'load{index}'
+    recorder.call('register', lambda: client.post('/register', data={'username': username, 'password': PASSWORD}))
+    recorder.call('login', lambda: client.post('/login', data={'username': username, 'password': PASSWORD}))
+
+    for round_number in range(rounds):
+        data = recorder.call('start', lambda: client.post('/api/game/start', json={'bet_amount': BET})).get_json()
+        if data is None or 'error' in data:
+            recorder.call('reset_balance', lambda: client.post('/api/user/reset_balance'))
+            continue
+        while not data.get('game_over'):
+            if data['player_score'] in (10, 11) and rng.random() < 0.5:
+                action = 'double_down'
+            elif data['player_score'] < 17:
+                action = 'hit'
+            else:
+                action = 'stand'
+            data = recorder.call(action, lambda: client.post(f'/api/game/{action}')).get_json()
+            if data is None or 'error' in data:
+                break
+        if round_number % 5 == 0:
+            recorder.call('rankings', lambda: client.get('/api/rankings'))
+
+
+def run(app, users=20, rounds=10, concurrency=8, seed=0):
+    """Drive the load against app and return the summary dict."""
+    recorder = Recorder()
+    event.listen(Engine, 'before_cursor_execute', recorder.count_statement)
+    rngs = [random.Random(seed * 100003 + i) for i in range(users)]
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(play_user, app, recorder, i, rounds, rngs[i]) for i in range(users)]:
+                future.result()
+    finally:
+        event.remove(Engine, 'before_cursor_execute', recorder.count_statement)
+    elapsed = time.perf_counter() - start
+    return summarize(recorder, elapsed, users=users, rounds=rounds, concurrency=concurrency, seed=seed)
+
+
+def summarize(recorder, elapsed, **settings):
+    operations = {}
+    total = 0
+    for operation, samples in sorted(recorder.samples.items()):
+        latencies = sorted(seconds for seconds, _ in samples)
+        statements = [count for _, count in samples]
+        total += len(samples)
+        operations[operation] = {
+            'requests': len(samples),
+            'errors': recorder.errors.get(operation, 0),
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'sql_per_request': sum(statements) / len(statements),
+        }
+    return {
+        'commit': _git_commit(),
+        'settings': settings,
+        'elapsed_s': elapsed,
+        'requests': total,
+        'throughput_rps': total / elapsed if elapsed else 0.0,
+        'operations': operations,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(baseline, current, tolerance=0.2):
+    """Return human-readable regressions of current against baseline."""
+    regressions = []
+    for operation, now in current['operations'].items():
+        before = baseline['operations'].get(operation)
+        if before is None:
+            continue
+        for key in ('p95_ms', 'sql_per_request'):
+            if before[key] and now[key] > before[key] * (1 + tolerance):
+                regressions.append(f'{operation} {key}: {before[key]:.2f} -> {now[key]:.2f}')
+    return regressions
+
+
+def print_report(summary, baseline=None):
+    print(f"{summary['requests']:,} requests in {summary['elapsed_s']:.2f}s "
+          f"({summary['throughput_rps']:,.1f} req/s)")
+    print(f"{'operation':<14}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'SQL/req':>9}")
+    for operation, stats in summary['operations'].items():
+        line = (f"{operation:<14}{stats['requests']:>9}{stats['errors']:>8}{stats['p50_ms']:>10.2f}"
+                f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['sql_per_request']:>9.1f}")
+        before = baseline and baseline['operations'].get(operation)
+        if before:
+            line += f"   (p95 was {before['p95_ms']:.2f}, SQL/req was {before['sql_per_request']:.1f})"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=20, help='synthetic users')
+    parser.add_argument('--rounds', type=int, default=10, help='blackjack hands per user')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', metavar='FILE', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare against a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app reads its database URL at import time
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmp, 'load_test.db')
+        from app import app
+        from database import db
+
+        with app.app_context():
+            db.create_all()
+        summary = run(app, args.users, args.rounds, args.concurrency, args.seed)
+        app.extensions['write_behind'].shutdown()
+        with app.app_context():
+            db.engine.dispose()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(summary, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if baseline is not None:
+        regressions = compare(baseline, summary, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
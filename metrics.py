@@ -0,0 +1,250 @@
+"""In-process metrics exposed at /metrics in the Prometheus text format.
+
+Collected per process:
+    http_request_duration_seconds   latency histogram per endpoint and method
+    http_requests_total             responses per endpoint, method and status
+    db_queries_per_request          SQL statements issued by one request
+    db_query_seconds_per_request    time spent in SQL by one request
+    db_queries_total / db_query_seconds_total   every statement, including
+                                    the write-behind worker
+    db_commits_total                committed transactions
+    blackjack_games_total           finished hands per result
+    blackjack_wagered_total / blackjack_payout_total
+    password_hash_seconds           password hash latency per operation,
+                                    including the wait for a pool worker
+    password_pool_pending           hashes queued or running in the pool
+    password_pool_rejected_total    hashes refused with 503 (pool saturated)
+    password_rehashes_total         hashes upgraded to new parameters on login
+
+Each worker process keeps its own numbers, shared by the apps it creates;
+scrape every worker or run one.
+
+Config:
+    METRICS_ENABLED  collect metrics and serve /metrics (default True)
+"""
+import bisect
+import math
+import threading
+import time
+
+from flask import Response, current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def value(self):
+        return self._value
+
+    def samples(self):
+        yield f'{self.name} {_number(self._value)}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._lock = threading.Lock()
+        self._values = {}   # labels -> [per-bucket counts, sum, count]
+
+    def observe(self, amount, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, amount)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += amount
+            entry[2] += 1
+
+    def count(self, **labels):
+        entry = self._values.get(tuple(labels[name] for name in self.labelnames))
+        return entry[2] if entry else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(bound))])} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labelnames, key)} {count}'
+
+
+class Metrics:
+    """The process's collectors; each app turns them on with METRICS_ENABLED."""
+
+    def __init__(self, app=None):
+        self._collectors = []
+        self.request_latency = self._add(Histogram(
+            'http_request_duration_seconds', 'Request latency.', ('endpoint', 'method')))
+        self.requests = self._add(Counter(
+            'http_requests_total', 'Responses sent.', ('endpoint', 'method', 'status')))
+        self.request_queries = self._add(Histogram(
+            'db_queries_per_request', 'SQL statements per request.', ('endpoint',), QUERY_COUNT_BUCKETS))
+        self.request_query_time = self._add(Histogram(
+            'db_query_seconds_per_request', 'Time spent in SQL per request.', ('endpoint',)))
+        self.queries = self._add(Counter('db_queries_total', 'SQL statements executed.'))
+        self.query_time = self._add(Counter('db_query_seconds_total', 'Time spent executing SQL.'))
+        self.commits = self._add(Counter('db_commits_total', 'Committed transactions.'))
+        self.games = self._add(Counter('blackjack_games_total', 'Finished blackjack hands.', ('result',)))
+        self.wagered = self._add(Counter('blackjack_wagered_total', 'Amount bet on finished hands.'))
+        self.paid_out = self._add(Counter('blackjack_payout_total', 'Amount paid out on finished hands.'))
+        self.password_hash_latency = self._add(Histogram(
+            'password_hash_seconds', 'Password hash latency, including the pool wait.', ('operation',)))
+        self.password_pool_pending = self._add(Gauge(
+            'password_pool_pending', 'Password hashes queued or running.'))
+        self.password_pool_rejected = self._add(Counter(
+            'password_pool_rejected_total', 'Password hashes refused because the pool was saturated.'))
+        self.password_rehashes = self._add(Counter(
+            'password_rehashes_total', 'Password hashes upgraded to the current parameters.'))
+        if app is not None:
+            self.init_app(app)
+
+    def _add(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def init_app(self, app):
+        from database import db
+
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.extensions['metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        if not event.contains(db.session, 'after_commit', self._count_commit):
+            event.listen(db.session, 'after_commit', self._count_commit)
+
+    def enabled_for(self, app):
+        return app.extensions.get('metrics') is self and app.config['METRICS_ENABLED']
+
+    @property
+    def enabled(self):
+        """Whether the current app collects metrics."""
+        return has_app_context() and self.enabled_for(current_app)
+
+    def _count_commit(self, session):
+        self.commits.inc()
+
+    def _start_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_query_time = 0.0
+
+    def _finish_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        # Route templates, not raw paths, keep label cardinality bounded
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        self.request_latency.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method)
+        self.requests.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        self.request_queries.observe(g.pop('metrics_queries', 0), endpoint=endpoint)
+        self.request_query_time.observe(g.pop('metrics_query_time', 0.0), endpoint=endpoint)
+        return response
+
+    def record_game(self, result, bet_amount, payout):
+        self.games.inc(result=result)
+        self.wagered.inc(bet_amount)
+        self.paid_out.inc(payout)
+
+    def record_password_hash(self, operation, seconds):
+        self.password_hash_latency.observe(seconds, operation=operation)
+
+    def render(self):
+        lines = []
+        for collector in self._collectors:
+            lines.append(f'# HELP {collector.name} {collector.documentation}')
+            lines.append(f'# TYPE {collector.name} {collector.kind}')
+            lines.extend(collector.samples())
+        return '\n'.join(lines) + '\n'
+
+    def export(self):
+        return Response(self.render(), content_type=CONTENT_TYPE)
+
+
+metrics = Metrics()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+    metrics.queries.inc()
+    metrics.query_time.inc(elapsed)
+    if has_request_context() and 'metrics_queries' in g:
+        g.metrics_queries += 1
+        g.metrics_query_time += elapsed
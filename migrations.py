@@ -0,0 +1,143 @@
+"""Versioned schema migrations.
+
+db.create_all() creates missing tables but never changes a table that
+already exists, so columns and indexes added to the models never reach an
+existing database. migrate() brings any database up to the models in
+place: it creates missing tables, then applies every migration newer than
+the highest version in schema_migration, in order, one transaction each,
+recording each as it goes.
+
+Migrations inspect the live schema before changing it, so on a database
+create_all() just built from the current models they only record
+themselves. New migrations go at the end of MIGRATIONS with the next
+version; applied ones are never edited.
+
+Run it from one process before starting the workers:
+
+    flask --app app db-upgrade
+"""
+import logging
+
+from sqlalchemy import delete, inspect, insert, func, select, update
+
+from database import db, FreeCellRecord, GameRecord, GameSession, Ranking, SchemaMigration, Shoe, User
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+
+def migration(version):
+    """Register a migration function(conn) as the given schema version."""
+    def register(function):
+        assert not MIGRATIONS or version == MIGRATIONS[-1][0] + 1, 'migration versions must be consecutive'
+        MIGRATIONS.append((version, function))
+        return function
+    return register
+
+
+def _columns(conn, table):
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+
+def _add_columns(conn, table, *names):
+    """ALTER TABLE ADD COLUMN for each model column the table lacks."""
+    existing = _columns(conn, table.name)
+    preparer = conn.dialect.identifier_preparer
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        conn.exec_driver_sql(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN '
+                             f'{preparer.format_column(column)} {column.type.compile(dialect=conn.dialect)}')
+
+
+def _create_indexes(conn, table):
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+@migration(1)
+def seeded_shoes(conn):
+    """Rebuild shoe and game_session tables that predate seeded shoes.
+
+    Only hands in progress live there. Their bets, already taken from the
+    balance, are refunded before the hands are dropped; the next hand deals
+    from a new shoe.
+    """
+    if 'seed' in _columns(conn, 'shoe') and 'seed' in _columns(conn, 'game_session'):
+        return
+    hands, users = GameSession.__table__, User.__table__
+    bets = conn.execute(select(hands.c.user_id, func.sum(hands.c.current_bet))
+                        .where(hands.c.game_over.is_(False)).group_by(hands.c.user_id)).all()
+    for user_id, bet in bets:
+        conn.execute(update(users).where(users.c.id == user_id).values(balance=users.c.balance + bet))
+    logger.info('Refunded unfinished hands of %d users', len(bets))
+    hands.drop(conn)
+    Shoe.__table__.drop(conn)
+    Shoe.__table__.create(conn)
+    GameSession.__table__.create(conn)
+
+
+@migration(2)
+def game_record_deal(conn):
+    """Deal columns that audit.py replays hands from."""
+    _add_columns(conn, GameRecord.__table__, 'seed', 'decks', 'cursor', 'actions')
+
+
+@migration(3)
+def hot_query_indexes(conn):
+    """History by (user_id, timestamp), leaderboard order, per-user lookups."""
+    for table in (GameRecord.__table__, Ranking.__table__, GameSession.__table__, Shoe.__table__):
+        _create_indexes(conn, table)
+
+
+@migration(4)
+def freecell_best_records(conn):
+    """One FreeCell record per user and deal.
+
+    Keeps the best of each user's records on a deal (highest score, then
+    fewest moves, then the first) and deletes the rest before the unique
+    index is built.
+    """
+    table = FreeCellRecord.__table__
+    seen = set()
+    rows = conn.execute(select(table.c.id, table.c.user_id, table.c.deal)
+                        .order_by(table.c.score.desc(), table.c.move_count, table.c.id))
+    for record_id, user_id, deal in rows.all():
+        if (user_id, deal) in seen:
+            conn.execute(delete(table).where(table.c.id == record_id))
+        seen.add((user_id, deal))
+    _create_indexes(conn, table)
+
+
+def head():
+    return MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    if not inspect(conn).has_table(SchemaMigration.__tablename__):
+        return 0
+    return conn.execute(select(func.max(SchemaMigration.version))).scalar() or 0
+
+
+def migrate(engine=None):
+    """Bring the database up to date. Returns the versions applied."""
+    engine = engine or db.engine
+    with engine.connect() as conn:
+        existing = set(inspect(conn).get_table_names())
+    # Indexes of existing tables are left to the migrations: they may need columns not added yet
+    db.metadata.create_all(engine, tables=[table for table in db.metadata.sorted_tables
+                                           if table.name not in existing])
+    with engine.connect() as conn:
+        version = current_version(conn)
+    applied = []
+    for number, function in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.begin() as conn:
+            function(conn)
+            conn.execute(insert(SchemaMigration.__table__).values(version=number, name=function.__name__))
+        logger.info('Applied migration %d %s', number, function.__name__)
+        applied.append(number)
+    return applied
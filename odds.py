@@ -0,0 +1,312 @@
+"""Exact blackjack odds from the composition of the remaining deck.
+
+The remaining cards are summarised as counts per point value (2..9, ten-valued,
+ace) packed into one integer, COUNT_BITS bits per slot. Only the counts
+matter, not their order, so every deal with the same cards left shares one
+memo entry. The dealer and player programs below follow the rules the API
+plays:
+
+    hit          the player draws; unless they bust, the dealer draws one card
+                 if dealer_should_hit says so, and a dealer bust ends the hand
+    stand        the dealer plays to completion (dealer_ai_turn)
+    double_down  the player draws exactly one card, then the dealer plays out
+
+Expected values are net, in units of the current bet: +1 win, 0 push, -1
+loss (a double counts twice).
+
+bust_probability and dealer_distribution give the exact chance that the next
+card busts a hand and the distribution of the dealer's final total. The
+dealer AI uses the former in place of the ten-value estimate of
+calculate_bust_risk. Results are memoized with LRU eviction and
+shared across requests, so repeated positions cost a dictionary lookup.
+
+Standing and doubling cost a few milliseconds even from a cold cache. The
+exact EV of hitting is the expensive part: hands of small cards against a
+small dealer hand branch the most and, cold, take seconds on a single deck
+and more on a multi-deck shoe. advise() therefore takes a budget of new
+memo entries; past it the hit EV is replaced by the EV of hitting once and
+then standing, a lower bound that costs about as much as doubling. Entries
+computed before the budget ran out stay cached, so repeated requests for
+the same position converge on the exact answer.
+"""
+import threading
+from functools import lru_cache
+
+from hand_eval import BUST_RISK_LIMIT, DEALER_HIT_BY_RISK, MAX_HARD, SOFT_BONUS
+
+# Composition slots: 2..9, ten-valued (10, J, Q, K), ace
+SLOTS = 10
+ACE_SLOT = 9
+SLOT_OF_RANK = (0, 1, 2, 3, 4, 5, 6, 7, 8, 8, 8, 8, 9)
+SLOT_HARD = (2, 3, 4, 5, 6, 7, 8, 9, 10, 1)
+COUNT_BITS = 8
+# Final dealer totals are 0..21; this index holds the bust probability
+BUST = 22
+COUNT_MASK = (1 << COUNT_BITS) - 1
+SLOT_RANGE = range(SLOTS)
+SHIFT = tuple(slot * COUNT_BITS for slot in SLOT_RANGE)
+# Packed composition of a single card in each slot
+UNIT = tuple(1 << shift for shift in SHIFT)
+CACHE_SIZE = 200000
+
+
+class BudgetExceeded(Exception):
+    """An exact computation needed more new memo entries than its budget."""
+
+
+# New memo entries the current thread may still compute; None is unlimited
+_budget = threading.local()
+_budget.left = None
+
+
+def _spend():
+    left = getattr(_budget, 'left', None)
+    if left is not None:
+        if left <= 0:
+            raise BudgetExceeded()
+        _budget.left = left - 1
+
+
+def composition(cards):
+    """Packed per-slot counts of integer card codes."""
+    packed = 0
+    for card in cards:
+        packed += UNIT[SLOT_OF_RANK[card % 13]]
+    return packed
+
+
+def counts(packed):
+    """Unpack a composition into a tuple of SLOTS counts."""
+    return tuple((packed >> shift) & COUNT_MASK for shift in SHIFT)
+
+
+def _hand(cards):
+    hard = 0
+    has_ace = False
+    for card in cards:
+        slot = SLOT_OF_RANK[card % 13]
+        hard += SLOT_HARD[slot]
+        has_ace = has_ace or slot == ACE_SLOT
+    return hard, has_ace
+
+
+def _score(hard, has_ace):
+    return hard + SOFT_BONUS[has_ace][min(hard, MAX_HARD)]
+
+
+def _draws(packed, remaining):
+    """(slot, probability, composition after the draw) for every slot left."""
+    for slot in SLOT_RANGE:
+        count = (packed >> SHIFT[slot]) & COUNT_MASK
+        if count:
+            yield slot, count / remaining, packed - UNIT[slot]
+
+
+def _bust(hard, packed, remaining):
+    """Probability that the next card takes a hand of this hard total past 21."""
+    if hard > 21:
+        return 1.0
+    if not remaining:
+        return 0.0
+    busting = 0
+    for slot in SLOT_RANGE:
+        if hard + SLOT_HARD[slot] > 21:
+            busting += (packed >> SHIFT[slot]) & COUNT_MASK
+    return busting / remaining
+
+
+def _dealer_hits(hard, has_ace, player_score, packed, remaining):
+    """dealer_should_hit, with the exact bust probability when it matters."""
+    low, high = DEALER_HIT_BY_RISK[has_ace][min(hard, MAX_HARD)][player_score]
+    if low == high:
+        return low
+    return low if _bust(hard, packed, remaining) < BUST_RISK_LIMIT else high
+
+
+def _policy_classes():
+    """Map each player score to the smallest score with the same dealer decisions.
+
+    Keying the dealer distribution on the class instead of the score lets
+    player scores the dealer does not distinguish share one memo entry.
+    """
+    columns = [[row[player_score] for table in DEALER_HIT_BY_RISK for row in table]
+               for player_score in range(MAX_HARD + 1)]
+    return tuple(columns.index(column) for column in columns)
+
+
+POLICY_CLASS = _policy_classes()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _dealer(hard, has_ace, policy, packed, remaining):
+    """Distribution of the dealer's final total, a tuple indexed 0..BUST."""
+    score = _score(hard, has_ace)
+    if score > 21:
+        return (0.0,) * BUST + (1.0,)
+    if not remaining or not _dealer_hits(hard, has_ace, policy, packed, remaining):
+        # An empty deck cannot be drawn from; the dealer keeps its total
+        return (0.0,) * score + (1.0,) + (0.0,) * (BUST - score)
+    final = [0.0] * (BUST + 1)
+    for slot, p, rest in _draws(packed, remaining):
+        after = _dealer(hard + SLOT_HARD[slot], has_ace or slot == ACE_SLOT, policy, rest, remaining - 1)
+        for total, q in enumerate(after):
+            if q:
+                final[total] += p * q
+    return tuple(final)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _dealer_ev(hard, has_ace, player_score, packed, remaining):
+    """Player's EV standing on player_score (<= 21) against this dealer hand."""
+    _spend()
+    score = _score(hard, has_ace)
+    if score > 21:
+        return 1.0
+    if not remaining or not _dealer_hits(hard, has_ace, player_score, packed, remaining):
+        return (player_score > score) - (player_score < score)
+    ev = 0.0
+    for slot in SLOT_RANGE:
+        count = (packed >> SHIFT[slot]) & COUNT_MASK
+        if count:
+            ev += count * _dealer_ev(hard + SLOT_HARD[slot], has_ace or slot == ACE_SLOT, player_score,
+                                     packed - UNIT[slot], remaining - 1)
+    return ev / remaining
+
+
+def _stand(p_hard, p_ace, d_hard, d_ace, packed, remaining):
+    player_score = _score(p_hard, p_ace)
+    if player_score > 21:
+        return -1.0
+    return _dealer_ev(d_hard, d_ace, player_score, packed, remaining)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _hit(p_hard, p_ace, d_hard, d_ace, packed, remaining):
+    """EV of hitting once, then playing the best of hit and stand afterwards."""
+    _spend()
+    return _draw(p_hard, p_ace, d_hard, d_ace, packed, remaining, _best)
+
+
+def _hit_then_stand(p_hard, p_ace, d_hard, d_ace, packed, remaining):
+    """EV of hitting exactly once and then standing: a lower bound of _hit."""
+    return _draw(p_hard, p_ace, d_hard, d_ace, packed, remaining, _stand)
+
+
+def _draw(p_hard, p_ace, d_hard, d_ace, packed, remaining, then):
+    """EV of one player card and the dealer's answer, continuing with then(...)."""
+    ev = 0.0
+    left = remaining - 1
+    for slot in SLOT_RANGE:
+        count = (packed >> SHIFT[slot]) & COUNT_MASK
+        if not count:
+            continue
+        hard, has_ace = p_hard + SLOT_HARD[slot], p_ace or slot == ACE_SLOT
+        player_score = _score(hard, has_ace)
+        if player_score > 21:
+            ev -= count
+            continue
+        rest = packed - UNIT[slot]
+        if left and _dealer_hits(d_hard, d_ace, player_score, rest, left):
+            # The dealer answers the hit with one card of its own
+            answer = 0.0
+            for d_slot in SLOT_RANGE:
+                d_count = (rest >> SHIFT[d_slot]) & COUNT_MASK
+                if not d_count:
+                    continue
+                dealer_hard, dealer_ace = d_hard + SLOT_HARD[d_slot], d_ace or d_slot == ACE_SLOT
+                if _score(dealer_hard, dealer_ace) > 21:
+                    answer += d_count
+                else:
+                    answer += d_count * then(hard, has_ace, dealer_hard, dealer_ace, rest - UNIT[d_slot], left - 1)
+            ev += count * answer / left
+        else:
+            ev += count * then(hard, has_ace, d_hard, d_ace, rest, left)
+    return ev / remaining
+
+
+def _best(p_hard, p_ace, d_hard, d_ace, packed, remaining):
+    stand = _stand(p_hard, p_ace, d_hard, d_ace, packed, remaining)
+    if not remaining:
+        return stand
+    return max(stand, _hit(p_hard, p_ace, d_hard, d_ace, packed, remaining))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _double(p_hard, p_ace, d_hard, d_ace, packed, remaining):
+    ev = 0.0
+    for slot, p, rest in _draws(packed, remaining):
+        hard, has_ace = p_hard + SLOT_HARD[slot], p_ace or slot == ACE_SLOT
+        ev += p * _stand(hard, has_ace, d_hard, d_ace, rest, remaining - 1)
+    return 2 * ev
+
+
+def advise(player_hand, dealer_hand, deck, can_double=True, budget=None):
+    """EV of each action for a hand in progress.
+
+    Returns {'stand': ev, 'hit': ev or None, 'double_down': ev or None,
+    'best': action, 'exact': bool}. Hitting and doubling are None when the
+    deck is empty, doubling also when can_double is False. budget caps the
+    new memo entries spent on the exact hit EV; when it runs out, 'hit' is
+    the hit-once-then-stand lower bound and 'exact' is False.
+    """
+    p_hard, p_ace = _hand(player_hand)
+    d_hard, d_ace = _hand(dealer_hand)
+    packed, remaining = composition(deck), len(deck)
+    evs = {'stand': _stand(p_hard, p_ace, d_hard, d_ace, packed, remaining), 'hit': None, 'double_down': None,
+           'exact': True}
+    if remaining:
+        if can_double:
+            evs['double_down'] = _double(p_hard, p_ace, d_hard, d_ace, packed, remaining)
+        _budget.left = budget
+        try:
+            evs['hit'] = _hit(p_hard, p_ace, d_hard, d_ace, packed, remaining)
+        except BudgetExceeded:
+            _budget.left = None
+            evs['hit'] = _hit_then_stand(p_hard, p_ace, d_hard, d_ace, packed, remaining)
+            evs['exact'] = False
+        finally:
+            _budget.left = None
+    evs['best'] = max((action for action in ('stand', 'hit', 'double_down') if evs[action] is not None),
+                      key=evs.get)
+    return evs
+
+
+def bust_probability(hand, deck):
+    """Exact probability that the next card from deck busts hand."""
+    hard, _ = _hand(hand)
+    return _bust(hard, composition(deck), len(deck))
+
+
+def dealer_distribution(dealer_hand, player_score, deck):
+    """Exact distribution of the dealer's final total if the player stands now.
+
+    Returns {total: probability, ..., 'bust': probability}, omitting
+    totals that cannot happen.
+    """
+    hard, has_ace = _hand(dealer_hand)
+    policy = POLICY_CLASS[min(max(player_score, 0), MAX_HARD)]
+    final = _dealer(hard, has_ace, policy, composition(deck), len(deck))
+    distribution = {total: p for total, p in enumerate(final[:BUST]) if p}
+    distribution['bust'] = final[BUST]
+    return distribution
+
+
+def hand_odds(player_hand, dealer_hand, deck):
+    """Exact odds for the UI: bust chances of both hands and the dealer's final totals."""
+    player_score = _score(*_hand(player_hand))
+    dealer = dealer_distribution(dealer_hand, player_score, deck)
+    return {
+        'player_bust': bust_probability(player_hand, deck),
+        'dealer_bust': dealer['bust'],
+        'dealer_final': {str(total): p for total, p in dealer.items()},
+    }
+
+
+def cache_info():
+    """lru_cache statistics of every memo, by name."""
+    return {memo.__name__.lstrip('_'): memo.cache_info() for memo in (_dealer, _dealer_ev, _hit, _double)}
+
+
+def clear_cache():
+    for memo in (_dealer, _dealer_ev, _hit, _double):
+        memo.cache_clear()
@@ -0,0 +1,204 @@
+"""Password hashing on a bounded process pool.
+
+scrypt and pbkdf2 are deliberately slow and hold the GIL, so hashing inline
+in /login and /register stalls every other request of the worker. Hashes
+run on a pool of PASSWORD_POOL_WORKERS processes instead. At most
+PASSWORD_POOL_MAX_PENDING hashes may be queued or running per web process;
+past that hash() and verify() raise PoolSaturated at once, and the app
+answers 503 with Retry-After rather than queueing logins behind each other.
+
+verify() also rehashes a correct password whose stored hash was made with
+other parameters than PASSWORD_HASH_METHOD, in the same pool call, so
+raising the work factor upgrades users as they log in.
+
+Config:
+    PASSWORD_HASH_METHOD       werkzeug method string with all parameters
+                               (default 'scrypt:32768:8:1')
+    PASSWORD_POOL_WORKERS      hashing processes; 0 hashes in the request
+                               thread (default min(4, CPUs))
+    PASSWORD_POOL_MAX_PENDING  hashes queued or running before new ones are
+                               refused (default 4 per worker)
+    PASSWORD_POOL_TIMEOUT      seconds a request waits for its hash
+    PASSWORD_POOL_RETRY_AFTER  Retry-After seconds sent with the 503
+"""
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import BrokenExecutor, TimeoutError as FutureTimeout
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from metrics import metrics
+
+
+class PoolSaturated(Exception):
+    """Too many password hashes in flight; retry after retry_after seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__('Password hashing pool is saturated')
+        self.retry_after = retry_after
+
+
+def needs_rehash(pwhash, method):
+    """Whether pwhash was made with other parameters than method."""
+    return pwhash.split('$', 1)[0] != method
+
+
+def hash_password(password, method):
+    return generate_password_hash(password, method)
+
+
+def verify_password(pwhash, password, method):
+    """(matches, new hash or None); runs in a pool process."""
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if needs_rehash(pwhash, method):
+        return True, generate_password_hash(password, method)
+    return True, None
+
+
+class HashingPool:
+    """One app's hashing processes and its count of hashes in flight."""
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._executor = None
+        self._workers = None
+        self._pid = None
+        self._pending = 0
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def max_pending(self):
+        limit = self.app.config['PASSWORD_POOL_MAX_PENDING']
+        if limit is None:
+            limit = 4 * max(self.app.config['PASSWORD_POOL_WORKERS'], 1)
+        return limit
+
+    def hash(self, password):
+        """A hash of password made with PASSWORD_HASH_METHOD."""
+        return self._run('hash', hash_password, password, self.app.config['PASSWORD_HASH_METHOD'])
+
+    def verify(self, pwhash, password):
+        """(matches, upgraded hash or None) for a stored hash and a password attempt."""
+        matches, upgraded = self._run('verify', verify_password, pwhash, password,
+                                      self.app.config['PASSWORD_HASH_METHOD'])
+        if upgraded is not None and metrics.enabled_for(self.app):
+            metrics.password_rehashes.inc()
+        return matches, upgraded
+
+    def _run(self, operation, function, *args):
+        workers = self.app.config['PASSWORD_POOL_WORKERS']
+        self._acquire()
+        start = time.perf_counter()
+        if not workers:
+            try:
+                result = function(*args)
+            finally:
+                self._release()
+        else:
+            try:
+                future = self._pool(workers).submit(function, *args)
+            except BaseException:
+                self._release()
+                raise
+            # The slot stays taken until the hash finishes, even if we stop waiting
+            future.add_done_callback(lambda _: self._release())
+            try:
+                result = future.result(timeout=self.app.config['PASSWORD_POOL_TIMEOUT'])
+            # Not the builtin TimeoutError before Python 3.11
+            except FutureTimeout:
+                raise PoolSaturated(self.app.config['PASSWORD_POOL_RETRY_AFTER'])
+            except BrokenExecutor:
+                self.shutdown()
+                raise
+        if metrics.enabled_for(self.app):
+            metrics.record_password_hash(operation, time.perf_counter() - start)
+        return result
+
+    def _acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked process inherits neither the pool nor its jobs
+                self._pid = os.getpid()
+                self._executor = None
+                self._pending = 0
+            if self._pending >= self.max_pending():
+                if metrics.enabled_for(self.app):
+                    metrics.password_pool_rejected.inc()
+                raise PoolSaturated(self.app.config['PASSWORD_POOL_RETRY_AFTER'])
+            self._pending += 1
+            self._report_pending()
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+            self._report_pending()
+
+    def _report_pending(self):
+        if metrics.enabled_for(self.app):
+            metrics.password_pool_pending.set(self._pending)
+
+    def _pool(self, workers):
+        # Imported with the first pool: multiprocessing is not needed to start the app
+        from concurrent.futures import ProcessPoolExecutor
+
+        with self._lock:
+            if self._executor is None or self._workers != workers:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                self._executor = ProcessPoolExecutor(max_workers=workers)
+                self._workers = workers
+            return self._executor
+
+    def shutdown(self):
+        """Stop the pool's processes; the next hash starts a new pool."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=True)
+
+
+class PasswordHasher:
+    """Gives each app its own HashingPool as app.extensions['passwords'].
+
+    hash() and verify() run on the current app's pool.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+        app.config.setdefault('PASSWORD_POOL_WORKERS', min(4, os.cpu_count() or 1))
+        app.config.setdefault('PASSWORD_POOL_MAX_PENDING', None)
+        app.config.setdefault('PASSWORD_POOL_TIMEOUT', 10.0)
+        app.config.setdefault('PASSWORD_POOL_RETRY_AFTER', 1)
+        pool = app.extensions['passwords'] = HashingPool(app)
+        atexit.register(pool.shutdown)
+
+    @property
+    def pool(self):
+        return current_app.extensions['passwords']
+
+    @property
+    def pending(self):
+        return self.pool.pending
+
+    def hash(self, password):
+        return self.pool.hash(password)
+
+    def verify(self, pwhash, password):
+        return self.pool.verify(pwhash, password)
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+hasher = PasswordHasher()
@@ -6,5 +6,6 @@ port = 23333
 
 if __name__ == "__main__":
     with app.app_context():
-        db.create_all()
+        migrate()
+        leaderboard.rebuild()
     app.run(debug=False, host=host, port=port)
\ No newline at end of file
@@ -0,0 +1,205 @@
+"""Storage backends for active blackjack hands (GameSession).
+
+DBSessionStore loads and writes GameSession rows through the ORM on every
+action. MemorySessionStore serves active hands from an in-process LRU with an
+idle TTL and only touches the database according to its persistence mode:
+
+    write-through    insert at start, UPDATE (no SELECT) after every action
+    write-on-finish  insert once, when the hand is over
+
+Memory hands live in one process, so the memory backend needs a single worker
+or sticky sessions. Cached state changes only when the request transaction
+commits, so a rolled-back action leaves the cached hand untouched.
+
+Config:
+    GAME_SESSION_STORE       'db' (default) or 'memory'
+    GAME_SESSION_PERSIST     'write-through' (default) or 'write-on-finish'
+    GAME_SESSION_CACHE_SIZE  hands kept in memory
+    GAME_SESSION_TTL         seconds an idle hand stays in memory
+"""
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import update
+
+from database import db, GameSession, after_commit
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('user_id', 'shoe_id', 'seed', 'decks', 'cursor', 'player_hand', 'dealer_hand', 'player_score', 'dealer_score',
+          'current_bet', 'game_over')
+
+
+class CachedGameSession:
+    """In-memory hand with the same attributes as a GameSession row."""
+    __slots__ = FIELDS + ('id', 'row_id', 'created_at', 'updated_at')
+
+    def __init__(self, id, row_id=None, created_at=None, updated_at=None, **fields):
+        self.id = id
+        self.row_id = row_id
+        self.created_at = created_at or datetime.utcnow()
+        self.updated_at = updated_at or self.created_at
+        for name in FIELDS:
+            setattr(self, name, fields[name])
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.id, row_id=row.id, created_at=row.created_at, updated_at=row.updated_at,
+                   **{name: getattr(row, name) for name in FIELDS})
+
+    def copy(self):
+        return CachedGameSession(self.id, self.row_id, self.created_at, self.updated_at,
+                                 **{name: getattr(self, name) for name in FIELDS})
+
+    def fields(self):
+        return {name: getattr(self, name) for name in FIELDS}
+
+
+class DBSessionStore:
+    """Every hand is a GameSession row tracked by the ORM."""
+
+    def create(self, **fields):
+        game_session = GameSession(**fields)
+        db.session.add(game_session)
+        db.session.flush()
+        return game_session
+
+    def get(self, key):
+        if not isinstance(key, int):
+            return None
+        return db.session.get(GameSession, key)
+
+    def save(self, game_session):
+        # Changes are flushed by the ORM when the action commits
+        pass
+
+
+class MemorySessionStore:
+    def __init__(self, persist='write-through', capacity=10000, ttl=1800):
+        if persist not in ('write-through', 'write-on-finish'):
+            raise ValueError(f'Unknown persistence mode: {persist}')
+        self.persist = persist
+        self.capacity = capacity
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._hands = OrderedDict()   # key -> (CachedGameSession, last_used)
+
+    def __len__(self):
+        return len(self._hands)
+
+    def create(self, **fields):
+        if self.persist == 'write-through':
+            row = GameSession(**fields)
+            db.session.add(row)
+            db.session.flush()
+            hand = CachedGameSession.from_row(row)
+        else:
+            hand = CachedGameSession('m-' + secrets.token_hex(8), **fields)
+        self._commit_cached(hand)
+        return hand.copy()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._hands.get(key)
+            if entry is not None and now - entry[1] <= self.ttl:
+                self._hands.move_to_end(key)
+                self._hands[key] = (entry[0], now)
+                return entry[0].copy()
+            if entry is not None:
+                del self._hands[key]
+        if entry is not None:
+            self._abandon(entry[0])
+        if self.persist == 'write-through' and isinstance(key, int):
+            row = db.session.get(GameSession, key)
+            if row is not None and not row.game_over:
+                hand = CachedGameSession.from_row(row)
+                self._commit_cached(hand)
+                return hand.copy()
+        return None
+
+    def save(self, hand):
+        hand.updated_at = datetime.utcnow()
+        if hand.game_over or self.persist == 'write-through':
+            self._persist(hand)
+        self._commit_cached(hand)
+
+    def _persist(self, hand):
+        """Stage the hand's row in the current transaction."""
+        if hand.row_id is None:
+            row = GameSession(created_at=hand.created_at, updated_at=hand.updated_at, **hand.fields())
+            db.session.add(row)
+            db.session.flush()
+            hand.row_id = row.id
+        else:
+            db.session.execute(
+                update(GameSession).where(GameSession.id == hand.row_id)
+                .values(updated_at=hand.updated_at, **hand.fields())
+            )
+
+    def _commit_cached(self, hand):
+        # Only committed state reaches the cache; finished hands leave it
+        def apply():
+            evicted = []
+            with self._lock:
+                if hand.game_over:
+                    self._hands.pop(hand.id, None)
+                    return
+                self._hands[hand.id] = (hand, time.monotonic())
+                self._hands.move_to_end(hand.id)
+                while len(self._hands) > self.capacity:
+                    evicted.append(self._hands.popitem(last=False)[1][0])
+            for old in evicted:
+                self._abandon(old)
+        after_commit(apply)
+
+    def _abandon(self, hand):
+        if self.persist == 'write-on-finish':
+            logger.info('Dropping idle unfinished hand %s of user %s', hand.id, hand.user_id)
+
+
+class GameSessionStore:
+    """Gives each app its configured backend as app.extensions['game_sessions'].
+
+    The methods act on the current app's backend.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('GAME_SESSION_STORE', 'db')
+        app.config.setdefault('GAME_SESSION_PERSIST', 'write-through')
+        app.config.setdefault('GAME_SESSION_CACHE_SIZE', 10000)
+        app.config.setdefault('GAME_SESSION_TTL', 1800)
+        if app.config['GAME_SESSION_STORE'] == 'memory':
+            backend = MemorySessionStore(
+                app.config['GAME_SESSION_PERSIST'],
+                app.config['GAME_SESSION_CACHE_SIZE'],
+                app.config['GAME_SESSION_TTL'],
+            )
+        else:
+            backend = DBSessionStore()
+        app.extensions['game_sessions'] = backend
+
+    @property
+    def backend(self):
+        return current_app.extensions['game_sessions']
+
+    def create(self, **fields):
+        return self.backend.create(**fields)
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def save(self, game_session):
+        self.backend.save(game_session)
+
+
+game_sessions = GameSessionStore()
@@ -0,0 +1,123 @@
+"""Multi-deck shoes shared by consecutive blackjack hands.
+
+Each user plays from a shoe of SHOE_DECKS decks shuffled together. A shoe is
+dealt front to back until its cursor passes the cut card; the next hand then
+starts a new shoe (a new Shoe row, so old hands can still be looked up).
+
+Shoes are stored as an RNG seed, not as cards: shoe_cards(seed, decks)
+regenerates the same order every time, and fast_forward(seed, decks, cursor)
+gives the cards from any position, so any past or current hand can be dealt
+again (see audit.py). Generated shoes are kept in a per-process LRU.
+
+A GameSession stores the seed, the deck count and its own cursor, so dealing
+a card is an index bump on the session. The shoe row is written when a hand
+starts and once more when it ends, to move the shoe's cursor past the hand's
+cards. A hand abandoned before it ends may have drawn cards the shoe never
+saw, so its shoe is retired and the next hand gets a fresh one.
+
+Config:
+    SHOE_DECKS        decks per shoe, 1..8 (default 6)
+    SHOE_PENETRATION  fraction of the shoe dealt before the cut card (default
+                      0.75); 0 reshuffles before every hand
+
+Values out of range stop the app from starting (config.LIMITS).
+"""
+import random
+import secrets
+from functools import lru_cache
+from itertools import islice
+
+from flask import current_app
+from sqlalchemy import update
+
+import game_logic
+from database import db, Shoe
+
+# Cards always left behind the cut card, enough to finish any hand in play
+RESERVE = 20
+SHOE_CACHE_SIZE = 1024
+
+
+class Pile:
+    """The undealt cards of a shoe from cursor on, dealt with pop() like a list deck."""
+    __slots__ = ('cards', 'cursor')
+
+    def __init__(self, cards, cursor):
+        self.cards = cards
+        self.cursor = cursor
+
+    def pop(self):
+        if self.cursor >= len(self.cards):
+            raise IndexError('pop from an empty shoe')
+        card = self.cards[self.cursor]
+        self.cursor += 1
+        return card
+
+    def __len__(self):
+        return len(self.cards) - self.cursor
+
+    def __iter__(self):
+        return islice(self.cards, self.cursor, None)
+
+
+@lru_cache(maxsize=SHOE_CACHE_SIZE)
+def shoe_cards(seed, decks):
+    """The card order of the shoe with this seed and deck count, as a tuple."""
+    cards = game_logic.create_deck() * decks
+    game_logic.shuffle_deck(cards, random.Random(seed))
+    return tuple(cards)
+
+
+def fast_forward(seed, decks, cursor):
+    """The shoe's remaining cards from cursor on, without dealing the ones before it."""
+    return Pile(shoe_cards(seed, decks), cursor)
+
+
+class ShoeStore:
+    """Shoe lifecycle, registered as app.extensions['shoes']."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SHOE_DECKS', 6)
+        app.config.setdefault('SHOE_PENETRATION', 0.75)
+        app.extensions['shoes'] = self
+
+    def shuffle(self, user_id):
+        """Stage a freshly shuffled shoe for user_id."""
+        decks = current_app.config['SHOE_DECKS']
+        size = decks * 52
+        cut_card = min(int(size * current_app.config['SHOE_PENETRATION']), size - RESERVE)
+        shoe = Shoe(user_id=user_id, decks=decks, seed=secrets.randbits(63), cut_card=max(cut_card, 0), cursor=0)
+        db.session.add(shoe)
+        db.session.flush()
+        return shoe
+
+    def start_hand(self, user_id):
+        """The user's shoe, ready to deal a new hand at its cursor."""
+        shoe = Shoe.query.filter_by(user_id=user_id).order_by(Shoe.id.desc()).first()
+        if (shoe is None or shoe.in_play or shoe.cursor >= shoe.cut_card
+                or shoe.decks != current_app.config['SHOE_DECKS']):
+            shoe = self.shuffle(user_id)
+        shoe.in_play = True
+        return shoe
+
+    def pile(self, shoe):
+        """The shoe's undealt cards."""
+        return fast_forward(shoe.seed, shoe.decks, shoe.cursor)
+
+    def deck(self, game_session):
+        """The remaining cards for a hand, from the hand's cursor on (no query)."""
+        return fast_forward(game_session.seed, game_session.decks, game_session.cursor)
+
+    def finish_hand(self, game_session):
+        """Move the shoe's cursor past the finished hand's cards."""
+        db.session.execute(
+            update(Shoe).where(Shoe.id == game_session.shoe_id)
+            .values(cursor=game_session.cursor, in_play=False)
+        )
+
+
+shoes = ShoeStore()
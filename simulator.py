@@ -0,0 +1,294 @@
+"""Monte Carlo blackjack simulator.
+
+Plays the rules implemented in game_logic and blackjack_api (dealer AI,
+result resolution, 2.5x blackjack payout, double down) on NumPy batches of
+shuffled decks instead of one hand at a time.
+
+Usage:
+    python simulator.py --hands 1000000 --stand-on 17 --double-on 10 11
+    python simulator.py --benchmark
+"""
+import argparse
+import contextlib
+import os
+import time
+
+import numpy as np
+
+import game_logic
+
+# Point value of every card in create_deck() order (aces counted as 11)
+DECK_POINTS = np.array(
+    [game_logic.RANK_POINTS[game_logic.card_rank(card)] for card in game_logic.create_deck()],
+    dtype=np.int8
+)
+BLACKJACK_PAYOUT = 2.5
+
+
+def shuffled_decks(rng, n):
+    """Return an (n, 52) array of shuffled decks as card points, drawn left to right."""
+    return rng.permuted(np.broadcast_to(DECK_POINTS, (n, DECK_POINTS.size)), axis=1)
+
+
+def best_score(hard, aces):
+    """Vectorized calculate_score from the hard total (aces as 1) and ace count."""
+    return np.where((aces > 0) & (hard + 10 <= 21), hard + 10, hard)
+
+
+def bust_risk(total, aces):
+    """Vectorized calculate_bust_risk."""
+    risky = np.zeros(total.shape, dtype=np.int8)
+    for card_value in range(2, 12):
+        over = total + card_value > 21
+        if card_value == 11:
+            over &= ~((aces > 0) & (total + 11 <= 21))
+        risky += over
+    return np.where(total + 2 > 21, 1.0, risky / 10.0)
+
+
+def dealer_should_hit(hard, aces, player_score):
+    """Vectorized game_logic.dealer_should_hit."""
+    total = best_score(hard, aces)
+    is_soft = (aces > 0) & (hard + 10 <= 21)
+    soft_17 = is_soft & (total == 17)
+    low_risk = (total < player_score) & (bust_risk(total, aces) < 0.5)
+    return (total < 17) & (soft_17 | low_risk | (total < 17))
+
+
+def determine_result(player_score, dealer_score):
+    """Vectorized determine_result: +1 win, 0 draw, -1 lose."""
+    win = (player_score <= 21) & ((dealer_score > 21) | (player_score > dealer_score))
+    draw = (player_score <= 21) & (dealer_score <= 21) & (player_score == dealer_score)
+    return np.where(win, 1, np.where(draw, 0, -1)).astype(np.int8)
+
+
+class _Table:
+    """Mutable per-hand state for one batch of decks."""
+
+    def __init__(self, decks):
+        n = decks.shape[0]
+        self.decks = decks
+        self.cursor = np.zeros(n, dtype=np.intp)
+        self.hard = {'player': np.zeros(n, dtype=np.int16), 'dealer': np.zeros(n, dtype=np.int16)}
+        self.aces = {'player': np.zeros(n, dtype=np.int16), 'dealer': np.zeros(n, dtype=np.int16)}
+
+    def draw(self, who, idx):
+        """Deal the next card of each deck in idx to who."""
+        card = self.decks[idx, self.cursor[idx]]
+        self.cursor[idx] += 1
+        is_ace = card == 11
+        self.hard[who][idx] += np.where(is_ace, 1, card)
+        self.aces[who][idx] += is_ace
+
+    def score(self, who, idx=slice(None)):
+        return best_score(self.hard[who][idx], self.aces[who][idx])
+
+    def dealer_turn(self, idx, player_score):
+        """Vectorized dealer_ai_turn for the hands in idx."""
+        while idx.size:
+            hit = dealer_should_hit(self.hard['dealer'][idx], self.aces['dealer'][idx], player_score)
+            idx, player_score = idx[hit], player_score[hit]
+            self.draw('dealer', idx)
+
+
+def simulate_batch(decks, stand_on=17, double_on=()):
+    """Play one hand per deck and return (net, outcome, blackjack) arrays.
+
+    net is the change in balance per unit bet, outcome is +1/0/-1 for
+    win/draw/lose and blackjack marks natural 21s. The player hits below
+    stand_on and doubles on the first decision when the score is in double_on.
+    """
+    n = decks.shape[0]
+    table = _Table(decks)
+    every = np.arange(n)
+    table.draw('player', every)
+    table.draw('player', every)
+    table.draw('dealer', every)
+    table.draw('dealer', every)
+
+    net = np.zeros(n, dtype=np.float64)
+    outcome = np.zeros(n, dtype=np.int8)
+    done = np.zeros(n, dtype=bool)
+    bet = np.ones(n, dtype=np.int8)
+
+    # Player blackjack: dealer still plays out, win pays 2.5x including the stake
+    blackjack = table.score('player') == 21
+    idx = np.flatnonzero(blackjack)
+    table.dealer_turn(idx, np.full(idx.size, 21))
+    outcome[idx] = determine_result(np.full(idx.size, 21), table.score('dealer', idx))
+    net[idx] = np.where(outcome[idx] == 1, BLACKJACK_PAYOUT - 1, np.where(outcome[idx] == 0, 0.0, -1.0))
+    done |= blackjack
+
+    # Double down: one card, then the dealer plays to completion
+    doubling = ~done & np.isin(table.score('player'), list(double_on))
+    idx = np.flatnonzero(doubling)
+    bet[idx] = 2
+    table.draw('player', idx)
+    busted = idx[table.score('player', idx) > 21]
+    outcome[busted] = -1
+    done[busted] = True
+    standing = doubling & ~done
+
+    # Hits: every player card is followed by at most one dealer card
+    while True:
+        idx = np.flatnonzero(~done & ~standing)
+        hitting = idx[table.score('player', idx) < stand_on]
+        standing[idx[table.score('player', idx) >= stand_on]] = True
+        if not hitting.size:
+            break
+        table.draw('player', hitting)
+        player_score = table.score('player', hitting)
+        busted = hitting[player_score > 21]
+        outcome[busted] = -1
+        done[busted] = True
+        alive = player_score <= 21
+        hitting, player_score = hitting[alive], player_score[alive]
+        dealer_hits = dealer_should_hit(table.hard['dealer'][hitting], table.aces['dealer'][hitting], player_score)
+        dealer_idx = hitting[dealer_hits]
+        table.draw('dealer', dealer_idx)
+        dealer_busted = dealer_idx[table.score('dealer', dealer_idx) > 21]
+        outcome[dealer_busted] = 1
+        done[dealer_busted] = True
+
+    # Stand: dealer plays to completion
+    idx = np.flatnonzero(standing & ~done)
+    player_score = table.score('player', idx)
+    table.dealer_turn(idx, player_score)
+    outcome[idx] = determine_result(player_score, table.score('dealer', idx))
+
+    played = ~blackjack
+    net[played] = outcome[played] * bet[played]
+    return net, outcome, blackjack
+
+
+def simulate(hands, stand_on=17, double_on=(), seed=None, batch_size=200_000):
+    """Simulate hands and return house edge and payout variance statistics."""
+    rng = np.random.default_rng(seed)
+    total = total_sq = 0.0
+    counts = {'win': 0, 'draw': 0, 'lose': 0, 'blackjack': 0}
+    remaining = hands
+    while remaining > 0:
+        n = min(batch_size, remaining)
+        net, outcome, blackjack = simulate_batch(shuffled_decks(rng, n), stand_on, double_on)
+        total += net.sum()
+        total_sq += np.square(net).sum()
+        counts['win'] += int((outcome == 1).sum())
+        counts['draw'] += int((outcome == 0).sum())
+        counts['lose'] += int((outcome == -1).sum())
+        counts['blackjack'] += int(blackjack.sum())
+        remaining -= n
+
+    mean = total / hands
+    variance = total_sq / hands - mean ** 2
+    return {
+        'hands': hands,
+        'expected_return': mean,
+        'house_edge': -mean,
+        'variance': variance,
+        'std_dev': variance ** 0.5,
+        'std_error': (variance / hands) ** 0.5,
+        'win_rate': counts['win'] / hands,
+        'draw_rate': counts['draw'] / hands,
+        'lose_rate': counts['lose'] / hands,
+        'blackjack_rate': counts['blackjack'] / hands,
+    }
+
+
+def play_hand_scalar(deck, stand_on=17, double_on=()):
+    """Play one hand through game_logic exactly as blackjack_api does.
+
+    deck is a list of card codes drawn with pop(). Returns the net change in
+    balance per unit bet.
+    """
+    player_hand = game_logic.deal_cards(deck, 2)
+    dealer_hand = game_logic.deal_cards(deck, 2)
+    player_score = game_logic.calculate_score(player_hand)
+
+    if game_logic.is_blackjack(player_hand):
+        dealer_score = game_logic.dealer_ai_turn(deck, dealer_hand, player_score)
+        result = game_logic.determine_result(player_score, dealer_score)
+        return {'win': BLACKJACK_PAYOUT - 1, 'draw': 0.0, 'lose': -1.0}[result]
+
+    bet = 1
+    if player_score in double_on:
+        bet = 2
+        player_hand.append(deck.pop())
+        player_score = game_logic.calculate_score(player_hand)
+        if player_score > 21:
+            return -bet
+    else:
+        while player_score < stand_on:
+            player_hand.append(deck.pop())
+            player_score = game_logic.calculate_score(player_hand)
+            if player_score > 21:
+                return -bet
+            if game_logic.dealer_should_hit(dealer_hand, player_score):
+                dealer_hand.append(deck.pop())
+                if game_logic.calculate_score(dealer_hand) > 21:
+                    return bet
+
+    dealer_score = game_logic.dealer_ai_turn(deck, dealer_hand, player_score)
+    result = game_logic.determine_result(player_score, dealer_score)
+    return {'win': bet, 'draw': 0, 'lose': -bet}[result]
+
+
+def decks_to_cards(decks):
+    """Convert an array of point decks to card code lists ordered for pop()."""
+    by_points = {}
+    for card in game_logic.create_deck():
+        by_points.setdefault(int(DECK_POINTS[card]), []).append(card)
+    card_decks = []
+    for row in decks:
+        pools = {points: list(cards) for points, cards in by_points.items()}
+        card_decks.append([pools[int(points)].pop() for points in row][::-1])
+    return card_decks
+
+
+def benchmark(hands=5000, vector_hands=1_000_000, seed=0):
+    """Compare hands/second of the scalar game_logic path and the batch simulator."""
+    rng = np.random.default_rng(seed)
+    decks = decks_to_cards(shuffled_decks(rng, hands))
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for deck in decks:
+            play_hand_scalar(deck)
+    scalar_rate = hands / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    simulate(vector_hands, seed=seed)
+    vector_rate = vector_hands / (time.perf_counter() - start)
+    return {
+        'scalar_hands_per_sec': scalar_rate,
+        'vector_hands_per_sec': vector_rate,
+        'speedup': vector_rate / scalar_rate,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Monte Carlo blackjack simulator')
+    parser.add_argument('--hands', type=int, default=1_000_000, help='number of hands to simulate')
+    parser.add_argument('--stand-on', type=int, default=17, help='player stands at or above this score')
+    parser.add_argument('--double-on', type=int, nargs='*', default=[], help='scores to double down on')
+    parser.add_argument('--seed', type=int, default=None, help='random seed')
+    parser.add_argument('--batch-size', type=int, default=200_000, help='hands per NumPy batch')
+    parser.add_argument('--benchmark', action='store_true', help='compare against the scalar game_logic path')
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        stats = benchmark(seed=args.seed or 0)
+        print(f"scalar game_logic: {stats['scalar_hands_per_sec']:>14,.0f} hands/s")
+        print(f"vectorized:        {stats['vector_hands_per_sec']:>14,.0f} hands/s")
+        print(f"speedup:           {stats['speedup']:>14,.1f}x")
+        return
+
+    stats = simulate(args.hands, args.stand_on, tuple(args.double_on), args.seed, args.batch_size)
+    print(f"hands:          {stats['hands']:,}")
+    print(f"house edge:     {stats['house_edge']:+.4%} (± {1.96 * stats['std_error']:.4%})")
+    print(f"variance:       {stats['variance']:.4f}")
+    print(f"std dev:        {stats['std_dev']:.4f}")
+    print(f"win/draw/lose:  {stats['win_rate']:.4f} / {stats['draw_rate']:.4f} / {stats['lose_rate']:.4f}")
+    print(f"blackjacks:     {stats['blackjack_rate']:.4f}")
+
+
+if __name__ == '__main__':
+    main()
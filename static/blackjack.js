@@ -4,6 +4,8 @@ const elements = {
     playerCards: document.getElementById('player-cards'),
     dealerScore: document.getElementById('dealer-score'),
     playerScore: document.getElementById('player-score'),
+    dealerOdds: document.getElementById('dealer-odds'),
+    playerOdds: document.getElementById('player-odds'),
     balance: document.getElementById('balance'),
     currentBet: document.getElementById('current-bet'),
     hitBtn: document.getElementById('hit-btn'),
@@ -125,6 +127,8 @@ function updateGameUI(data) {
     elements.playerScore.textContent = `点数: ${data.player_score || 0}`;
     elements.dealerScore.textContent = `点数: ${data.dealer_score !== undefined ? data.dealer_score : '?'}`;
 
+    // Exact odds from the cards left in the deck (only while the hand is in play)
+    updateOdds(isGameOver ? null : data.odds);
 
     // Update balance and current bet display
     elements.balance.textContent = data.balance !== undefined ? data.balance : elements.balance.textContent;
@@ -149,6 +153,13 @@ function updateGameUI(data) {
     // }
 }
 
+// 显示爆牌概率
+function updateOdds(odds) {
+    const percent = (p) => `${(p * 100).toFixed(1)}%`;
+    elements.playerOdds.textContent = odds ? `要牌爆牌概率: ${percent(odds.player_bust)}` : '';
+    elements.dealerOdds.textContent = odds ? `停牌后庄家爆牌概率: ${percent(odds.dealer_bust)}` : '';
+}
+
 // Helper function to calculate score on the frontend for displaying dealer's visible card score
 function calculateScore(hand) {
     let score = 0;
@@ -189,8 +200,10 @@ function createCardElement(card) {
         cardValue = 'jack';
     }
 
-    // Use SVG images for card suits
-    const suitImage = `static/cards/${cardValue}_of_${card.suit}.svg`;
+    // 所有牌面在一个 SVG 精灵中，用 #片段 选择；未注入时退回单张牌面文件
+    const suitImage = window.CARD_SPRITE
+        ? `${window.CARD_SPRITE}#${cardValue}_of_${card.suit}`
+        : `static/cards/${cardValue}_of_${card.suit}.svg`;
     cardEl.innerHTML = `<img class="card-suit animate-fade-up" src="${suitImage}" alt="${card.suit}_${card.value}" style="width: 80px; height: auto;" />`; // Adjust size
     cardEl.classList.add('transition-transform', 'duration-500', 'transform', 'translate-y-4'); // Tailwind CSS classes for animation
     return cardEl;
@@ -1,6 +1,25 @@
 const droppable_hint_style = "ring-2 ring-green-400 hover:ring-4 hover:ring-green-500";
 let droppable_hint_enabled = true;
 var gamemode = 'random'; // Default game mode
+// 服务端下发的可解牌局（/api/freecell/deal），随机模式下优先使用
+var server_deal = null;
+var current_deal = null;
+
+/**
+ * Fetch a pre-solved deal from the server, then run callback either way.
+ */
+function fetch_deal(callback) {
+    server_deal = null;
+    if (gamemode !== 'random') {
+        callback();
+        return;
+    }
+    $.getJSON('/api/freecell/deal')
+        .done(function (data) {
+            server_deal = data;
+        })
+        .always(callback);
+}
 
 /**
  * Encapsulate the game
@@ -56,7 +75,7 @@ Game.prototype.reset = function () {
  * Create an array of ids of the valid draggable cards.
  */
 Game.prototype.valid_drag_ids = function () {
-    var drag_ids, i, card, col, col_len;
+    var drag_ids, i, j, card, col, col_len;
 
     drag_ids = [];
 
@@ -67,35 +86,59 @@ Game.prototype.valid_drag_ids = function () {
             drag_ids.push(card.id.toString());
         }
     }
-    // add cards at the bottom of columns
+    // add the ordered run at the bottom of each column: 多张牌可一起拖动
     for (i = 0; i < 8; i++) {
         col = this.columns[i];
         col_len = col.length;
-        if (col_len > 0) {
-            card = col[col_len - 1];
-            drag_ids.push(card.id.toString());
+        for (j = col_len - 1; j >= 0; j--) {
+            drag_ids.push(col[j].id.toString());
+            if (j === 0 || !col[j].stacksOn(col[j - 1])) {
+                break;
+            }
         }
     }
 
     return drag_ids;
 };
 
+/**
+ * Number of cards from card_id to the bottom of its column if they form an
+ * ordered run (alternating colours, descending), otherwise 0.
+ */
+Game.prototype.run_length = function (card_id) {
+    var i, j, col;
+
+    for (i = 0; i < 8; i++) {
+        col = this.columns[i];
+        for (j = col.length - 1; j >= 0; j--) {
+            if (col[j].id === card_id) {
+                return col.length - j;
+            }
+            if (j === 0 || !col[j].stacksOn(col[j - 1])) {
+                break;
+            }
+        }
+    }
+    return 0;
+};
+
 /**
  * 核心算法，判断一张牌是否可以放置到指定位置，返回一个列表
  * free、suit、col
  * 修改了valid_drop_ids函数，添加了对空列的检查
  */
 Game.prototype.valid_drop_ids = function (card_id) {
-    var drop_ids, i, free, suit_card, drag_card, card, col;
+    var drop_ids, i, free, suit_card, drag_card, card, col, single;
 
     drop_ids = [];
 
-    // 当前卡牌
+    // 当前卡牌；拿起多张牌时只能放到列上
     drag_card = this.deck.get_card(card_id);
+    single = this.run_length(card_id) <= 1;
 
     // freecells
     // 空的free
-    for (i = 0; i < 4; i++) {
+    for (i = 0; i < 4 && single; i++) {
         free = this.free[i];
         if (free === null) {
             drop_ids.push('free' + i.toString());
@@ -104,7 +147,7 @@ Game.prototype.valid_drop_ids = function (card_id) {
 
     // suitcell
     // 空的suit（A）或符合值的suit
-    for (i = 0; i < 4; i++) {
+    for (i = 0; i < 4 && single; i++) {
         suit_card = this.suits[i];
         if (suit_card === null) {
             if (drag_card.value === 1) {
@@ -168,7 +211,8 @@ Game.prototype.move_card = function (drag_id, drop_id) {
     this.history.push({
         cardId: drag_id,
         from: from_id,
-        to: drop_id
+        to: drop_id,
+        code: this.move_code(drag_id, drop_id)
     });
     var drag_card, col_index;
 
@@ -196,6 +240,84 @@ Game.prototype.move_card = function (drag_id, drop_id) {
     }
 };
 
+/**
+ * 服务端回放用的单字节走法编码：源位置 << 4 | 目标位置
+ * 位置：0-7 列，8-11 空当，12 + 花色序号 为收牌区
+ */
+Game.prototype.location_of = function (card_id) {
+    var i, col;
+
+    for (i = 0; i < 8; i++) {
+        col = this.columns[i];
+        if (col.length > 0 && col[col.length - 1].id === card_id) {
+            return i;
+        }
+    }
+    for (i = 0; i < 4; i++) {
+        if (this.free[i] !== null && this.free[i].id === card_id) {
+            return 8 + i;
+        }
+    }
+    return null;
+};
+
+Game.prototype.move_code = function (drag_id, drop_id) {
+    var src, dst, card;
+
+    src = this.location_of(drag_id);
+    if (drop_id.length <= 2) {
+        // dropping on another card: the column that card ends
+        dst = this.location_of(parseInt(drop_id, 10));
+    } else if (drop_id.slice(0, 1) === 'f') {
+        dst = 8 + parseInt(drop_id.charAt(drop_id.length - 1), 10);
+    } else if (drop_id.slice(0, 1) === 's') {
+        card = this.deck.get_card(drag_id);
+        dst = 12 + ['clubs', 'spades', 'hearts', 'diamonds'].indexOf(card.suit);
+    } else {
+        dst = parseInt(drop_id.charAt(drop_id.length - 1), 10);
+    }
+    return src << 4 | dst;
+};
+
+/**
+ * The layout as card ids, the request body of the /api/freecell endpoints
+ */
+Game.prototype.layout = function () {
+    var id = function (card) { return card === null ? null : card.id; };
+    return {
+        columns: this.columns.map(function (col) { return col.map(id); }),
+        free: this.free.map(id),
+        suits: this.suits.map(id)
+    };
+};
+
+/**
+ * 服务端的 suitN 按花色编号，这里换成已放该花色（或第一个空）的收牌格
+ */
+Game.prototype.suit_slot = function (card_id) {
+    var i, card, empty;
+
+    card = this.deck.get_card(card_id);
+    empty = null;
+    for (i = 0; i < 4; i++) {
+        if (this.suits[i] !== null && this.suits[i].suit === card.suit) {
+            return 'suit' + i;
+        }
+        if (this.suits[i] === null && empty === null) {
+            empty = i;
+        }
+    }
+    return 'suit' + empty;
+};
+
+/**
+ * The move log as URL-safe base64, one byte per move
+ */
+Game.prototype.encoded_moves = function () {
+    var codes = this.history.map(function (move) { return move.code; });
+    return btoa(String.fromCharCode.apply(null, codes)).replace(/\+/g, '-').replace(/\//g, '_');
+};
+
 /**
  * Return the card object and remove it from its current location
  * card_id is an integer.
@@ -381,7 +503,13 @@ Game.prototype.Deck.prototype.shuffle = function () {
             return 0;
         });
         this.cards.reverse();
+    } else if (gamemode === 'random' && server_deal !== null) {
+        // 按服务端牌局的发牌顺序排列
+        this.cards = server_deal.cards.map(this.get_card, this);
+        current_deal = server_deal.deal;
+        server_deal = null;
     } else if (gamemode === 'random') {
+        current_deal = null;
         len = this.cards.length;
         for (i = 0; i < len; i++) {
             j = Math.floor(len * Math.random());
@@ -442,10 +570,17 @@ Game.prototype.Deck.prototype.Card.prototype.sameValue = function (other) {
     return this.value === other.value;
 };
 
+/**
+ * can this card sit on another card in a column (one lower, other colour)?
+ */
+Game.prototype.Deck.prototype.Card.prototype.stacksOn = function (other) {
+    return other.value === this.value + 1 && other.colour !== this.colour;
+};
+
 /**
  * The image name and location as a string. Used when creating the web page.
  * 重写实现读取SVG
- * 使用GET: /static/cards/<filename> API
+ * 使用 /assets/ 下的牌面 SVG 精灵（window.CARD_SPRITE），否则 GET: /static/cards/<filename>
  */
 Game.prototype.Deck.prototype.Card.prototype.image = function () {
     let cardValue = this.value;
@@ -461,7 +596,9 @@ Game.prototype.Deck.prototype.Card.prototype.image = function () {
     }
 
     // Use SVG images for card suits
-    const suitImage = `static/cards/${cardValue}_of_${this.suit}.svg`;
+    const suitImage = window.CARD_SPRITE
+        ? `${window.CARD_SPRITE}#${cardValue}_of_${this.suit}`
+        : `static/cards/${cardValue}_of_${this.suit}.svg`;
     return suitImage;
 };
 
@@ -476,6 +613,8 @@ var UI = function (game) {
     this.drag = [];
     // an array of all the droppables
     this.drop = [];
+    // a move is waiting for /api/freecell/move
+    this.pending = false;
 };
 
 /**
@@ -631,6 +770,7 @@ UI.prototype.create_draggables = function () {
             containment: '#table',
             revert: 'invalid',
             revertDuration: 200,
+            helper: this_ui.drag_helper,
             start: this_ui.create_droppables(),
             stop: this_ui.clear_drag()
         });
@@ -652,6 +792,85 @@ UI.prototype.create_draggables = function () {
     }
 };
 
+/**
+ * Drag helper: a card alone is dragged itself; a card with others above it
+ * in an ordered run drags a copy of the whole run while the originals hide.
+ */
+UI.prototype.drag_helper = function () {
+    var $card, $run, $stack;
+
+    $card = $(this);
+    $run = $card.nextAll('.card');
+    if ($run.length === 0) {
+        return this;
+    }
+    $run = $card.add($run);
+    $stack = $('<div></div>').css('width', $card.outerWidth());
+    $run.each(function (i) {
+        var $copy = $(this).clone().removeAttr('id');
+        if (i === 0) {
+            $copy.removeClass('-mt-[88%]');
+        }
+        $stack.append($copy);
+    });
+    $run.css('visibility', 'hidden');
+    return $stack;
+};
+
+/**
+ * 经 /api/freecell/move 走一步并自动收牌。拿起多张牌时服务端把它展开成单张走法；
+ * 返回的每一步都经 move_card 记入 history，所以撤销逐张进行，提交的走法记录也完整。
+ * drop_id 是 colN、freeN 或 suitN。
+ */
+UI.prototype.server_move = function (card_id, drop_id) {
+    var this_ui, game;
+
+    this_ui = this;
+    game = this.game;
+    if (this.pending) {
+        return;
+    }
+    this.pending = true;
+    $.ajax({
+        url: '/api/freecell/move',
+        type: 'POST',
+        contentType: 'application/json',
+        data: JSON.stringify($.extend(game.layout(), { card: card_id, to: drop_id })),
+        dataType: 'json'
+    }).done(function (data) {
+        data.moves.concat(data.autoplay).forEach(function (move) {
+            game.move_card(move.card, move.to.startsWith('suit') ? game.suit_slot(move.card) : move.to);
+        });
+    }).fail(function (xhr) {
+        var message = '无效移动';
+        if (xhr.status === 0 && game.run_length(card_id) <= 1) {
+            // 连不上服务端时单张牌仍按本地规则移动
+            game.move_card(card_id, drop_id);
+            return;
+        }
+        try {
+            message = $.parseJSON(xhr.responseText).error || message;
+        } catch (e) {
+            // not a JSON error body
+        }
+        showToast(message, type = 'error');
+    }).always(function () {
+        this_ui.pending = false;
+        this_ui.redraw();
+        this_ui.is_won();
+    });
+};
+
+/**
+ * Redraw the board from the game state and recreate the draggables
+ */
+UI.prototype.redraw = function () {
+    this.remove_cards();
+    this.draw_board_state();
+    this.clear_drag()();
+    this.update_history_display();
+};
+
 /**
  * When a draggable card is at the bottom of a column and it is double-clicked,
  * check if it can be moved to a foundation column or empty freecell. If it can,
@@ -726,14 +945,8 @@ UI.prototype.dblclick_move = function (card_id, drop_id, this_ui) {
 
     });
 
-    // 6. 更新游戏逻辑状态
-    this_ui.game.move_card(card_id, drop_id);
-
-    // 7. 清理并重新创建拖拽逻辑
-    this_ui.clear_drag()(); // clear_drag返回一个函数，需要立即执行它
-
-    // 8. 检查是否获胜
-    this_ui.is_won();
+    // 6. 由服务端走这一步并自动收牌，返回后重绘并检查是否获胜
+    this_ui.server_move(card_id, drop_id);
 };
 
 UI.prototype.card_max_zindex = function () {
@@ -782,6 +995,12 @@ UI.prototype.create_droppables = function () {
                     var drag_id = parseInt(ui.draggable.attr('id'), 10);
                     var $card = ui.draggable;
 
+                    if (this_ui.game.run_length(drag_id) > 1) {
+                        // 多张牌：等服务端展开走法后重绘
+                        this_ui.server_move(drag_id, this_id);
+                        return;
+                    }
+
                     let $targetContainer = $(this);
                     if (this_id.startsWith('free') || this_id.startsWith('suit')) {
                         let $slot = $(this).children('.slot');
@@ -803,9 +1022,7 @@ UI.prototype.create_droppables = function () {
                         $card.removeClass('-mt-[88%]');
                     }
 
-                    this_ui.game.move_card(drag_id, this_id);
-                    this_ui.update_history_display();
-                    this_ui.is_won();
+                    this_ui.server_move(drag_id, this_id);
                 }
             });
             drop_div.droppable('enable');
@@ -843,6 +1060,8 @@ UI.prototype.clear_drag = function () {
         }
         // empty the draggable array
         this_ui.drag.length = 0;
+        // show a run again after an invalid drop (see drag_helper)
+        $('.card').css('visibility', '');
 
         // empty the droppable array - this makes sure that drop array is
         // cleared after an invalid drop
@@ -881,9 +1100,27 @@ UI.prototype.clear_drop = function () {
 UI.prototype.is_won = function () {
     if (this.game.is_game_won()) {
         showToast('恭喜你，成功了!', type = 'success');
+        this.submit_game();
     }
 };
 
+// 提交牌局编号和走法记录，由服务端回放验证并计分
+UI.prototype.submit_game = function () {
+    if (current_deal === null) {
+        return;
+    }
+    $.ajax({
+        url: '/api/freecell/submit',
+        type: 'POST',
+        contentType: 'application/json',
+        data: JSON.stringify({ deal: current_deal, moves: this.game.encoded_moves() }),
+        dataType: 'json'
+    }).done(function (data) {
+        showToast('验证通过，得分: ' + data.score, type = 'success');
+    });
+    current_deal = null;
+};
+
 /**
  * Animate the cards at the end of a won game
  */
@@ -963,11 +1200,13 @@ UI.prototype.help = function () {
 UI.prototype.new_game = function () {
     var this_ui = this;
     $('#newgame').click(function () {
-        this_ui.game.reset();
-        this_ui.remove_cards();
-        this_ui.add_cards();
-        this_ui.create_draggables();
-        this_ui.update_history_display(); // 更新历史记录显示
+        fetch_deal(function () {
+            this_ui.game.reset();
+            this_ui.remove_cards();
+            this_ui.add_cards();
+            this_ui.create_draggables();
+            this_ui.update_history_display(); // 更新历史记录显示
+        });
     });
 };
 
@@ -1122,5 +1361,7 @@ $(document).ready(function () {
 
     g = new Game();
     my_ui = new UI(g);
-    my_ui.init();
+    fetch_deal(function () {
+        my_ui.init();
+    });
 });
\ No newline at end of file
@@ -0,0 +1,90 @@
+import os
+
+import pytest
+
+# Tests run against an in-memory database instead of instance/blackjack.db,
+# with history writes in the request transaction unless a test enables the queue
+# and a freshly shuffled single deck for every hand unless a test configures a shoe;
+# passwords are hashed in the request thread unless a test starts the pool
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('WRITE_BEHIND', '0')
+os.environ.setdefault('SHOE_DECKS', '1')
+os.environ.setdefault('SHOE_PENETRATION', '0')
+os.environ.setdefault('PASSWORD_POOL_WORKERS', '0')
+
+
+@pytest.fixture
+def db_app():
+    """The Flask app inside an app context with freshly created tables."""
+    from app import app
+    from database import db
+    from leaderboard import leaderboard
+
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        leaderboard.reset()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    leaderboard.reset()
+
+
+@pytest.fixture
+def create_user(db_app):
+    """Factory that inserts a user and returns it."""
+    from database import db, User
+
+    def create(username, password='password', balance=1000):
+        user = User(username=username, balance=balance)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return create
+
+
+@pytest.fixture
+def user_client(db_app, create_user):
+    """A test client logged in as 'player'."""
+    user = create_user('player')
+    client = db_app.test_client()
+    with client.session_transaction() as sess:
+        sess['username'] = user.username
+    client.user = user
+    return client
+
+
+@pytest.fixture
+def commit_counter(db_app):
+    """List that records one entry per database commit while the test runs."""
+    from sqlalchemy import event
+    from database import db
+
+    commits = []
+
+    def count(session):
+        commits.append(session)
+    event.listen(db.session, 'after_commit', count)
+    yield commits
+    event.remove(db.session, 'after_commit', count)
+
+
+@pytest.fixture
+def stack_deck(monkeypatch):
+    """Make every shuffled shoe deal the given card dicts first, in order.
+
+    The first two cards go to the player and the next two to the dealer.
+    """
+    import game_logic
+
+    def stack(*cards):
+        codes = [game_logic.card_from_dict({'suit': suit, 'value': value}) for value, suit in cards]
+
+        def shuffle(deck, rng=None):
+            rest = list(deck)
+            for code in codes:
+                rest.remove(code)
+            deck[:] = codes + rest
+        monkeypatch.setattr(game_logic, 'shuffle_deck', shuffle)
+    return stack
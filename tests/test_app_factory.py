@@ -0,0 +1,85 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code, tmp_path):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + str(tmp_path / 'factory.db'), SHOE_DECKS='6')
+    result = subprocess.run([sys.executable, '-c', textwrap.dedent(code)], cwd=ROOT, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_games_are_blueprints(db_app):
+    assert {'main', 'blackjack', 'freecell'} <= set(db_app.blueprints)
+    endpoints = {rule.endpoint for rule in db_app.url_map.iter_rules()}
+    assert {'main.login', 'blackjack.start_game', 'blackjack.blackjack_game',
+            'freecell.freecell_move', 'freecell.freecell_game'} <= endpoints
+    assert db_app.config['FREECELL_HINT_NODES'] == 20000
+
+
+def test_game_pages_redirect_to_login(db_app):
+    client = db_app.test_client()
+    for path in ('/blackjack', '/freecell'):
+        response = client.get(path)
+        assert response.status_code == 302
+        assert response.headers['Location'].endswith('/login')
+
+
+def test_create_app_builds_independent_apps(tmp_path):
+    output = run_python('''
+        from app import app, create_app
+        other = create_app({'SHOE_DECKS': 2, 'FREECELL_HINT_NODES': 5})
+        assert other is not app
+        assert (app.config['SHOE_DECKS'], other.config['SHOE_DECKS']) == (6, 2)
+        assert other.config['FREECELL_HINT_NODES'] == 5
+        assert other.test_client().get('/about').status_code == 200
+        print('ok')
+    ''', tmp_path)
+    assert output.strip() == 'ok'
+
+
+def test_second_app_leaves_the_first_configured(tmp_path):
+    output = run_python('''
+        from app import app, create_app
+        from metrics import metrics
+        from passwords import hasher
+        from session_store import game_sessions, DBSessionStore, MemorySessionStore
+        from write_behind import write_behind
+
+        other = create_app({'GAME_SESSION_STORE': 'memory', 'METRICS_ENABLED': False})
+        with app.app_context():
+            assert isinstance(game_sessions.backend, DBSessionStore)
+            assert write_behind.queue.app is app and hasher.pool.app is app
+            assert metrics.enabled
+        with other.app_context():
+            assert isinstance(game_sessions.backend, MemorySessionStore)
+            assert write_behind.queue.app is other and hasher.pool.app is other
+            assert not metrics.enabled
+        print('ok')
+    ''', tmp_path)
+    assert output.strip() == 'ok'
+
+
+def test_forked_worker_opens_its_own_connections(tmp_path):
+    output = run_python('''
+        import os
+        from app import app, migrate
+        from database import db
+
+        with app.app_context():
+            migrate()
+            parent = db.session.connection().connection.dbapi_connection
+        pid = os.fork()
+        if pid == 0:
+            with app.app_context():
+                child = db.session.connection().connection.dbapi_connection
+                ok = child is not parent and app.test_client().get('/api/rankings').status_code == 200
+            os._exit(0 if ok else 1)
+        print(os.waitpid(pid, 0)[1])
+    ''', tmp_path)
+    assert output.strip() == '0'
@@ -0,0 +1,113 @@
+import gzip
+import json
+import xml.etree.ElementTree as ET
+
+import pytest
+from flask import Flask, render_template_string
+
+import assets as assets_module
+from assets import AssetStore, build, build_sprite, SVG_NS
+
+CARDS = {f'{value}_of_{suit}' for value in ['ace', *map(str, range(2, 11)), 'jack', 'queen', 'king']
+         for suit in ('clubs', 'diamonds', 'hearts', 'spades')}
+
+
+@pytest.fixture
+def asset_app(tmp_path):
+    app = Flask(__name__)
+    app.config['ASSET_BUILD_DIR'] = str(tmp_path)
+    store = AssetStore(app)
+    build(str(tmp_path))
+    return app, store
+
+
+def test_sprite_holds_every_card_once():
+    data = build_sprite()
+    root = ET.fromstring(data)
+    cards = {group.get('id') for group in root.findall(f'{{{SVG_NS}}}g')}
+    assert cards == CARDS
+    ids = [element.get('id') for element in root.iter() if element.get('id')]
+    assert len(ids) == len(set(ids))
+    assert root.get('viewBox') == '0 0 167.0869141 242.6669922'
+    assert b'inkscape' not in data and b'sodipodi' not in data
+    assert build_sprite() == data
+
+
+def test_build_writes_hashed_compressed_files(tmp_path):
+    manifest = build(str(tmp_path))
+    name = manifest['cards.svg']
+    assert name.startswith('cards.') and name.endswith('.svg')
+    data = (tmp_path / name).read_bytes()
+    assert assets_module.content_hash(data) in name
+    assert gzip.decompress((tmp_path / (name + '.gz')).read_bytes()) == data
+    assert json.loads((tmp_path / 'manifest.json').read_text()) == manifest
+
+
+def test_serves_gzip_with_immutable_caching(asset_app):
+    app, store = asset_app
+    client = app.test_client()
+    with app.test_request_context():
+        url = render_template_string("{{ asset_url('cards.svg') }}")
+    assert url.startswith('/assets/cards.')
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert response.mimetype == 'image/svg+xml'
+    assert gzip.decompress(response.data) == build_sprite()
+
+    cached = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+
+def test_identity_without_accept_encoding(asset_app):
+    app, store = asset_app
+    client = app.test_client()
+    with app.test_request_context():
+        url = store.url('cards.svg')
+    response = client.get(url)
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == build_sprite()
+    # The gzip body has its own ETag
+    gzipped = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['ETag'] != response.headers['ETag']
+    assert client.get(url, headers={'If-None-Match': gzipped.headers['ETag']}).status_code == 200
+
+
+def test_unknown_asset_is_404(asset_app):
+    app, store = asset_app
+    assert app.test_client().get('/assets/cards.000000000000.svg').status_code == 404
+
+
+def test_build_is_read_once(asset_app, monkeypatch):
+    app, store = asset_app
+    client = app.test_client()
+    with app.test_request_context():
+        url = store.url('cards.svg')
+
+    def no_io(*args, **kwargs):
+        raise AssertionError('asset read from disk after the first load')
+    monkeypatch.setattr('builtins.open', no_io)
+    for _ in range(3):
+        assert client.get(url, headers={'Accept-Encoding': 'gzip'}).status_code == 200
+
+
+def test_missing_build_falls_back_to_memory(tmp_path, caplog):
+    app = Flask(__name__)
+    app.config['ASSET_BUILD_DIR'] = str(tmp_path / 'missing')
+    store = AssetStore(app)
+    with app.test_request_context():
+        url = store.url('cards.svg')
+    assert 'No asset build' in caplog.text
+    response = app.test_client().get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == build_sprite()
+
+
+def test_game_pages_use_the_sprite(user_client):
+    page = user_client.get('/blackjack').get_data(as_text=True)
+    assert 'window.CARD_SPRITE = "/assets/cards.' in page
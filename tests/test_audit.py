@@ -0,0 +1,84 @@
+import pytest
+
+import audit
+from database import db, GameRecord
+from shoe import fast_forward, shoe_cards
+
+
+@pytest.fixture
+def shoe_config(db_app, monkeypatch):
+    monkeypatch.setitem(db_app.config, 'SHOE_DECKS', 2)
+    monkeypatch.setitem(db_app.config, 'SHOE_PENETRATION', 0.75)
+
+
+def play(client, actions):
+    """Start a hand and play actions until it ends or they run out."""
+    data = client.post('/api/game/start', json={'bet_amount': 10}).get_json()
+    for action in actions:
+        if data['game_over']:
+            break
+        data = client.post(f'/api/game/{action}').get_json()
+    if not data['game_over']:
+        client.post('/api/game/stand')
+
+
+def test_shoe_cards_are_deterministic():
+    cards = shoe_cards(12345, 2)
+    shoe_cards.cache_clear()
+    assert shoe_cards(12345, 2) == cards
+    assert shoe_cards(54321, 2) != cards
+    assert sorted(cards) == sorted(list(range(52)) * 2)
+
+
+def test_fast_forward_starts_at_the_cursor():
+    pile = fast_forward(7, 1, 10)
+    assert len(pile) == 42
+    assert pile.pop() == shoe_cards(7, 1)[10]
+
+
+@pytest.mark.parametrize('actions', [
+    ['stand'],
+    ['hit', 'stand'],
+    ['hit', 'hit', 'hit'],
+    ['double_down'],
+    ['hit', 'double_down'],
+])
+def test_replay_matches_every_record(user_client, shoe_config, actions):
+    for _ in range(6):
+        play(user_client, actions)
+    records = GameRecord.query.order_by(GameRecord.id).all()
+    assert len(records) == 6
+    for record in records:
+        assert record.seed is not None
+        hand = audit.audit_record(record)
+        assert hand['matches'], (record.actions, hand)
+
+
+def test_replay_of_a_stacked_hand(user_client, shoe_config, stack_deck):
+    stack_deck(('10', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'), ('10', 'clubs'))
+    play(user_client, ['hit'])
+    record = GameRecord.query.one()
+    assert record.actions == 'h'
+    assert record.cursor == 0
+    hand = audit.replay_hand(record.seed, record.decks, record.cursor, record.actions)
+    assert hand['player_score'] == 26
+    assert hand['result'] == 'lose'
+    assert audit.audit_record(record)['matches']
+
+
+@pytest.mark.parametrize('actions', ['', 'x'])
+def test_replay_rejects_actions_that_do_not_finish(stack_deck, actions):
+    stack_deck(('10', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'))
+    shoe_cards.cache_clear()
+    with pytest.raises(ValueError):
+        audit.replay_hand(1, 1, 0, actions)
+    shoe_cards.cache_clear()
+
+
+def test_audit_record_without_a_deal(db_app, create_user):
+    user = create_user('alice')
+    record = GameRecord(user_id=user.id, result='win', player_score=20, dealer_score=18, bet_amount=10)
+    db.session.add(record)
+    db.session.commit()
+    with pytest.raises(ValueError):
+        audit.audit_record(record)
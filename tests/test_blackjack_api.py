@@ -0,0 +1,125 @@
+from blackjack_api import BATCH_MAX_HANDS
+from database import db, User, GameRecord, UserStats
+from leaderboard import leaderboard
+
+
+def balance(client):
+    db.session.expire_all()
+    return db.session.get(User, client.user.id).balance
+
+
+def test_start_commits_once(user_client, commit_counter, stack_deck):
+    stack_deck(('10', 'hearts'), ('7', 'clubs'), ('9', 'spades'), ('8', 'diamonds'))
+    data = user_client.post('/api/game/start', json={'bet_amount': 100}).get_json()
+    assert data['game_over'] is False
+    assert data['player_score'] == 17
+    assert len(commit_counter) == 1
+    assert balance(user_client) == 900
+
+
+def test_blackjack_start_commits_once(user_client, commit_counter, stack_deck):
+    stack_deck(('A', 'hearts'), ('K', 'clubs'), ('10', 'spades'), ('7', 'diamonds'))
+    data = user_client.post('/api/game/start', json={'bet_amount': 100}).get_json()
+    assert data['game_over'] is True
+    assert data['result'] == 'win'
+    assert len(commit_counter) == 1
+    assert balance(user_client) == 1150
+    assert GameRecord.query.count() == 1
+    assert leaderboard.rank_of(user_client.user.id) == (1, 250)
+
+
+def test_hit_and_stand_commit_once_each(user_client, commit_counter, stack_deck):
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'), ('8', 'hearts'), ('2', 'clubs'))
+    user_client.post('/api/game/start', json={'bet_amount': 100})
+    del commit_counter[:]
+
+    data = user_client.post('/api/game/hit').get_json()
+    assert data['player_score'] == 19
+    assert data['game_over'] is False
+    assert len(commit_counter) == 1
+
+    data = user_client.post('/api/game/stand').get_json()
+    assert data['result'] == 'win'
+    assert len(commit_counter) == 2
+    assert balance(user_client) == 1100
+    assert db.session.get(UserStats, user_client.user.id).wins == 1
+
+
+def test_double_down_commits_once(user_client, commit_counter, stack_deck):
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'), ('10', 'hearts'))
+    user_client.post('/api/game/start', json={'bet_amount': 100})
+    del commit_counter[:]
+
+    data = user_client.post('/api/game/double_down').get_json()
+    assert data['player_score'] == 21
+    assert data['result'] == 'win'
+    assert len(commit_counter) == 1
+    assert balance(user_client) == 1200
+
+
+def test_error_response_rolls_back(user_client, commit_counter, stack_deck):
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'))
+    user_client.post('/api/game/start', json={'bet_amount': 600})
+    del commit_counter[:]
+
+    response = user_client.post('/api/game/double_down')
+    assert response.status_code == 400
+    assert commit_counter == []
+    assert balance(user_client) == 400
+
+
+def test_batch_script_plays_in_one_commit(user_client, commit_counter, stack_deck):
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'), ('8', 'hearts'), ('2', 'clubs'))
+    response = user_client.post('/api/game/batch', json={
+        'actions': [{'action': 'start', 'bet_amount': 100}, 'hit', 'stand']})
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [step['action'] for step in data['steps']] == ['start', 'hit', 'stand']
+    assert data['steps'][1]['player_score'] == 19
+    assert data['steps'][2]['result'] == 'win'
+    assert data['balance'] == 1100
+    assert len(commit_counter) == 1
+    assert balance(user_client) == 1100
+
+
+def test_batch_error_rolls_back_every_step(user_client, commit_counter, stack_deck):
+    stack_deck(('A', 'hearts'), ('K', 'clubs'), ('10', 'spades'), ('7', 'diamonds'))
+    response = user_client.post('/api/game/batch', json={'actions': ['start', 'hit'], 'bet_amount': 100})
+    assert response.status_code == 400
+    assert response.get_json()['step'] == 1
+    assert commit_counter == []
+    assert balance(user_client) == 1000
+    assert GameRecord.query.count() == 0
+
+
+def test_batch_strategy_plays_several_hands(user_client, commit_counter, stack_deck):
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'), ('10', 'hearts'))
+    data = user_client.post('/api/game/batch', json={
+        'strategy': 'stand_17_double_10_11', 'hands': 3, 'bet_amount': 100}).get_json()
+    assert [step['action'] for step in data['steps']] == ['start', 'double_down'] * 3
+    assert all(step['result'] == 'win' for step in data['steps'][1::2])
+    assert data['balance'] == 1600
+    assert len(commit_counter) == 1
+    assert GameRecord.query.count() == 3
+
+
+def test_batch_strategy_stops_when_broke(user_client, stack_deck):
+    stack_deck(('10', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('9', 'diamonds'), ('10', 'clubs'))
+    data = user_client.post('/api/game/batch', json={
+        'strategy': {'stand_on': 17}, 'hands': 10, 'bet_amount': 400}).get_json()
+    assert [step['action'] for step in data['steps']] == ['start', 'hit'] * 2
+    assert data['balance'] == 200
+
+
+def test_batch_rejects_too_many_hands_up_front(user_client):
+    response = user_client.post('/api/game/batch', json={
+        'strategy': 'stand_17', 'hands': BATCH_MAX_HANDS + 1, 'bet_amount': 1})
+    assert response.status_code == 400
+    assert response.get_json()['step'] is None
+    assert GameRecord.query.count() == 0
+    assert db.session.get(User, user_client.user.id).balance == 1000
+
+
+def test_batch_rejects_unknown_strategy(user_client):
+    response = user_client.post('/api/game/batch', json={'strategy': 'martingale'})
+    assert response.status_code == 400
@@ -0,0 +1,16 @@
+import cold_start
+
+
+def test_run_times_every_phase():
+    summary = cold_start.run(runs=1)
+    assert summary['runs'] == 1
+    assert set(summary['phases']) == set(cold_start.PHASES)
+    assert all(stats['median_ms'] > 0 for stats in summary['phases'].values())
+    assert summary['phases']['total']['median_ms'] > summary['phases']['import']['median_ms']
+
+
+def test_compare_flags_regressions():
+    baseline = {'phases': {'import': {'median_ms': 300.0}, 'migrate': {'median_ms': 40.0}}}
+    current = {'phases': {'import': {'median_ms': 310.0}, 'migrate': {'median_ms': 60.0},
+                          'fork': {'median_ms': 25.0}}}
+    assert cold_start.compare(baseline, current, tolerance=0.2) == ['migrate median_ms: 40.0 -> 60.0']
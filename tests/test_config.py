@@ -0,0 +1,58 @@
+import sqlite3
+
+from flask import Flask
+from sqlalchemy import text
+
+import config
+from database import db
+
+
+def test_environment_overrides_defaults():
+    settings = config.from_environment({'DATABASE_URL': 'postgresql://db/blackjack', 'DB_POOL_SIZE': '25',
+                                        'WRITE_BEHIND': '0', 'SHOE_PENETRATION': '0.5'})
+    assert settings['SQLALCHEMY_DATABASE_URI'] == 'postgresql://db/blackjack'
+    assert settings['DB_POOL_SIZE'] == 25
+    assert settings['WRITE_BEHIND_ENABLED'] is False
+    assert settings['SHOE_PENETRATION'] == 0.5
+    assert settings['SQLITE_JOURNAL_MODE'] == 'WAL'
+    assert 'PASSWORD_POOL_WORKERS' not in settings
+
+
+def test_server_databases_get_a_tuned_pool():
+    settings = config.from_environment({'DATABASE_URL': 'postgresql+psycopg2://db/blackjack',
+                                        'DB_MAX_OVERFLOW': '5'})
+    options = config.engine_options(settings)
+    assert options['pool_size'] == 10
+    assert options['max_overflow'] == 5
+    assert options['pool_pre_ping'] is True
+    assert config.engine_options(config.from_environment({'DATABASE_URL': 'sqlite:///x.db'})) == {}
+
+
+def test_settings_file_overrides_the_environment(tmp_path, monkeypatch):
+    settings_file = tmp_path / 'settings.py'
+    settings_file.write_text("SHOE_DECKS = 2\nSQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 3}\n"
+                             "SQLALCHEMY_DATABASE_URI = 'postgresql://db/blackjack'\n")
+    monkeypatch.setenv('APP_SETTINGS', str(settings_file))
+    monkeypatch.setenv('SHOE_DECKS', '4')
+    app = Flask(__name__)
+    config.configure(app)
+    assert app.config['SHOE_DECKS'] == 2
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_size'] == 3
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS']['max_overflow'] == 20
+
+
+def test_pragmas_on_a_sqlite_file(tmp_path):
+    connection = sqlite3.connect(tmp_path / 'game.db')
+    settings = config.from_environment({'SQLITE_BUSY_TIMEOUT': '1234'})
+    config.apply_pragmas(connection, config.sqlite_pragmas(settings))
+    assert connection.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert connection.execute('PRAGMA busy_timeout').fetchone()[0] == 1234
+    # NORMAL is 1
+    assert connection.execute('PRAGMA synchronous').fetchone()[0] == 1
+    connection.close()
+
+
+def test_app_connections_are_tuned(db_app):
+    with db.engine.connect() as conn:
+        assert conn.execute(text('PRAGMA busy_timeout')).scalar() == db_app.config['SQLITE_BUSY_TIMEOUT']
+        assert conn.execute(text('PRAGMA synchronous')).scalar() == 1
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+import freecell_api
+import freecell_deals
+from freecell_deals import DealIndex, SOLVABLE, UNKNOWN, ms_deal, write_index
+from freecell_engine import RANK, SUIT, card_from_js_id
+
+NAMES = 'A23456789TJQK'
+
+
+def short_name(card):
+    return NAMES[RANK[card] - 1] + 'CSHD'[SUIT[card]]
+
+
+def test_microsoft_deal_numbers():
+    assert ' '.join(map(short_name, ms_deal(1)[:8])) == 'JD 2D 9H JC 5D 7H 7C 5H'
+    assert ' '.join(map(short_name, ms_deal(617)[:8])) == '7D AD 5C 3S 5S 8C 2D AH'
+    assert sorted(ms_deal(11982)) == list(range(52))
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    # deal -> (status, difficulty, moves)
+    rows = {1: (SOLVABLE, 0, 80), 2: (SOLVABLE, 2, 120), 3: (UNKNOWN, 0, 0), 4: (SOLVABLE, 0, 95)}
+    path = str(tmp_path / 'deals.idx')
+    write_index(path, [(number, *row) for number, row in rows.items()])
+    return path
+
+
+def test_index_lookup_and_buckets(index_path):
+    index = DealIndex(index_path)
+    assert len(index) == 4
+    assert index.lookup(2) == {'deal': 2, 'status': 'solved', 'difficulty': 'hard', 'moves': 120}
+    assert index.lookup(3)['difficulty'] is None
+    with pytest.raises(KeyError):
+        index.lookup(5)
+    assert [index.bucket_size(d) for d in freecell_deals.DIFFICULTIES] == [2, 0, 1]
+    rng = random.Random(0)
+    assert {index.random_deal('easy', rng) for _ in range(50)} == {1, 4}
+    assert index.random_deal('medium', rng) is None
+    assert index.random_deal(None, rng) in (1, 2, 4)
+    index.close()
+
+
+def test_write_index_requires_every_deal(tmp_path):
+    with pytest.raises(ValueError):
+        write_index(str(tmp_path / 'bad.idx'), [(2, SOLVABLE, 0, 10)])
+
+
+def test_build_index_on_a_process_pool(tmp_path):
+    path = str(tmp_path / 'deals.idx')
+    results = freecell_deals.build_index(path, count=3, workers=2, time_limit=10)
+    assert [status for _, status, _, _ in results] == [SOLVABLE] * 3
+    index = DealIndex(path)
+    assert index.lookup(1)['status'] == 'solved'
+    assert index.lookup(1)['moves'] == results[0][3]
+    index.close()
+
+
+def test_deal_endpoint_uses_index(user_client, db_app, index_path, monkeypatch):
+    monkeypatch.setitem(db_app.config, 'FREECELL_DEAL_INDEX', index_path)
+    monkeypatch.setattr(freecell_api, '_deal_index', None)
+    data = user_client.get('/api/freecell/deal?difficulty=hard').get_json()
+    assert data['deal'] == 2
+    assert data['difficulty'] == 'hard'
+    assert [card_from_js_id(card_id) for card_id in data['cards']] == ms_deal(2)
+    assert user_client.get('/api/freecell/deal?difficulty=medium').status_code == 503
+    assert user_client.get('/api/freecell/deal?difficulty=silly').status_code == 400
+    freecell_api._deal_index.close()
+
+
+def test_deal_endpoint_without_index(user_client, db_app, tmp_path, monkeypatch):
+    monkeypatch.setitem(db_app.config, 'FREECELL_DEAL_INDEX', str(tmp_path / 'missing.idx'))
+    monkeypatch.setattr(freecell_api, '_deal_index', None)
+    # Deal 1 solves well within the hint budget
+    monkeypatch.setattr(freecell_api.random, 'randint', lambda low, high: 1)
+    data = user_client.get('/api/freecell/deal').get_json()
+    assert data['deal'] == 1
+    assert len(data['cards']) == 52
+    assert data['difficulty_honored'] is True
+
+
+def test_deal_fallback_is_one_attempt(user_client, db_app, tmp_path, monkeypatch):
+    monkeypatch.setitem(db_app.config, 'FREECELL_DEAL_INDEX', str(tmp_path / 'missing.idx'))
+    monkeypatch.setattr(freecell_api, '_deal_index', None)
+    attempts = []
+
+    def solve(number, max_nodes, time_limit):
+        attempts.append(number)
+        return number, SOLVABLE, 0, 80
+    monkeypatch.setattr(freecell_api, 'solve_deal', solve)
+    data = user_client.get('/api/freecell/deal?difficulty=hard').get_json()
+    assert len(attempts) == 1
+    assert data['difficulty'] == 'easy'
+    assert data['difficulty_honored'] is False
+
+    monkeypatch.setattr(freecell_api, 'solve_deal', lambda number, *budget: (number, UNKNOWN, 2, 0))
+    assert user_client.get('/api/freecell/deal').status_code == 503
@@ -0,0 +1,119 @@
+import random
+
+import pytest
+
+from freecell_engine import (
+    FreeCellState, InvalidMove, EMPTY, FOUNDATION, SUITS,
+    make_card, make_move, card_from_js_id, card_to_js_id, card_to_dict,
+)
+
+CLUBS, SPADES, HEARTS, DIAMONDS = range(4)
+
+
+def solved_but_one():
+    """Every card on the foundations except the king of diamonds, which is in column 0."""
+    state = FreeCellState(foundations=0xCDDD)
+    state.columns[0].append(make_card(13, DIAMONDS))
+    return state
+
+
+def test_js_card_ids_round_trip():
+    assert sorted(card_from_js_id(i) for i in range(1, 53)) == list(range(52))
+    for card_id in range(1, 53):
+        assert card_to_js_id(card_from_js_id(card_id)) == card_id
+    # static/freecell.js: id 1 is the ace of clubs, id 5 the king of clubs, id 52 the 2 of diamonds
+    assert card_to_dict(card_from_js_id(1)) == {'id': 1, 'suit': 'clubs', 'value': 1, 'colour': 'black'}
+    assert card_to_dict(card_from_js_id(5))['value'] == 13
+    assert card_to_dict(card_from_js_id(52)) == {'id': 52, 'suit': 'diamonds', 'value': 2, 'colour': 'red'}
+
+
+def test_deal_is_round_robin():
+    state = FreeCellState.deal(list(range(52)))
+    assert [len(column) for column in state.columns] == [7, 7, 7, 7, 6, 6, 6, 6]
+    assert list(state.columns[1][:2]) == [1, 9]
+    with pytest.raises(ValueError):
+        FreeCellState.deal([0] * 52)
+
+
+def test_column_moves_need_alternating_colours():
+    state = FreeCellState()
+    state.columns[0].append(make_card(8, SPADES))
+    state.columns[1].append(make_card(7, HEARTS))
+    state.columns[2].append(make_card(7, CLUBS))
+    assert state.is_valid(make_move(1, 0))
+    assert not state.is_valid(make_move(2, 0))
+    assert state.is_valid(make_move(2, 3))       # empty column
+    with pytest.raises(InvalidMove):
+        state.apply(make_move(2, 0))
+
+
+def test_free_cells_and_foundations():
+    state = FreeCellState()
+    state.columns[0].extend([make_card(2, HEARTS), make_card(1, HEARTS)])
+    assert not state.is_valid(make_move(0, FOUNDATION + CLUBS))
+    state.apply(make_move(0, FOUNDATION + HEARTS))
+    assert state.foundation_rank(HEARTS) == 1
+    state.apply(make_move(0, 8))
+    assert state.cells[0] == make_card(2, HEARTS)
+    assert not state.is_valid(make_move(1, 8))   # nothing to move
+    state.columns[1].append(make_card(5, CLUBS))
+    assert not state.is_valid(make_move(1, 8))   # cell occupied
+    assert state.free_cell_mask() == 0b1110
+    state.apply(make_move(8, FOUNDATION + HEARTS))
+    assert state.foundation_rank(HEARTS) == 2
+    assert state.cells[0] == EMPTY
+    # Foundations never give cards back
+    assert not state.is_valid(make_move(FOUNDATION + HEARTS, 2))
+
+
+def test_win_detection():
+    state = solved_but_one()
+    assert not state.is_won()
+    state.apply(make_move(0, FOUNDATION + DIAMONDS))
+    assert state.is_won()
+
+
+def test_legal_moves_are_valid_and_undo_restores():
+    rng = random.Random(7)
+    for _ in range(50):
+        state = FreeCellState.random_deal(rng)
+        history = []
+        snapshots = []
+        for _ in range(100):
+            moves = state.legal_moves()
+            assert len(set(moves)) == len(moves)
+            assert all(state.is_valid(move) for move in moves)
+            if not moves:
+                break
+            snapshots.append(state.copy())
+            move = rng.choice(moves)
+            state.apply(move)
+            history.append(move)
+        for move, snapshot in zip(reversed(history), reversed(snapshots)):
+            state.undo(move)
+            assert state == snapshot
+
+
+def test_to_dict_matches_client_layout():
+    state = solved_but_one()
+    state.cells[2] = make_card(13, DIAMONDS)
+    state.columns[0].pop()
+    layout = state.to_dict()
+    assert layout['free'][2]['value'] == 13
+    assert layout['free'][0] is None
+    assert [card['suit'] for card in layout['suits']] == SUITS
+    assert [card['value'] for card in layout['suits']] == [13, 13, 13, 12]
+
+
+def test_pack_and_layout_round_trip():
+    state = FreeCellState.random_deal(random.Random(3))
+    for move in state.legal_moves()[:2]:
+        state.apply(move)
+    assert FreeCellState.unpack(state.pack()) == state
+    layout = state.to_dict()
+    rebuilt = FreeCellState.from_layout(
+        [[card['id'] for card in column] for column in layout['columns']],
+        [card and card['id'] for card in layout['free']],
+        [card and card['id'] for card in layout['suits']],
+    )
+    assert rebuilt == state
@@ -0,0 +1,142 @@
+import pytest
+
+import freecell_api
+import freecell_solver
+from database import db, FreeCellGame, FreeCellRecord
+from freecell_deals import ms_deal
+from freecell_engine import (
+    FreeCellState, InvalidMove, decode_moves, encode_moves, make_move, replay, score_game,
+)
+
+
+@pytest.fixture(scope='module')
+def solution():
+    """A winning move log for deal 1."""
+    return freecell_solver.solve(FreeCellState.deal(ms_deal(1)), time_limit=10)['moves']
+
+
+def play(client, deal):
+    """Make deal the client's numbered game in play, as /api/freecell/deal does."""
+    db.session.merge(FreeCellGame(user_id=client.user.id, deal=deal))
+    db.session.commit()
+
+
+def test_move_log_round_trip(solution):
+    text = encode_moves(solution)
+    assert decode_moves(text) == bytes(solution)
+    assert len(text) <= (len(solution) + 2) // 3 * 4
+    with pytest.raises(ValueError):
+        decode_moves('not base64!')
+    with pytest.raises(ValueError):
+        decode_moves(text, max_moves=10)
+
+
+def test_replay_streams_in_place(solution):
+    state = FreeCellState.deal(ms_deal(1))
+    assert replay(state, decode_moves(encode_moves(solution))) == len(solution)
+    assert state.is_won()
+
+
+def test_replay_names_first_illegal_move(solution):
+    moves = bytearray(solution)
+    moves[3] = make_move(8, 0)   # from an empty free cell
+    with pytest.raises(InvalidMove, match='move 4'):
+        replay(FreeCellState.deal(ms_deal(1)), moves)
+
+
+def test_score():
+    assert score_game(90, par=100) == 1000
+    assert score_game(120, par=100) == 900
+    assert score_game(10000) == 100
+
+
+def test_submit_verifies_and_stores_replay(user_client, solution):
+    play(user_client, 1)
+    text = encode_moves(solution)
+    data = user_client.post('/api/freecell/submit', json={'deal': 1, 'moves': text}).get_json()
+    assert data['verified'] is True
+    assert data['moves'] == len(solution)
+    assert data['score'] == data['best'] == score_game(len(solution))
+
+    record = FreeCellRecord.query.one()
+    assert record.moves == bytes(solution)
+    stored = user_client.get(f"/api/freecell/replay/{data['record_id']}").get_json()
+    assert stored['moves'] == text
+    assert stored['username'] == 'player'
+
+
+def test_submit_rejects_unfinished_and_illegal_games(user_client, solution):
+    play(user_client, 1)
+    unfinished = encode_moves(solution[:-1])
+    response = user_client.post('/api/freecell/submit', json={'deal': 1, 'moves': unfinished})
+    assert response.status_code == 400
+    # Deal 2 does not start like deal 1, so the log breaks early
+    play(user_client, 2)
+    response = user_client.post('/api/freecell/submit', json={'deal': 2, 'moves': encode_moves(solution)})
+    assert response.status_code == 400
+    response = user_client.post('/api/freecell/submit', json={'deal': 0, 'moves': encode_moves(solution)})
+    assert response.status_code == 400
+    assert FreeCellRecord.query.count() == 0
+    # A rejected log leaves the game in play
+    assert db.session.get(FreeCellGame, user_client.user.id).deal == 2
+
+
+def test_submit_scores_the_game_in_play_once(user_client, solution):
+    body = {'deal': 1, 'moves': encode_moves(solution)}
+    assert user_client.post('/api/freecell/submit', json=body).status_code == 409
+    play(user_client, 1)
+    assert user_client.post('/api/freecell/submit', json=body).status_code == 200
+    assert user_client.post('/api/freecell/submit', json=body).status_code == 409
+    assert FreeCellRecord.query.count() == 1
+    assert user_client.post('/api/freecell/submit', json=[body]).status_code == 400
+
+
+def test_dealt_game_can_be_submitted(user_client, db_app, tmp_path, monkeypatch, solution):
+    monkeypatch.setitem(db_app.config, 'FREECELL_DEAL_INDEX', str(tmp_path / 'missing.idx'))
+    monkeypatch.setattr(freecell_api, '_deal_index', None)
+    monkeypatch.setattr(freecell_api.random, 'randint', lambda low, high: 1)
+    assert user_client.get('/api/freecell/deal').get_json()['deal'] == 1
+    response = user_client.post('/api/freecell/submit', json={'deal': 1, 'moves': encode_moves(solution)})
+    assert response.status_code == 200
+
+
+def test_solver_assisted_games_do_not_score(user_client, solution):
+    play(user_client, 1)
+    state = FreeCellState.deal(ms_deal(1)).to_dict()
+    layout = {'columns': [[card['id'] for card in column] for column in state['columns']]}
+    assert user_client.post('/api/freecell/hint', json=layout).status_code == 200
+    response = user_client.post('/api/freecell/submit', json={'deal': 1, 'moves': encode_moves(solution)})
+    assert response.status_code == 403
+    assert FreeCellRecord.query.count() == 0
+
+
+def test_record_keeps_the_best_score(user_client, solution):
+    score = score_game(len(solution))
+    record = FreeCellRecord(user_id=user_client.user.id, deal=1, moves=b'', move_count=999, score=score - 1)
+    db.session.add(record)
+    db.session.commit()
+    body = {'deal': 1, 'moves': encode_moves(solution)}
+    play(user_client, 1)
+    assert user_client.post('/api/freecell/submit', json=body).get_json()['best'] == score
+    assert (record.moves, record.score) == (bytes(solution), score)
+
+    record.score = score + 1
+    db.session.commit()
+    play(user_client, 1)
+    data = user_client.post('/api/freecell/submit', json=body).get_json()
+    assert (data['score'], data['best']) == (score, score + 1)
+    assert FreeCellRecord.query.one().move_count == len(solution)
+
+
+def test_replays_are_private(user_client, db_app, create_user, solution):
+    play(user_client, 1)
+    record_id = user_client.post('/api/freecell/submit',
+                                 json={'deal': 1, 'moves': encode_moves(solution)}).get_json()['record_id']
+    assert db_app.test_client().get(f'/api/freecell/replay/{record_id}').status_code == 401
+
+    other = create_user('other')
+    client = db_app.test_client()
+    with client.session_transaction() as sess:
+        sess['username'] = other.username
+    assert client.get(f'/api/freecell/replay/{record_id}').status_code == 404
+    assert user_client.get(f'/api/freecell/replay/{record_id}').status_code == 200
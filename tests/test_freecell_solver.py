@@ -0,0 +1,106 @@
+import random
+
+import pytest
+
+import freecell_solver
+from freecell_engine import FreeCellState, make_card
+
+
+def deal(seed):
+    return FreeCellState.random_deal(random.Random(seed))
+
+
+def layout(state):
+    data = state.to_dict()
+    return {
+        'columns': [[card['id'] for card in column] for column in data['columns']],
+        'free': [card and card['id'] for card in data['free']],
+        'suits': [card and card['id'] for card in data['suits']],
+    }
+
+
+def test_zobrist_ignores_column_and_cell_order():
+    state = deal(1)
+    state.apply(state.legal_moves()[-1])
+    shuffled = state.copy()
+    shuffled.columns.reverse()
+    shuffled.cells.reverse()
+    assert freecell_solver.zobrist(shuffled) == freecell_solver.zobrist(state)
+    assert freecell_solver.zobrist(deal(2)) != freecell_solver.zobrist(state)
+
+
+def test_zobrist_tells_columns_apart():
+    # 8♣-7♥ / 8♠-7♦ against 8♣-7♦ / 8♠-7♥: same cards at the same depths
+    clubs, spades, hearts, diamonds = range(4)
+    state = FreeCellState()
+    state.columns[0].extend([make_card(8, clubs), make_card(7, hearts)])
+    state.columns[1].extend([make_card(8, spades), make_card(7, diamonds)])
+    swapped = FreeCellState()
+    swapped.columns[0].extend([make_card(8, clubs), make_card(7, diamonds)])
+    swapped.columns[1].extend([make_card(8, spades), make_card(7, hearts)])
+    assert freecell_solver.zobrist(state) != freecell_solver.zobrist(swapped)
+
+
+def test_incremental_hash_matches_full_hash():
+    rng = random.Random(5)
+    state = deal(5)
+    key = freecell_solver.zobrist(state)
+    for _ in range(60):
+        moves = state.legal_moves()
+        if not moves:
+            break
+        move = rng.choice(moves)
+        key ^= freecell_solver._move_delta(state, move)
+        state.apply(move)
+        assert key == freecell_solver.zobrist(state)
+
+
+def test_solves_random_deals():
+    for seed in range(5):
+        state = deal(seed)
+        found = freecell_solver.solve(state, time_limit=10)
+        assert found['status'] == 'solved'
+        replay = state.copy()
+        for move in found['moves']:
+            replay.apply(move)
+        assert replay.is_won()
+
+
+def test_budget_exhaustion_is_unknown():
+    found = freecell_solver.solve(deal(0), max_nodes=1)
+    assert found['status'] == 'unknown'
+    assert found['moves'] == []
+
+
+def test_autoplay_only_plays_safe_cards():
+    state = FreeCellState(foundations=0x0000)
+    state.columns[0].extend([make_card(3, 2), make_card(2, 2), make_card(1, 2)])   # hearts 3, 2, A
+    state.columns[1].append(make_card(1, 0))                                       # ace of clubs
+    moves = state.autoplay()
+    assert len(moves) == 3
+    # 3 of hearts waits until both black foundations reach 2
+    assert state.foundation_rank(2) == 2 and state.foundation_rank(0) == 1
+
+
+def test_hint_and_solve_endpoints(user_client):
+    body = layout(deal(3))
+    data = user_client.post('/api/freecell/hint', json=body).get_json()
+    assert data['status'] == 'solved'
+    assert set(data['move']) == {'card', 'from', 'to'}
+
+    data = user_client.post('/api/freecell/solve', json=body).get_json()
+    assert data['status'] == 'solved'
+    assert data['moves'][0] == user_client.post('/api/freecell/hint', json=body).get_json()['move']
+
+
+def test_endpoints_reject_bad_layouts(user_client, db_app):
+    body = layout(deal(3))
+    body['columns'][0].append(body['columns'][1][0])
+    assert user_client.post('/api/freecell/solve', json=body).status_code == 400
+    assert db_app.test_client().post('/api/freecell/hint', json=layout(deal(3))).status_code == 401
+
+
+@pytest.mark.parametrize('body', [[1, 2, 3], 'columns', 7])
+def test_endpoints_reject_non_object_bodies(user_client, body):
+    for endpoint in ('/api/freecell/hint', '/api/freecell/solve', '/api/freecell/move'):
+        assert user_client.post(endpoint, json=body).status_code == 400
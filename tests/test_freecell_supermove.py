@@ -0,0 +1,152 @@
+import random
+
+import pytest
+
+from freecell_engine import FreeCellState, InvalidMove, make_card, make_move, location_from_name
+from freecell_engine import card_from_js_id
+
+CLUBS, SPADES, HEARTS, DIAMONDS = range(4)
+
+
+def run_state(run_length, free_cells=4, empty_columns=0):
+    """Column 0 holds the run Q♥ J♠ 10♥ ... of run_length cards, column 1 the K♣ it fits on."""
+    state = FreeCellState()
+    filler = iter([make_card(rank, suit) for rank in range(2, 7) for suit in (CLUBS, DIAMONDS)])
+    for i in range(run_length):
+        state.columns[0].append(make_card(12 - i, SPADES if i % 2 else HEARTS))
+    state.columns[1].append(make_card(13, CLUBS))
+    for column in range(2, 8 - empty_columns):
+        state.columns[column].append(next(filler))
+    for cell in range(4 - free_cells):
+        state.cells[cell] = next(filler)
+    return state
+
+
+@pytest.mark.parametrize('free_cells, empty_columns, capacity', [
+    (4, 0, 5), (0, 0, 1), (2, 1, 6), (1, 2, 8), (0, 3, 8),
+])
+def test_max_supermove(free_cells, empty_columns, capacity):
+    state = run_state(1, free_cells, empty_columns)
+    assert state.max_supermove() == capacity
+    assert state.max_supermove(to_empty_column=True) == capacity // 2 if empty_columns else capacity
+
+
+@pytest.mark.parametrize('free_cells, empty_columns', [(4, 0), (1, 1), (2, 2), (0, 3)])
+def test_supermove_expands_into_legal_single_moves(free_cells, empty_columns):
+    count = min((free_cells + 1) << empty_columns, 12)
+    state = run_state(count, free_cells, empty_columns)
+    expected_top = list(state.columns[0][-count:])
+    before = state.copy()
+
+    moves = state.supermove(0, 1, count)
+    assert list(state.columns[1][-count:]) == expected_top
+    assert state.cells == before.cells
+    # The expansion replays move by move under the normal rules
+    for move in moves:
+        before.apply(move)
+    assert before == state
+
+
+def test_supermove_rejects_runs_that_do_not_fit():
+    state = run_state(8, free_cells=1, empty_columns=0)
+    assert state.sequence_length(0) == 8
+    with pytest.raises(InvalidMove, match='Not enough'):
+        state.supermove(0, 1, 8)
+    with pytest.raises(InvalidMove, match='cannot be placed'):
+        state.supermove(0, 1, 1)
+    state.columns[0].insert(0, make_card(3, CLUBS))
+    with pytest.raises(InvalidMove, match='not an ordered run'):
+        state.supermove(0, 1, 9)
+
+
+def test_random_supermoves_match_capacity():
+    rng = random.Random(11)
+    checked = 0
+    for _ in range(300):
+        state = FreeCellState.random_deal(rng)
+        for _ in range(rng.randint(0, 60)):
+            moves = state.legal_moves()
+            if not moves:
+                break
+            state.apply(rng.choice(moves))
+        for src in range(8):
+            for dst in range(8):
+                length = state.sequence_length(src)
+                for count in range(2, length + 1):
+                    if src == dst or not state.accepts(dst, state.columns[src][-count]):
+                        continue
+                    if count > state.max_supermove(not state.columns[dst]):
+                        continue
+                    trial = state.copy()
+                    replay = state.copy()
+                    for move in trial.supermove(src, dst, count):
+                        replay.apply(move)
+                    assert list(trial.columns[dst][-count:]) == list(state.columns[src][-count:])
+                    assert replay == trial
+                    checked += 1
+    assert checked > 20
+
+
+def test_location_names():
+    assert location_from_name('col7') == 7
+    assert location_from_name('free2') == 10
+    assert location_from_name('suit0', make_card(1, HEARTS)) == 12 + HEARTS
+    with pytest.raises(ValueError):
+        location_from_name('col8')
+
+
+def layout(state):
+    data = state.to_dict()
+    return {
+        'columns': [[card['id'] for card in column] for column in data['columns']],
+        'free': [card and card['id'] for card in data['free']],
+        'suits': [card and card['id'] for card in data['suits']],
+    }
+
+
+def full_layout(state):
+    """Layout of state with every card not in play stacked at the bottom of column 7."""
+    in_play = {card for column in state.columns for card in column} | set(state.cells)
+    rest = sorted((card for card in range(52) if card not in in_play), reverse=True)
+    state.columns[7][:0] = bytes(rest)
+    return layout(state)
+
+
+def test_move_endpoint_plays_supermove_and_autoplay(user_client):
+    state = run_state(5, free_cells=4)
+    state.columns[3] = bytearray([make_card(1, DIAMONDS), make_card(7, CLUBS)])
+    body = full_layout(state)
+
+    run = body['columns'][0][-5:]
+    data = user_client.post('/api/freecell/move', json=dict(body, card=run[0], to='col1')).get_json()
+    assert len(data['moves']) == 9          # 4 cards out to free cells, 1 over, 4 back
+    assert [card['id'] for card in data['state']['columns'][1][-5:]] == run
+    assert data['state']['free'] == [None] * 4
+    assert data['autoplay'] == []
+
+    # Moving the 7 of clubs away uncovers the ace of diamonds, which autoplays
+    seven = body['columns'][3][-1]
+    data = user_client.post('/api/freecell/move', json=dict(body, card=seven, to='free0')).get_json()
+    assert [move['to'] for move in data['autoplay']] == ['suit3']
+    assert data['state']['suits'][3]['value'] == 1
+
+
+def test_move_endpoint_rejects_illegal_moves(user_client):
+    body = layout(FreeCellState.deal(list(range(52))))
+    bottom = body['columns'][0][0]
+    response = user_client.post('/api/freecell/move', json=dict(body, card=bottom, to='col1'))
+    assert response.status_code == 400
+
+
+def test_move_endpoint_moves_rebuild_the_log(user_client):
+    # The client logs every returned move; replaying those codes must reach the returned state
+    state = run_state(5, free_cells=4)
+    state.columns[3] = bytearray([make_card(1, DIAMONDS), make_card(7, CLUBS)])
+    body = full_layout(state)
+    replayed = FreeCellState.from_layout(body['columns'], body['free'], body['suits'])
+    for card, to in ((body['columns'][0][-5], 'col1'), (body['columns'][3][-1], 'free0')):
+        data = user_client.post('/api/freecell/move', json=dict(layout(replayed), card=card, to=to)).get_json()
+        for move in data['moves'] + data['autoplay']:
+            card_code = card_from_js_id(move['card'])
+            replayed.apply(make_move(location_from_name(move['from']), location_from_name(move['to'], card_code)))
+        assert replayed.to_dict() == data['state']
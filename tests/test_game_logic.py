@@ -1,3 +1,5 @@
+import logging
+
 import pytest
 import game_logic
 
@@ -7,6 +9,19 @@ def test_create_deck():
     # Check for unique cards (basic check)
     assert len(set(str(card) for card in deck)) == 52
 
+def test_card_encoding_round_trip():
+    deck = game_logic.create_deck()
+    dicts = game_logic.cards_to_dicts(deck)
+    assert dicts[0] == {'suit': 'hearts', 'value': '2'}
+    assert dicts[-1] == {'suit': 'spades', 'value': 'A'}
+    assert [game_logic.card_from_dict(card) for card in dicts] == deck
+
+def test_calculate_score_card_codes():
+    ace_of_spades = game_logic.card_from_dict({'suit': 'spades', 'value': 'A'})
+    king_of_hearts = game_logic.card_from_dict({'suit': 'hearts', 'value': 'K'})
+    assert game_logic.calculate_score([ace_of_spades, king_of_hearts]) == 21
+    assert game_logic.is_blackjack([ace_of_spades, king_of_hearts])
+
 def test_shuffle_deck():
     deck1 = game_logic.create_deck()
     deck2 = game_logic.create_deck()
@@ -65,3 +80,20 @@ def test_dealer_should_stand_on_hard_17():
 
 # Note: More complex dealer_ai_turn tests would require mocking the deck to control card drawing.
 # This is a starting point for unit tests.
+
+
+def test_debug_trace_does_not_compute_odds(monkeypatch, caplog):
+    calls = []
+    monkeypatch.setattr(game_logic.odds, 'bust_probability', lambda hand, deck: calls.append(hand) or 0.5)
+    caplog.set_level(logging.DEBUG, logger='game_logic')
+    card = lambda value: game_logic.card_from_dict({'suit': 'hearts', 'value': value})
+    deck = game_logic.create_deck()
+    # Hard 20 stands whatever the deck holds, so the exact odds are never needed
+    assert game_logic.dealer_should_hit([card('K'), card('Q')], 18, deck=deck) is False
+    assert calls == []
+    assert 'Dealer AI: total=20' in caplog.text
+    # When the decision needs them they are computed once
+    for low in ('2', '3', '4', '5', '6'):
+        calls.clear()
+        game_logic.dealer_should_hit([card('10'), card(low)], 18, deck=deck)
+        assert len(calls) <= 1
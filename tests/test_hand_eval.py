@@ -0,0 +1,62 @@
+import itertools
+import random
+
+import game_logic
+from hand_eval import HandState
+
+
+def reference_dealer_should_hit(hand, player_score):
+    """The dealer rule written against the per-hand game_logic helpers."""
+    total = game_logic.calculate_score(hand)
+    if total >= 17:
+        return False
+    if game_logic.is_soft_hand(hand) and total == 17:
+        return True
+    if total < player_score and game_logic.calculate_bust_risk(hand) < 0.5:
+        return True
+    return total < 17
+
+
+def assert_matches_game_logic(state, hand):
+    assert state.score == game_logic.calculate_score(hand)
+    assert state.is_soft == game_logic.is_soft_hand(hand)
+    assert state.bust_risk == game_logic.calculate_bust_risk(hand)
+    assert state.is_blackjack == game_logic.is_blackjack(hand)
+
+
+def test_all_hands_up_to_four_cards():
+    for size in range(1, 5):
+        for ranks in itertools.product(range(13), repeat=size):
+            hand = list(ranks)  # rank index == card code for hearts
+            assert_matches_game_logic(HandState.from_cards(hand), hand)
+
+
+def test_incremental_random_hands():
+    rng = random.Random(42)
+    for _ in range(2000):
+        deck = game_logic.create_deck()
+        rng.shuffle(deck)
+        hand = []
+        state = HandState()
+        for card in deck[:rng.randint(1, 10)]:
+            hand.append(card)
+            state.add(card)
+            assert_matches_game_logic(state, hand)
+
+
+def test_dealer_decision_table():
+    for ranks in itertools.product(range(13), repeat=3):
+        for size in (2, 3):
+            hand = list(ranks[:size])
+            state = HandState.from_cards(hand)
+            for player_score in range(0, 32):
+                assert state.dealer_should_hit(player_score) == reference_dealer_should_hit(hand, player_score)
+
+
+def test_dealer_ai_turn_uses_tables():
+    deck = game_logic.create_deck()
+    game_logic.shuffle_deck(deck)
+    dealer_hand = game_logic.deal_cards(deck, 2)
+    final_score = game_logic.dealer_ai_turn(deck, dealer_hand, 18)
+    assert final_score == game_logic.calculate_score(dealer_hand)
+    assert final_score >= 17
@@ -0,0 +1,124 @@
+import time
+
+from sqlalchemy import event
+
+import leaderboard as leaderboard_module
+from database import db, User, Ranking, update_rankings_db, unit_of_work
+from leaderboard import Leaderboard, leaderboard
+
+
+def add_rankings(scores):
+    users = [User(username=f'user{i}', password_hash='-') for i in range(len(scores))]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all(Ranking(user_id=user.id, score=score) for user, score in zip(users, scores))
+    db.session.commit()
+    return users
+
+
+def test_rebuild_orders_by_score(db_app):
+    add_rankings([30, 50, 10, 40])
+    page = leaderboard.page(1, 10)
+    assert [row['score'] for row in page] == [50, 40, 30, 10]
+    assert [row['rank'] for row in page] == [1, 2, 3, 4]
+    assert page[0]['username'] == 'user1'
+
+
+def test_incremental_update_and_my_rank(db_app):
+    users = add_rankings([30, 50, 10])
+    assert leaderboard.rank_of(users[2].id) == (3, 10)
+
+    with unit_of_work():
+        update_rankings_db(users[2].id, 100)
+        # Not visible until the transaction commits
+        assert leaderboard.rank_of(users[2].id) == (3, 10)
+    assert leaderboard.rank_of(users[2].id) == (1, 100)
+    assert leaderboard.page(1, 1)[0]['username'] == 'user2'
+
+    # Lower scores never replace a better ranking
+    with unit_of_work():
+        update_rankings_db(users[2].id, 5)
+    assert leaderboard.rank_of(users[2].id) == (1, 100)
+
+
+def test_pages_beyond_capacity_come_from_db(db_app):
+    board = Leaderboard(capacity=3)
+    add_rankings([1, 2, 3, 4, 5, 6, 7])
+    assert [row['score'] for row in board.page(1, 3)] == [7, 6, 5]
+    assert [row['score'] for row in board.page(2, 3)] == [4, 3, 2]
+    assert [row['rank'] for row in board.page(3, 3)] == [7]
+    assert board.rank_of(1) == (7, 1)
+
+
+def test_only_the_top_is_kept_in_memory(db_app):
+    board = Leaderboard(capacity=2)
+    users = add_rankings([10, 20, 30, 40])
+    assert [row['score'] for row in board.page(1, 2)] == [40, 30]
+    assert len(board._top) == 2 and board.threshold == 30 and board.total() == 4
+
+    # Below the threshold the top is untouched; beating it evicts the lowest
+    board.record(users[0].id, 25, users[0].username)
+    assert board.threshold == 30
+    board.record(users[1].id, 35, users[1].username)
+    assert [-score for score, _, _ in board._top] == [40, 35]
+    board.record(99, 50, 'newcomer', new=True)
+    assert (board.total(), board.rank_of(99)) == (5, (1, 50))
+
+
+def test_other_workers_updates_show_after_max_age(db_app, monkeypatch):
+    board = Leaderboard(max_age=10)
+    users = add_rankings([10, 20])
+    assert board.rank_of(users[0].id) == (2, 10)
+    # Another process raises the score in the database only
+    Ranking.query.filter_by(user_id=users[0].id).one().score = 30
+    db.session.commit()
+    assert board.rank_of(users[0].id) == (2, 10)
+    now = time.monotonic()
+    monkeypatch.setattr(leaderboard_module.time, 'monotonic', lambda: now + 11)
+    assert board.rank_of(users[0].id) == (1, 30)
+
+
+def test_rankings_page_query_count(db_app):
+    add_rankings(list(range(50)))
+    leaderboard.page()
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', count)
+    try:
+        response = db_app.test_client().get('/rankings')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    assert 'user49' in response.get_data(as_text=True)
+    assert statements == []
+
+
+def test_rankings_api_includes_my_rank(user_client):
+    db.session.add(Ranking(user_id=user_client.user.id, score=42))
+    db.session.commit()
+    data = user_client.get('/api/rankings').get_json()
+    assert data['total'] == 1
+    assert data['my_rank'] == 1
+    assert data['rankings'][0] == {'rank': 1, 'username': 'player', 'score': 42}
+
+
+def test_ties_share_a_rank_in_pages_and_my_rank(db_app):
+    board = Leaderboard(capacity=2)
+    users = add_rankings([50, 30, 30, 10])
+    rows = board.page(1, 2) + board.page(2, 2)
+    assert [row['rank'] for row in rows] == [1, 2, 2, 4]
+    for user in users:
+        assert board.rank_of(user.id)[0] == next(row['rank'] for row in rows if row['username'] == user.username)
+
+
+def test_per_page_is_clamped(db_app):
+    add_rankings(list(range(120)))
+    client = db_app.test_client()
+    for query, expected in (('per_page=100000000', 100), ('per_page=-5', 1), ('per_page=0', 1)):
+        data = client.get('/api/rankings?' + query).get_json()
+        assert data['per_page'] == expected
+        assert len(data['rankings']) == expected
+    assert client.get('/rankings?per_page=-5&page=-3').status_code == 200
+    assert len(leaderboard.page(1, 100000000)) == 100
@@ -0,0 +1,19 @@
+import load_test
+
+
+def test_run_reports_every_operation(db_app):
+    summary = load_test.run(db_app, users=2, rounds=3, concurrency=1, seed=1)
+    operations = summary['operations']
+    assert {'register', 'login', 'start', 'rankings'} <= set(operations)
+    assert operations['register']['requests'] == 2
+    assert operations['start']['requests'] == 6
+    assert all(stats['errors'] == 0 for stats in operations.values())
+    assert operations['start']['sql_per_request'] > 0
+    assert summary['throughput_rps'] > 0
+
+
+def test_compare_flags_regressions():
+    baseline = {'operations': {'hit': {'p95_ms': 10.0, 'sql_per_request': 3.0}}}
+    current = {'operations': {'hit': {'p95_ms': 11.0, 'sql_per_request': 5.0},
+                              'stand': {'p95_ms': 99.0, 'sql_per_request': 9.0}}}
+    assert load_test.compare(baseline, current, tolerance=0.2) == ['hit sql_per_request: 3.00 -> 5.00']
@@ -0,0 +1,66 @@
+import logging
+
+import game_logic
+from metrics import metrics, Counter, Histogram
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('latency_seconds', 'Latency.', ('endpoint',), buckets=(0.1, 1.0))
+    histogram.observe(0.05, endpoint='/a')
+    histogram.observe(0.5, endpoint='/a')
+    histogram.observe(5, endpoint='/a')
+    lines = list(histogram.samples())
+    assert lines == [
+        'latency_seconds_bucket{endpoint="/a",le="0.1"} 1',
+        'latency_seconds_bucket{endpoint="/a",le="1"} 2',
+        'latency_seconds_bucket{endpoint="/a",le="+Inf"} 3',
+        'latency_seconds_sum{endpoint="/a"} 5.55',
+        'latency_seconds_count{endpoint="/a"} 3',
+    ]
+
+
+def test_counter_escapes_labels():
+    counter = Counter('things_total', 'Things.', ('name',))
+    counter.inc(name='a"b')
+    counter.inc(2, name='a"b')
+    assert list(counter.samples()) == ['things_total{name="a\\"b"} 3']
+
+
+def test_metrics_endpoint(user_client, stack_deck):
+    requests_before = metrics.requests.value(endpoint='/api/game/start', method='POST', status=200)
+    commits_before = metrics.commits.value()
+    wins_before = metrics.games.value(result='win')
+
+    stack_deck(('A', 'hearts'), ('K', 'clubs'), ('10', 'spades'), ('7', 'diamonds'))
+    user_client.post('/api/game/start', json={'bet_amount': 100})
+
+    assert metrics.requests.value(endpoint='/api/game/start', method='POST', status=200) == requests_before + 1
+    assert metrics.commits.value() == commits_before + 1
+    assert metrics.games.value(result='win') == wins_before + 1
+    assert metrics.request_queries.count(endpoint='/api/game/start') >= 1
+
+    response = user_client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    body = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_request_duration_seconds_bucket{endpoint="/api/game/start",method="POST",le="+Inf"}' in body
+    assert 'db_queries_per_request_count{endpoint="/api/game/start"}' in body
+    assert 'blackjack_games_total{result="win"}' in body
+
+
+def test_rolled_back_game_is_not_counted(user_client, stack_deck):
+    losses_before = metrics.games.value(result='lose')
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'))
+    user_client.post('/api/game/start', json={'bet_amount': 600})
+    assert user_client.post('/api/game/double_down').status_code == 400
+    assert metrics.games.value(result='lose') == losses_before
+
+
+def test_dealer_trace_is_logged_not_printed(capsys, caplog):
+    deck = game_logic.create_deck()
+    dealer_hand = [deck.pop(0), deck.pop(0)]   # 2 + 3
+    with caplog.at_level(logging.DEBUG, logger='game_logic'):
+        game_logic.dealer_ai_turn(deck, dealer_hand, 18)
+    assert capsys.readouterr().out == ''
+    assert any('Dealer AI' in record.getMessage() for record in caplog.records)
@@ -0,0 +1,175 @@
+import re
+
+import pytest
+from sqlalchemy import create_engine, event, inspect
+
+import migrations
+from database import db, GameRecord, GameSession, Ranking, aggregate_game_records, write_rankings
+from leaderboard import leaderboard
+
+# The tables as they were before migrations existed: no indexes, hands with a
+# stored deck and game records without their deal
+LEGACY_SCHEMA = [
+    'CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, '
+    'password_hash VARCHAR(128) NOT NULL, balance INTEGER NOT NULL)',
+    'CREATE TABLE game_session (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id), '
+    'deck TEXT NOT NULL, player_hand BLOB NOT NULL, dealer_hand BLOB NOT NULL, player_score INTEGER NOT NULL, '
+    'dealer_score INTEGER NOT NULL, current_bet INTEGER NOT NULL, game_over BOOLEAN NOT NULL, '
+    'created_at DATETIME NOT NULL, updated_at DATETIME NOT NULL)',
+    'CREATE TABLE ranking (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id), '
+    'score INTEGER NOT NULL)',
+    'CREATE TABLE game_record (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id), '
+    'result VARCHAR(10) NOT NULL, player_score INTEGER NOT NULL, dealer_score INTEGER NOT NULL, '
+    'bet_amount INTEGER NOT NULL, timestamp DATETIME NOT NULL)',
+    "INSERT INTO user VALUES (1, 'alice', 'x', 1000)",
+    "INSERT INTO ranking VALUES (1, 1, 50)",
+    "INSERT INTO game_record VALUES (1, 1, 'win', 20, 18, 10, '2024-01-01 00:00:00')",
+    "INSERT INTO game_session VALUES (1, 1, '[]', x'0102', x'0304', 5, 7, 10, 0, "
+    "'2024-01-01 00:00:00', '2024-01-01 00:00:00')",
+]
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "legacy.db"}')
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine, table):
+    return {index['name'] for index in inspect(engine).get_indexes(table)}
+
+
+def test_upgrades_a_legacy_database_in_place(legacy_engine):
+    assert migrations.migrate(legacy_engine) == [1, 2, 3, 4]
+
+    assert {'seed', 'decks', 'cursor', 'actions'} <= {c['name'] for c in inspect(legacy_engine).get_columns('game_record')}
+    assert 'deck' not in {c['name'] for c in inspect(legacy_engine).get_columns('game_session')}
+    assert 'ix_game_record_user_id_timestamp' in index_names(legacy_engine, 'game_record')
+    assert {'ix_ranking_score_desc', 'ix_ranking_user_id'} <= index_names(legacy_engine, 'ranking')
+    assert 'ix_game_session_user_id' in index_names(legacy_engine, 'game_session')
+    assert inspect(legacy_engine).has_table('shoe')
+
+    with legacy_engine.connect() as conn:
+        assert conn.exec_driver_sql('SELECT result, seed FROM game_record').all() == [('win', None)]
+        assert conn.exec_driver_sql('SELECT score FROM ranking').scalar() == 50
+        assert conn.exec_driver_sql('SELECT count(*) FROM game_session').scalar() == 0
+        assert migrations.current_version(conn) == migrations.head()
+
+
+def test_unfinished_hands_are_refunded(legacy_engine):
+    with legacy_engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO user VALUES (2, 'bob', 'x', 500)")
+        # alice's second hand is over and was paid out already
+        conn.exec_driver_sql("INSERT INTO game_session VALUES (2, 1, '[]', x'01', x'02', 20, 17, 40, 1, "
+                             "'2024-01-01 00:00:00', '2024-01-01 00:00:00')")
+    migrations.migrate(legacy_engine)
+    with legacy_engine.connect() as conn:
+        balances = conn.exec_driver_sql('SELECT username, balance FROM user ORDER BY id').all()
+    assert balances == [('alice', 1010), ('bob', 500)]
+
+
+def test_freecell_records_keep_the_best_per_deal(legacy_engine):
+    with legacy_engine.begin() as conn:
+        conn.exec_driver_sql('CREATE TABLE free_cell_record (id INTEGER PRIMARY KEY, '
+                             'user_id INTEGER NOT NULL REFERENCES user (id), deal INTEGER NOT NULL, '
+                             'moves BLOB NOT NULL, move_count INTEGER NOT NULL, score INTEGER NOT NULL, '
+                             'timestamp DATETIME NOT NULL)')
+        for record_id, deal, move_count, score in ((1, 7, 120, 900), (2, 7, 90, 1000), (3, 7, 95, 1000),
+                                                   (4, 8, 100, 950)):
+            conn.exec_driver_sql(f"INSERT INTO free_cell_record VALUES ({record_id}, 1, {deal}, x'01', "
+                                 f"{move_count}, {score}, '2024-01-01 00:00:00')")
+    migrations.migrate(legacy_engine)
+    with legacy_engine.connect() as conn:
+        kept = conn.exec_driver_sql('SELECT id FROM free_cell_record ORDER BY id').scalars().all()
+    assert kept == [2, 4]
+    assert 'ux_free_cell_record_user_deal' in index_names(legacy_engine, 'free_cell_record')
+
+
+def test_migrate_is_a_no_op_when_current(legacy_engine):
+    migrations.migrate(legacy_engine)
+    assert migrations.migrate(legacy_engine) == []
+
+
+def test_fresh_database_records_every_migration(db_app):
+    assert migrations.migrate() == [version for version, _ in migrations.MIGRATIONS]
+    with db.engine.connect() as conn:
+        assert migrations.current_version(conn) == migrations.head()
+
+
+def test_models_and_migrations_agree(db_app, legacy_engine):
+    migrations.migrate(legacy_engine)
+    for table in ('game_record', 'ranking', 'game_session', 'shoe', 'free_cell_record'):
+        assert index_names(legacy_engine, table) == index_names(db.engine, table)
+
+
+@pytest.fixture
+def statements(db_app):
+    """Capture the SELECTs the app issues while the block runs."""
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            captured.append((statement, parameters))
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield captured
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def query_plan(statement, parameters):
+    with db.engine.connect() as conn:
+        return [row.detail for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+
+
+# A lookup by key; anything else that reads a table or index reads all of it
+INDEXED = re.compile(r'SEARCH \S+ USING (COVERING INDEX|INDEX|INTEGER PRIMARY KEY|PRIMARY KEY) ')
+
+
+def full_scans(statement, parameters):
+    return [detail for detail in query_plan(statement, parameters)
+            if detail.startswith('SCAN') and detail != 'SCAN CONSTANT ROW'
+            or detail.startswith('SEARCH') and not INDEXED.match(detail)]
+
+
+def test_hot_queries_use_indexes(user_client, statements):
+    user = user_client.user
+    # Loading the top of the leaderboard counts every ranking
+    leaderboard.page(1)
+    statements.clear()
+    # Lookups that come up per action and per page view
+    for _ in range(3):
+        data = user_client.post('/api/game/start', json={'bet_amount': 10}).get_json()
+        if not data['game_over']:
+            user_client.post('/api/game/hit')
+            user_client.post('/api/game/stand')
+    user_client.get('/api/user/stats')
+    aggregate_game_records(user.id)
+    write_rankings([(user.id, 100, user.username)])
+    leaderboard._rank_from_db(100)
+    db.session.execute(db.select(GameRecord).filter_by(user_id=user.id)
+                       .order_by(GameRecord.timestamp.desc()).limit(20)).all()
+    db.session.execute(db.select(GameSession).filter_by(user_id=user.id)).all()
+    db.session.execute(db.select(Ranking).filter_by(user_id=user.id)).all()
+
+    assert statements
+    scans = {statement: full_scans(statement, parameters) for statement, parameters in statements}
+    assert {statement: scan for statement, scan in scans.items() if scan} == {}
+
+
+def test_leaderboard_order_needs_no_sort(db_app, statements):
+    # Pages walk the score index in order and stop at the LIMIT
+    leaderboard._page_from_db(0, 10)
+    plan = query_plan(*statements[-1])
+    assert full_scans(*statements[-1]) == ['SCAN ranking USING COVERING INDEX ix_ranking_score_desc']
+    assert not any('TEMP B-TREE' in detail for detail in plan)
+
+
+def test_history_by_user_is_ordered_by_the_index(db_app, statements):
+    db.session.execute(db.select(GameRecord).filter_by(user_id=1)
+                       .order_by(GameRecord.timestamp.desc()).limit(20)).all()
+    plan = query_plan(*statements[-1])
+    assert any('ix_game_record_user_id_timestamp' in detail for detail in plan)
+    assert not any('TEMP B-TREE' in detail for detail in plan)
@@ -0,0 +1,191 @@
+import itertools
+import time
+
+import pytest
+
+import game_logic
+import odds
+
+# Cards by rank index (0 = '2' ... 12 = 'A') in the first suit
+TWO, THREE, FOUR, FIVE, SIX, SEVEN, EIGHT, NINE, TEN, JACK, QUEEN, KING, ACE = range(13)
+
+
+def outcome(player_score, dealer_score):
+    return {'win': 1, 'draw': 0, 'lose': -1}[game_logic.determine_result(player_score, dealer_score)]
+
+
+def brute_stand(player_hand, dealer_hand, deck):
+    """Average of dealer_ai_turn over every order of the remaining deck."""
+    player_score = game_logic.calculate_score(player_hand)
+    orders = list(itertools.permutations(deck))
+    total = 0
+    for order in orders:
+        dealer = list(dealer_hand)
+        total += outcome(player_score, game_logic.dealer_ai_turn(list(order), dealer, player_score))
+    return total / len(orders)
+
+
+def brute_best(player_hand, dealer_hand, deck):
+    """Expectimax over the real game rules, card list by card list."""
+    stand = brute_stand(player_hand, dealer_hand, deck)
+    if not deck:
+        return stand
+    return max(stand, brute_hit(player_hand, dealer_hand, deck))
+
+
+def brute_hit(player_hand, dealer_hand, deck):
+    ev = 0.0
+    for i, card in enumerate(deck):
+        rest = deck[:i] + deck[i + 1:]
+        hand = player_hand + [card]
+        player_score = game_logic.calculate_score(hand)
+        if player_score > 21:
+            ev -= 1
+        elif rest and game_logic.dealer_should_hit(dealer_hand, player_score):
+            answer = 0.0
+            for j, dealer_card in enumerate(rest):
+                dealer = dealer_hand + [dealer_card]
+                if game_logic.calculate_score(dealer) > 21:
+                    answer += 1
+                else:
+                    answer += brute_best(hand, dealer, rest[:j] + rest[j + 1:])
+            ev += answer / len(rest)
+        else:
+            ev += brute_best(hand, dealer_hand, rest)
+    return ev / len(deck)
+
+
+@pytest.fixture(autouse=True)
+def cold_cache():
+    odds.clear_cache()
+
+
+def test_composition_round_trip():
+    packed = odds.composition([TEN, JACK, 13 + QUEEN, ACE, 26 + TWO])
+    assert odds.counts(packed) == (1, 0, 0, 0, 0, 0, 0, 0, 3, 1)
+    assert odds.composition(game_logic.create_deck()) == odds.composition(list(reversed(range(52))))
+
+
+@pytest.mark.parametrize('player_hand, dealer_hand, deck', [
+    ([TEN, SIX], [NINE, FIVE], [TWO, 13 + TEN, FOUR, ACE, 26 + TEN, SEVEN]),
+    ([FIVE, 13 + SIX], [TWO, 13 + THREE], [TEN, 13 + ACE, FOUR, EIGHT, 26 + TWO, NINE]),
+    ([ACE, SIX], [TEN, 13 + SIX], [13 + FIVE, 26 + ACE, 39 + TEN, THREE, TWO]),
+])
+def test_advice_matches_brute_force(player_hand, dealer_hand, deck):
+    advice = odds.advise(player_hand, dealer_hand, deck)
+    assert advice['stand'] == pytest.approx(brute_stand(player_hand, dealer_hand, deck))
+    assert advice['hit'] == pytest.approx(brute_hit(player_hand, dealer_hand, deck))
+    double = sum(
+        -1 if game_logic.calculate_score(player_hand + [card]) > 21
+        else brute_stand(player_hand + [card], dealer_hand, deck[:i] + deck[i + 1:])
+        for i, card in enumerate(deck)
+    ) / len(deck)
+    assert advice['double_down'] == pytest.approx(2 * double)
+    assert advice['best'] == max(('stand', 'hit', 'double_down'), key=advice.get)
+
+
+def test_advice_knows_the_deck():
+    # Only tens left: hitting 12 always busts, standing wins against a dealer who must draw
+    advice = odds.advise([TEN, TWO], [TEN, SIX], [13 + TEN, 26 + TEN, 39 + JACK])
+    assert advice['hit'] == -1
+    assert advice['stand'] == 1
+    assert advice['best'] == 'stand'
+
+
+def test_empty_deck_only_allows_standing():
+    advice = odds.advise([TEN, SEVEN], [TEN, EIGHT], [], can_double=True)
+    assert advice == {'stand': -1, 'hit': None, 'double_down': None, 'best': 'stand', 'exact': True}
+
+
+def test_advice_is_cached_across_calls():
+    deck = [card for card in game_logic.create_deck() if card not in (TEN, 13 + SEVEN, 26 + NINE, 39 + EIGHT)]
+    first = odds.advise([TEN, 13 + SEVEN], [26 + NINE, 39 + EIGHT], deck)
+    misses = odds.cache_info()['dealer_ev'].misses
+    assert odds.advise([TEN, 13 + SEVEN], [26 + NINE, 39 + EIGHT], list(reversed(deck))) == first
+    assert odds.cache_info()['dealer_ev'].misses == misses
+
+
+@pytest.mark.parametrize('decks', [1, 8])
+def test_advice_budget_bounds_the_worst_positions(decks):
+    # Small cards against a small dealer hand branch the most
+    player_hand, dealer_hand = [TWO, 13 + TWO], [THREE, 13 + THREE]
+    deck = [card for card in range(52) for _ in range(decks)]
+    for card in player_hand + dealer_hand:
+        deck.remove(card)
+    odds.clear_cache()
+    start = time.perf_counter()
+    advice = odds.advise(player_hand, dealer_hand, deck, budget=5000)
+    assert time.perf_counter() - start < 0.5
+    assert advice['exact'] is False
+    assert advice['hit'] >= -1
+
+
+def test_advice_over_budget_is_a_lower_bound():
+    player_hand, dealer_hand = [TWO, 13 + TWO], [THREE, 13 + THREE]
+    deck = [card for card in range(52) if card not in player_hand + dealer_hand]
+    odds.clear_cache()
+    bounded = odds.advise(player_hand, dealer_hand, deck, budget=100)
+    odds.clear_cache()
+    exact = odds.advise(player_hand, dealer_hand, deck)
+    assert bounded['exact'] is False and exact['exact'] is True
+    assert bounded['hit'] <= exact['hit']
+    assert bounded['stand'] == pytest.approx(exact['stand'])
+    assert bounded['double_down'] == pytest.approx(exact['double_down'])
+
+
+def test_advice_endpoint(user_client, stack_deck):
+    stack_deck(('10', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'))
+    user_client.post('/api/game/start', json={'bet_amount': 100})
+    data = user_client.get('/api/game/advice').get_json()
+    assert data['current_bet'] == 100
+    assert data['best'] in ('stand', 'hit', 'double_down')
+    assert data['stand'] == pytest.approx(-1.0)
+    assert -2 <= data['double_down'] <= 2
+
+
+def test_advice_requires_a_game(user_client):
+    assert user_client.get('/api/game/advice').status_code == 401
+
+
+def test_bust_probability_uses_the_real_deck():
+    assert odds.bust_probability([TEN, SIX], [FIVE, 13 + SIX, 26 + TEN]) == pytest.approx(2 / 3)
+    # An ace never busts a hand that can count it as 1
+    assert odds.bust_probability([TEN, NINE], [ACE, 13 + ACE, TWO, 26 + TEN]) == pytest.approx(1 / 4)
+    assert odds.bust_probability([TEN, 13 + TEN, TWO], [ACE]) == 1.0
+    assert odds.bust_probability([TEN, SIX], []) == 0.0
+
+
+def test_dealer_distribution_matches_brute_force():
+    dealer_hand, deck = [TEN, 13 + FOUR], [ACE, TWO, 13 + THREE, 26 + TEN, SIX, 39 + SEVEN]
+    expected = {}
+    orders = list(itertools.permutations(deck))
+    for order in orders:
+        final = game_logic.dealer_ai_turn(list(order), list(dealer_hand), 18)
+        key = 'bust' if final > 21 else final
+        expected[key] = expected.get(key, 0) + 1 / len(orders)
+    distribution = odds.dealer_distribution(dealer_hand, 18, deck)
+    assert distribution.keys() == expected.keys() | {'bust'}
+    for key, p in expected.items():
+        assert distribution[key] == pytest.approx(p)
+    assert sum(distribution.values()) == pytest.approx(1.0)
+
+
+def test_dealer_decision_only_computes_risk_when_it_matters():
+    from hand_eval import HandState
+
+    def unused():
+        raise AssertionError('bust risk should not be needed')
+    for hand in ([TEN, SIX], [TEN, SEVEN], [ACE, SIX], [TWO, THREE]):
+        state = HandState.from_cards(hand)
+        assert state.dealer_should_hit(18, unused) == state.dealer_should_hit(18)
+
+
+def test_hit_response_includes_odds(user_client, stack_deck):
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'), ('2', 'hearts'))
+    start = user_client.post('/api/game/start', json={'bet_amount': 100}).get_json()
+    assert start['odds']['player_bust'] == 0.0
+    data = user_client.post('/api/game/hit').get_json()
+    assert data['player_score'] == 13
+    assert 0 < data['odds']['player_bust'] < 1
+    assert sum(data['odds']['dealer_final'].values()) == pytest.approx(1.0)
+    assert data['odds']['dealer_bust'] == data['odds']['dealer_final']['bust']
@@ -0,0 +1,108 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from database import db, User
+from metrics import metrics
+from passwords import hasher, needs_rehash, PoolSaturated
+
+FAST_METHOD = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture
+def pool(db_app, monkeypatch):
+    """A one-process hashing pool with cheap hashes."""
+    monkeypatch.setitem(db_app.config, 'PASSWORD_POOL_WORKERS', 1)
+    monkeypatch.setitem(db_app.config, 'PASSWORD_HASH_METHOD', FAST_METHOD)
+    yield db_app
+    hasher.shutdown()
+
+
+def register(client, username, password='secret'):
+    return client.post('/register', data={'username': username, 'password': password})
+
+
+def login(client, username, password='secret'):
+    return client.post('/login', data={'username': username, 'password': password})
+
+
+def test_needs_rehash():
+    assert not needs_rehash(generate_password_hash('x', FAST_METHOD), FAST_METHOD)
+    assert needs_rehash(generate_password_hash('x', FAST_METHOD), 'pbkdf2:sha256:2000')
+
+
+def test_register_and_login_through_the_pool(pool):
+    client = pool.test_client()
+    assert register(client, 'alice').status_code == 302
+    user = User.query.filter_by(username='alice').one()
+    assert user.password_hash.startswith(FAST_METHOD + '$')
+    assert hasher.pending == 0
+
+    assert login(client, 'alice', 'wrong').headers['Location'].endswith('/login')
+    response = login(client, 'alice')
+    assert response.headers['Location'].endswith('/')
+    with client.session_transaction() as sess:
+        assert sess['username'] == 'alice'
+
+
+def test_login_upgrades_the_hash(pool, create_user):
+    user = create_user('bob', password='secret')
+    old_hash = user.password_hash
+    assert needs_rehash(old_hash, FAST_METHOD)
+    rehashes = metrics.password_rehashes.value()
+
+    login(pool.test_client(), 'bob')
+    db.session.expire_all()
+    user = db.session.get(User, user.id)
+    assert user.password_hash != old_hash
+    assert user.password_hash.startswith(FAST_METHOD + '$')
+    assert user.check_password('secret')
+    assert metrics.password_rehashes.value() == rehashes + 1
+
+
+def test_wrong_password_keeps_the_hash(pool, create_user):
+    user = create_user('carol', password='secret')
+    old_hash = user.password_hash
+    login(pool.test_client(), 'carol', 'wrong')
+    db.session.expire_all()
+    assert db.session.get(User, user.id).password_hash == old_hash
+
+
+def test_saturated_pool_answers_503(pool, monkeypatch):
+    monkeypatch.setitem(pool.config, 'PASSWORD_POOL_MAX_PENDING', 0)
+    monkeypatch.setitem(pool.config, 'PASSWORD_POOL_RETRY_AFTER', 3)
+    rejected = metrics.password_pool_rejected.value()
+    client = pool.test_client()
+
+    response = register(client, 'dave')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+    assert User.query.filter_by(username='dave').first() is None
+    assert metrics.password_pool_rejected.value() == rejected + 1
+
+    with pytest.raises(PoolSaturated):
+        hasher.hash('secret')
+
+
+def test_hash_past_the_timeout_answers_503(pool, monkeypatch):
+    # Starting the pool process alone takes longer than this
+    monkeypatch.setitem(pool.config, 'PASSWORD_POOL_TIMEOUT', 0.001)
+    response = register(pool.test_client(), 'erin')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_inline_hashing_without_workers(db_app, monkeypatch):
+    monkeypatch.setitem(db_app.config, 'PASSWORD_POOL_WORKERS', 0)
+    monkeypatch.setitem(db_app.config, 'PASSWORD_HASH_METHOD', FAST_METHOD)
+    pwhash = hasher.hash('secret')
+    assert hasher.verify(pwhash, 'secret') == (True, None)
+    assert hasher.verify(pwhash, 'wrong') == (False, None)
+    assert hasher.pending == 0
+
+
+def test_pool_metrics_are_exported(pool):
+    hasher.hash('secret')
+    body = pool.test_client().get('/metrics').get_data(as_text=True)
+    assert 'password_hash_seconds_count{operation="hash"}' in body
+    assert 'password_pool_pending 0' in body
+    assert 'password_pool_rejected_total' in body
@@ -0,0 +1,110 @@
+import pytest
+from sqlalchemy import event
+
+from database import db, GameSession, GameRecord
+from session_store import MemorySessionStore
+
+
+@pytest.fixture
+def memory_store(db_app, monkeypatch):
+    def use(persist, **kwargs):
+        store = MemorySessionStore(persist, **kwargs)
+        monkeypatch.setitem(db_app.extensions, 'game_sessions', store)
+        return store
+    return use
+
+
+@pytest.fixture
+def statements(db_app):
+    """SQL statements executed while the test runs."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def game_session_selects(executed):
+    return [s for s in executed if s.lstrip().upper().startswith('SELECT') and 'game_session' in s]
+
+
+def test_write_through_skips_select(user_client, memory_store, statements, stack_deck):
+    store = memory_store('write-through')
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'), ('8', 'hearts'))
+    user_client.post('/api/game/start', json={'bet_amount': 100})
+    assert len(store) == 1
+    del statements[:]
+
+    data = user_client.post('/api/game/hit').get_json()
+    assert data['player_score'] == 19
+    assert game_session_selects(statements) == []
+
+    db.session.expire_all()
+    row = GameSession.query.one()
+    assert row.player_score == 19
+    assert row.game_over is False
+
+    data = user_client.post('/api/game/stand').get_json()
+    assert data['result'] == 'win'
+    assert len(store) == 0
+    db.session.expire_all()
+    assert GameSession.query.one().game_over is True
+
+
+def test_write_through_falls_back_to_database(user_client, memory_store, stack_deck):
+    store = memory_store('write-through')
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'), ('8', 'hearts'))
+    user_client.post('/api/game/start', json={'bet_amount': 100})
+    store._hands.clear()
+
+    data = user_client.post('/api/game/hit').get_json()
+    assert data['player_score'] == 19
+    assert len(store) == 1
+
+
+def test_write_on_finish_inserts_once(user_client, memory_store, statements, stack_deck):
+    store = memory_store('write-on-finish')
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'), ('8', 'hearts'))
+    user_client.post('/api/game/start', json={'bet_amount': 100})
+    user_client.post('/api/game/hit')
+    assert not any('game_session' in s for s in statements)
+    assert GameSession.query.count() == 0
+
+    data = user_client.post('/api/game/stand').get_json()
+    assert data['result'] == 'win'
+    assert len(store) == 0
+    row = GameSession.query.one()
+    assert row.game_over is True
+    assert row.player_score == 19
+    assert GameRecord.query.count() == 1
+
+
+def test_rollback_keeps_cached_hand(user_client, memory_store, stack_deck):
+    store = memory_store('write-on-finish')
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'))
+    user_client.post('/api/game/start', json={'bet_amount': 600})
+    # Not enough balance to double: the action fails and rolls back
+    assert user_client.post('/api/game/double_down').status_code == 400
+    hand, _ = next(iter(store._hands.values()))
+    assert hand.current_bet == 600
+    assert len(hand.player_hand) == 2
+
+
+def test_idle_hand_expires(user_client, memory_store, stack_deck):
+    store = memory_store('write-on-finish', capacity=1, ttl=0)
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'))
+    user_client.post('/api/game/start', json={'bet_amount': 100})
+    assert len(store) == 1
+
+    # ttl=0: the hand has expired by the next request
+    response = user_client.post('/api/game/hit')
+    assert response.status_code == 401
+    assert len(store) == 0
+
+
+def test_unknown_persist_mode():
+    with pytest.raises(ValueError):
+        MemorySessionStore('write-sometimes')
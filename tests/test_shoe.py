@@ -0,0 +1,124 @@
+import pytest
+from sqlalchemy import event
+
+from database import db, GameSession, Shoe
+from shoe import Pile, RESERVE, shoe_cards
+
+
+@pytest.fixture
+def shoe_config(db_app, monkeypatch):
+    def configure(decks, penetration):
+        monkeypatch.setitem(db_app.config, 'SHOE_DECKS', decks)
+        monkeypatch.setitem(db_app.config, 'SHOE_PENETRATION', penetration)
+    return configure
+
+
+def play_hand(client):
+    """Start a hand and stand on it; returns the start response."""
+    data = client.post('/api/game/start', json={'bet_amount': 10}).get_json()
+    if not data['game_over']:
+        client.post('/api/game/stand')
+    return data
+
+
+def current_shoe():
+    db.session.expire_all()
+    return Shoe.query.order_by(Shoe.id.desc()).first()
+
+
+def test_pile_deals_front_to_back():
+    pile = Pile([5, 6, 7], 1)
+    assert len(pile) == 2
+    assert list(pile) == [6, 7]
+    assert pile.pop() == 6
+    assert pile.cursor == 2
+    pile.pop()
+    assert not pile
+    with pytest.raises(IndexError):
+        pile.pop()
+
+
+def test_consecutive_hands_share_the_shoe(user_client, shoe_config):
+    shoe_config(decks=2, penetration=0.75)
+    play_hand(user_client)
+    first = current_shoe()
+    assert first.decks == 2
+    assert sorted(shoe_cards(first.seed, first.decks)) == sorted(list(range(52)) * 2)
+    assert first.in_play is False
+    assert first.cursor >= 4
+
+    cursor = first.cursor
+    play_hand(user_client)
+    shoe = current_shoe()
+    assert shoe.id == first.id
+    assert shoe.cursor > cursor
+    sessions = GameSession.query.order_by(GameSession.id).all()
+    assert [s.shoe_id for s in sessions] == [first.id, first.id]
+    assert sessions[0].cursor <= sessions[1].cursor - 4
+
+
+def test_dealt_cards_follow_the_shoe(user_client, shoe_config):
+    shoe_config(decks=1, penetration=0.75)
+    play_hand(user_client)
+    shoe = current_shoe()
+    data = user_client.post('/api/game/start', json={'bet_amount': 10}).get_json()
+    import game_logic
+    expected = game_logic.cards_to_dicts(shoe_cards(shoe.seed, shoe.decks)[shoe.cursor:shoe.cursor + 4])
+    assert data['player_hand'] + data['dealer_hand'] == expected
+
+
+def test_reshuffles_at_the_cut_card(user_client, shoe_config):
+    shoe_config(decks=1, penetration=0.75)
+    play_hand(user_client)
+    shoe = current_shoe()
+    assert shoe.cut_card == 52 - RESERVE
+    shoe.cursor = shoe.cut_card
+    db.session.commit()
+
+    play_hand(user_client)
+    assert current_shoe().id != shoe.id
+    assert Shoe.query.count() == 2
+
+
+def test_abandoned_hand_retires_the_shoe(user_client, shoe_config):
+    shoe_config(decks=2, penetration=0.75)
+    # Leave a hand in play, then abandon it by starting another one
+    while user_client.post('/api/game/start', json={'bet_amount': 10}).get_json()['game_over']:
+        pass
+    shoe = current_shoe()
+    assert shoe.in_play is True
+    play_hand(user_client)
+    assert current_shoe().id != shoe.id
+
+
+def test_hit_does_not_touch_the_shoe_row(user_client, shoe_config, stack_deck):
+    shoe_config(decks=1, penetration=0.75)
+    stack_deck(('5', 'hearts'), ('6', 'clubs'), ('10', 'spades'), ('7', 'diamonds'), ('2', 'hearts'))
+    user_client.post('/api/game/start', json={'bet_amount': 10})
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        data = user_client.post('/api/game/hit').get_json()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert data['player_score'] == 13
+    assert not [s for s in executed if s.lstrip().upper().startswith('UPDATE SHOE')]
+
+
+def test_penetration_zero_reshuffles_every_hand(user_client, shoe_config):
+    shoe_config(decks=1, penetration=0)
+    play_hand(user_client)
+    play_hand(user_client)
+    assert Shoe.query.count() == 2
+
+
+@pytest.mark.parametrize('settings', [{'SHOE_DECKS': 9}, {'SHOE_DECKS': 0}, {'SHOE_PENETRATION': 1.5},
+                                      {'SHOE_PENETRATION': -0.1}])
+def test_invalid_shoe_settings_fail_at_startup(settings):
+    from app import create_app
+
+    with pytest.raises(ValueError, match=next(iter(settings))):
+        create_app(settings)
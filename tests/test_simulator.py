@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+import simulator
+
+
+@pytest.mark.parametrize("stand_on, double_on", [
+    (17, ()),
+    (12, ()),
+    (19, (9, 10, 11)),
+])
+def test_batch_matches_scalar_game_logic(stand_on, double_on):
+    decks = simulator.shuffled_decks(np.random.default_rng(1234), 2000)
+    net, outcome, blackjack = simulator.simulate_batch(decks, stand_on, double_on)
+
+    expected = [simulator.play_hand_scalar(deck, stand_on, double_on)
+                for deck in simulator.decks_to_cards(decks)]
+    assert net.tolist() == expected
+
+
+def test_blackjack_pays_two_and_a_half():
+    # Player A+K, dealer 10+7 stands
+    deck = np.array([[11, 10, 10, 7] + [2] * 48], dtype=np.int8)
+    net, outcome, blackjack = simulator.simulate_batch(deck)
+    assert blackjack[0]
+    assert outcome[0] == 1
+    assert net[0] == simulator.BLACKJACK_PAYOUT - 1
+
+
+def test_simulate_is_reproducible_with_seed():
+    first = simulator.simulate(20000, seed=7)
+    second = simulator.simulate(20000, seed=7)
+    assert first == pytest.approx(second)
+    assert first['win_rate'] + first['draw_rate'] + first['lose_rate'] == pytest.approx(1.0)
+    assert first['house_edge'] == pytest.approx(-first['expected_return'])
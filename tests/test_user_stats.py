@@ -0,0 +1,59 @@
+from database import db, User, GameRecord, UserStats
+from database import add_game_record, aggregate_game_records, backfill_user_stats, get_user_stats
+
+
+def test_add_game_record_updates_aggregate(create_user):
+    user = create_user('alice')
+    add_game_record(user.id, 'win', 20, 18, 100)
+    add_game_record(user.id, 'lose', 22, 18, 50)
+    add_game_record(user.id, 'draw', 19, 19, 10)
+    add_game_record(user.id, 'win', 21, 20, 40, payout=100)
+
+    assert get_user_stats(user.id) == {
+        'games': 4, 'wins': 2, 'losses': 1, 'draws': 1, 'total_wagered': 200, 'net': 100 - 50 + 60,
+    }
+
+
+def test_missing_aggregate_falls_back_to_group_by(create_user):
+    user = create_user('bob')
+    db.session.add_all([
+        GameRecord(user_id=user.id, result='win', player_score=20, dealer_score=18, bet_amount=10),
+        GameRecord(user_id=user.id, result='lose', player_score=15, dealer_score=18, bet_amount=30),
+    ])
+    db.session.commit()
+    assert db.session.get(UserStats, user.id) is None
+    assert get_user_stats(user.id)['games'] == 2
+
+    # The first new game seeds the aggregate from existing history
+    add_game_record(user.id, 'draw', 18, 18, 5)
+    stats = db.session.get(UserStats, user.id)
+    assert (stats.games, stats.wins, stats.losses, stats.draws) == (3, 1, 1, 1)
+    assert stats.net == 10 - 30
+
+
+def test_backfill_matches_history(create_user):
+    users = [create_user('carol'), create_user('dave')]
+    for i in range(12):
+        user = users[i % 2]
+        db.session.add(GameRecord(user_id=user.id, result=['win', 'lose', 'draw'][i % 3],
+                                  player_score=18, dealer_score=17, bet_amount=i + 1))
+    db.session.commit()
+
+    assert backfill_user_stats() == 2
+    expected = aggregate_game_records()
+    for user in users:
+        assert db.session.get(UserStats, user.id).to_dict() == expected[user.id]
+
+
+def test_stats_endpoint_after_games(user_client):
+    for _ in range(5):
+        data = user_client.post('/api/game/start', json={'bet_amount': 10}).get_json()
+        if not data['game_over']:
+            user_client.post('/api/game/stand')
+
+    data = user_client.get('/api/user/stats').get_json()
+    assert data['total_games'] == 5
+    assert data['wins'] + data['losses'] + data['draws'] == 5
+    assert data['total_wagered'] == 50
+    db.session.expire_all()
+    assert data['net'] == db.session.get(User, user_client.user.id).balance - 1000
@@ -0,0 +1,115 @@
+import pytest
+
+import write_behind as write_behind_module
+from database import db, FailedWrite, GameRecord, Ranking, UserStats, write_game_records
+from write_behind import replay_failed_writes, write_behind, WriteLost
+
+
+@pytest.fixture
+def writer(db_app):
+    config = {key: db_app.config[key] for key in db_app.config if key.startswith('WRITE_BEHIND_')}
+    db_app.config['WRITE_BEHIND_ENABLED'] = True
+    db_app.config['WRITE_BEHIND_INTERVAL'] = 0.05
+    yield write_behind
+    write_behind.shutdown()
+    db_app.config.update(config)
+
+
+def play_hands(client, stack_deck, hands):
+    # Player 20 against dealer 17 always wins on stand
+    stack_deck(('K', 'hearts'), ('Q', 'clubs'), ('10', 'spades'), ('7', 'diamonds'))
+    for _ in range(hands):
+        client.post('/api/game/start', json={'bet_amount': 10})
+        assert client.post('/api/game/stand').get_json()['result'] == 'win'
+
+
+def test_history_is_written_in_batches(user_client, writer, stack_deck, commit_counter):
+    batches = writer.batches_written
+    play_hands(user_client, stack_deck, 5)
+    writer.flush()
+    db.session.expire_all()
+
+    assert GameRecord.query.count() == 5
+    assert db.session.get(UserStats, user_client.user.id).wins == 5
+    assert Ranking.query.filter_by(user_id=user_client.user.id).one().score == 20
+    # One commit per request plus far fewer batch commits than queued writes
+    batches = writer.batches_written - batches
+    assert batches < 10
+    assert len(commit_counter) == 10 + batches
+
+
+def test_full_queue_falls_back_to_synchronous_writes(user_client, writer, stack_deck, db_app):
+    db_app.config['WRITE_BEHIND_MAX_QUEUE'] = 0
+    play_hands(user_client, stack_deck, 2)
+    assert writer.pending() == 0
+    assert GameRecord.query.count() == 2
+
+
+def test_durable_mode_waits_for_commit(user_client, writer, stack_deck, db_app):
+    db_app.config['WRITE_BEHIND_DURABLE'] = True
+    batches = writer.batches_written
+    play_hands(user_client, stack_deck, 1)
+    db.session.expire_all()
+    assert GameRecord.query.count() == 1
+    # The record and the ranking update share one batch
+    assert writer.batches_written == batches + 1
+
+
+@pytest.fixture
+def failing_records(writer, db_app, monkeypatch):
+    """GameRecord writes fail their first `failures` attempts; returns the attempt log."""
+    monkeypatch.setitem(db_app.config, 'WRITE_BEHIND_RETRIES', 2)
+    monkeypatch.setitem(db_app.config, 'WRITE_BEHIND_RETRY_DELAY', 0)
+    attempts = []
+
+    def fail(failures):
+        def write(records):
+            attempts.append(len(records))
+            if len(attempts) <= failures:
+                raise RuntimeError('database unavailable')
+            write_game_records(records)
+        monkeypatch.setitem(write_behind_module.HANDLERS, 'game_record', write)
+        return attempts
+    return fail
+
+
+def test_failed_write_is_retried(user_client, writer, stack_deck, failing_records):
+    attempts = failing_records(2)
+    play_hands(user_client, stack_deck, 1)
+    writer.flush()
+    # The batch, then the write alone until it succeeds
+    assert attempts == [1, 1, 1]
+    assert GameRecord.query.count() == 1
+    assert FailedWrite.query.count() == 0
+
+
+def test_write_failing_every_retry_is_kept(user_client, writer, stack_deck, failing_records, monkeypatch):
+    attempts = failing_records(100)
+    play_hands(user_client, stack_deck, 1)
+    writer.flush()
+    assert len(attempts) == 4
+    assert GameRecord.query.count() == 0
+    failed = FailedWrite.query.one()
+    assert failed.kind == 'game_record' and 'database unavailable' in failed.error
+    # The ranking update in the same batch went through on its own
+    assert Ranking.query.filter_by(user_id=user_client.user.id).one().score == 20
+
+    monkeypatch.setitem(write_behind_module.HANDLERS, 'game_record', write_game_records)
+    assert replay_failed_writes() == (1, 0)
+    record = GameRecord.query.one()
+    assert (record.result, record.bet_amount) == ('win', 10)
+    assert FailedWrite.query.count() == 0
+
+
+def test_durable_request_fails_when_a_write_is_lost(user_client, writer, stack_deck, failing_records,
+                                                   db_app, monkeypatch):
+    db_app.config['WRITE_BEHIND_DURABLE'] = True
+    failing_records(100)
+
+    def unserializable(kind, payload):
+        raise TypeError('cannot keep it')
+    monkeypatch.setattr(write_behind_module, 'dump_payload', unserializable)
+    stack_deck(('K', 'hearts'), ('Q', 'clubs'), ('10', 'spades'), ('7', 'diamonds'))
+    user_client.post('/api/game/start', json={'bet_amount': 10})
+    with pytest.raises(WriteLost):
+        user_client.post('/api/game/stand')
@@ -0,0 +1,292 @@
+"""Background write-behind queue for game history bookkeeping.
+
+GameRecord inserts and Ranking updates are queued after the request's own
+transaction commits and written by one worker thread in periodic batches,
+one transaction per batch. Balance changes never go through the queue: they
+stay in the request transaction.
+
+Config:
+    WRITE_BEHIND_ENABLED     turn the queue on (default True)
+    WRITE_BEHIND_MAX_QUEUE   queued writes before callers write synchronously
+    WRITE_BEHIND_BATCH_SIZE  writes per transaction
+    WRITE_BEHIND_INTERVAL    seconds the worker waits to fill a batch
+    WRITE_BEHIND_DURABLE     requests wait until their writes are committed
+    WRITE_BEHIND_RETRIES     retries of a write that fails on its own
+    WRITE_BEHIND_RETRY_DELAY seconds before the first retry, doubled for each
+
+A batch that fails is retried one write at a time, each with backoff. A
+write that fails every retry is kept in the failed_write table, to be
+written out again with
+
+    flask --app app replay-failed-writes
+
+If even that insert fails the write is lost: it is logged, and in durable
+mode the waiting request fails with WriteLost instead of returning as if
+the write were committed.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import after_this_request, current_app, has_request_context
+
+from database import db, FailedWrite, unit_of_work, after_commit, write_game_records, write_rankings
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {
+    'game_record': write_game_records,
+    'ranking': write_rankings,
+}
+
+_STOP = object()
+
+
+class WriteLost(Exception):
+    """A durable write failed every retry and could not be kept in failed_write."""
+
+
+def dump_payload(kind, payload):
+    return json.dumps(payload, default=datetime.isoformat)
+
+
+def load_payload(kind, text):
+    payload = json.loads(text)
+    if kind == 'ranking':
+        return tuple(payload)
+    payload['timestamp'] = datetime.fromisoformat(payload['timestamp'])
+    return payload
+
+
+class _PendingWrites(list):
+    """Writes staged by one transaction, queued when it commits."""
+
+    def __init__(self, writer):
+        super().__init__()
+        self.writer = writer
+
+    def __call__(self):
+        self.writer._enqueue(self)
+
+
+class _Write:
+    __slots__ = ('kind', 'payload', 'done', 'lost')
+
+    def __init__(self, kind, payload, durable):
+        self.kind = kind
+        self.payload = payload
+        self.done = threading.Event() if durable else None
+        self.lost = False
+
+
+class WriteBehindQueue:
+    """One app's queue and worker thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches_written = 0
+
+    @property
+    def enabled(self):
+        return self.app.config['WRITE_BEHIND_ENABLED']
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def defer(self, kind, payload):
+        """Queue a write to run after the current transaction commits.
+
+        Returns False when the queue is full; the caller then writes
+        synchronously in its own transaction, which slows producers down
+        instead of dropping writes.
+        """
+        if self._queue.qsize() >= self.app.config['WRITE_BEHIND_MAX_QUEUE']:
+            return False
+        self._ensure_worker()
+        # One after-commit hook per transaction queues all of its writes together
+        pending = next((callback for callback in db.session.info.get('after_commit', [])
+                        if isinstance(callback, _PendingWrites) and callback.writer is self), None)
+        if pending is None:
+            pending = _PendingWrites(self)
+            after_commit(pending)
+        pending.append(_Write(kind, payload, self.app.config['WRITE_BEHIND_DURABLE']))
+        return True
+
+    def _enqueue(self, writes):
+        for write in writes:
+            self._queue.put(write)
+        # Guaranteed-durability mode: return only once the writes are committed
+        for write in writes:
+            if write.done is not None:
+                write.done.wait()
+        lost = sum(write.lost for write in writes)
+        if lost and has_request_context():
+            # The request's own transaction has committed: fail the request once it is done
+            @after_this_request
+            def report_lost(response):
+                raise WriteLost(f'{lost} write-behind writes were lost')
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so each worker process starts its own
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """Block until everything queued so far has been written."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def shutdown(self):
+        """Write out the queue and stop the worker."""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                self._queue.task_done()
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.app.config['WRITE_BEHIND_INTERVAL']
+            while len(batch) < self.app.config['WRITE_BEHIND_BATCH_SIZE']:
+                try:
+                    write = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if write is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(write)
+            self._write(batch)
+
+    def _write(self, batch):
+        with self.app.app_context():
+            try:
+                self._write_transaction(batch)
+            except Exception:
+                logger.exception('Write-behind batch of %d failed, retrying one by one', len(batch))
+                for write in batch:
+                    self._retry(write)
+            finally:
+                db.session.remove()
+        for write in batch:
+            if write.done is not None:
+                write.done.set()
+            self._queue.task_done()
+
+    def _retry(self, write):
+        """Write one write with backoff between attempts, else keep it in failed_write."""
+        delay = self.app.config['WRITE_BEHIND_RETRY_DELAY']
+        for attempt in range(self.app.config['WRITE_BEHIND_RETRIES'] + 1):
+            if attempt:
+                time.sleep(delay)
+                delay *= 2
+            try:
+                self._write_transaction([write])
+                return
+            except Exception as e:
+                error = e
+        logger.error('Write-behind %s write failed %d times, keeping it in failed_write: %r',
+                     write.kind, attempt + 1, error)
+        try:
+            with unit_of_work():
+                db.session.add(FailedWrite(kind=write.kind, payload=dump_payload(write.kind, write.payload),
+                                           error=repr(error)))
+        except Exception:
+            logger.exception('Lost write-behind %s write: %r', write.kind, write.payload)
+            write.lost = True
+
+    def _write_transaction(self, batch):
+        by_kind = {}
+        for write in batch:
+            by_kind.setdefault(write.kind, []).append(write.payload)
+        with unit_of_work():
+            for kind, payloads in by_kind.items():
+                HANDLERS[kind](payloads)
+        self.batches_written += 1
+
+
+def replay_failed_writes():
+    """Write out the writes kept in failed_write, each in its own transaction.
+
+    Returns (written, still failing); rows that fail again stay.
+    """
+    written = failing = 0
+    for failed in FailedWrite.query.order_by(FailedWrite.id).all():
+        failed_id = failed.id
+        try:
+            with unit_of_work():
+                HANDLERS[failed.kind]([load_payload(failed.kind, failed.payload)])
+                db.session.delete(failed)
+        except Exception:
+            logger.exception('Failed write %d failed again', failed_id)
+            failing += 1
+        else:
+            written += 1
+    return written, failing
+
+
+class WriteBehind:
+    """Gives each app its own WriteBehindQueue as app.extensions['write_behind'].
+
+    The methods act on the current app's queue.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('WRITE_BEHIND_ENABLED', True)
+        app.config.setdefault('WRITE_BEHIND_MAX_QUEUE', 10000)
+        app.config.setdefault('WRITE_BEHIND_BATCH_SIZE', 500)
+        app.config.setdefault('WRITE_BEHIND_INTERVAL', 0.2)
+        app.config.setdefault('WRITE_BEHIND_DURABLE', False)
+        app.config.setdefault('WRITE_BEHIND_RETRIES', 3)
+        app.config.setdefault('WRITE_BEHIND_RETRY_DELAY', 0.5)
+        writer = app.extensions['write_behind'] = WriteBehindQueue(app)
+        atexit.register(writer.shutdown)
+
+    @property
+    def queue(self):
+        return current_app.extensions['write_behind']
+
+    @property
+    def enabled(self):
+        return self.queue.enabled
+
+    @property
+    def batches_written(self):
+        return self.queue.batches_written
+
+    def pending(self):
+        return self.queue.pending()
+
+    def defer(self, kind, payload):
+        return self.queue.defer(kind, payload)
+
+    def flush(self):
+        self.queue.flush()
+
+    def shutdown(self):
+        self.queue.shutdown()
+
+
+write_behind = WriteBehind()